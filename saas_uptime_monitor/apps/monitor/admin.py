@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Website, UptimeLog, SEOLog
+from .models import KeywordSample, Website, WebsiteStatus, UptimeLog, UptimeRollup, SEOLog
 
 @admin.register(Website)
 class WebsiteAdmin(admin.ModelAdmin):
@@ -7,14 +7,39 @@ class WebsiteAdmin(admin.ModelAdmin):
     list_filter = ('is_active', 'owner')
     search_fields = ('name', 'url')
 
+@admin.register(WebsiteStatus)
+class WebsiteStatusAdmin(admin.ModelAdmin):
+    list_display = ('website', 'is_up', 'status_code', 'last_response_time', 'consecutive_failures', 'last_checked_at', 'last_changed_at')
+    list_filter = ('is_up',)
+    list_select_related = ('website',)
+
 @admin.register(UptimeLog)
 class UptimeLogAdmin(admin.ModelAdmin):
-    list_display = ('website', 'status_code', 'response_time', 'is_up', 'checked_at')
-    list_filter = ('is_up', 'website')
+    list_display = ('website', 'status_code', 'response_time', 'is_up', 'probe_node', 'checked_at')
+    list_filter = ('is_up', 'probe_node', 'website')
+    list_select_related = ('website',)
+    ordering = ('-checked_at',)
     readonly_fields = ('checked_at',)
 
+@admin.register(UptimeRollup)
+class UptimeRollupAdmin(admin.ModelAdmin):
+    list_display = ('website', 'resolution', 'bucket_start', 'checks', 'up_count', 'response_time_p95')
+    list_filter = ('resolution', 'website')
+    list_select_related = ('website',)
+
 @admin.register(SEOLog)
 class SEOLogAdmin(admin.ModelAdmin):
     list_display = ('website', 'title', 'h1_count', 'word_count', 'checked_at')
     list_filter = ('website',)
-    readonly_fields = ('checked_at',)
\ No newline at end of file
+    list_select_related = ('website',)
+    ordering = ('-checked_at',)
+    readonly_fields = ('checked_at',)
+
+
+@admin.register(KeywordSample)
+class KeywordSampleAdmin(admin.ModelAdmin):
+    list_display = ('website', 'term', 'day', 'count', 'density')
+    list_filter = ('website',)
+    list_select_related = ('website',)
+    search_fields = ('term',)
+    ordering = ('-day',)
@@ -2,4 +2,10 @@ from django.apps import AppConfig
 
 class MonitorConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'apps.monitor'
\ No newline at end of file
+    name = 'apps.monitor'
+    
+    def ready(self):
+        # Connect the logs_written / rollups_written receivers and the
+        # probe node heartbeat's worker signals
+        from .services import (keywords, link_checker, page_changes, sharding,  # noqa: F401
+                               website_cache, website_status)
@@ -0,0 +1,31 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.monitor.services.http import get_session
+from apps.monitor.services.seo_analyzer import analyze_html
+
+
+class Command(BaseCommand):
+    help = "Run the SEO analyzer on a URL or a saved HTML file and print the SEOLog fields as JSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument('target', help='URL to fetch, or path to a saved HTML file')
+        parser.add_argument('--url', default='',
+                            help='Page URL used to tell internal from external links when analysing a file')
+
+    def handle(self, *args, **options):
+        target = options['target']
+        if os.path.exists(target):
+            with open(target, 'rb') as f:
+                html = f.read()
+            url = options['url']
+        else:
+            response = get_session().get(target, timeout=10)
+            if response.status_code != 200:
+                raise CommandError(f"{target} returned HTTP {response.status_code}")
+            html = response.content
+            url = target
+
+        self.stdout.write(json.dumps(analyze_html(html, url), indent=2))
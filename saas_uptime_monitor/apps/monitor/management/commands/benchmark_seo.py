@@ -0,0 +1,93 @@
+import json
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.monitor.services.html_parsers import BACKENDS, available_backends
+from apps.monitor.services.seo_analyzer import analyze_html
+
+PAGES_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'benchmarks', 'pages')
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), '..', '..', 'benchmarks', 'baseline.json')
+
+
+class Command(BaseCommand):
+    help = ("Time the SEO analyzer over the saved HTML corpus, per parser backend, and fail "
+            "if any page got slower than the recorded baseline")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', default=PAGES_DIR, help='Directory of .html files to analyse')
+        parser.add_argument('--backend', default=None, choices=list(BACKENDS) + ['all'],
+                            help='Parser backend to time, or "all" installed ones (default: MONITOR_HTML_PARSER)')
+        parser.add_argument('--rounds', type=int, default=20, help='Timed runs per page; the best run counts')
+        parser.add_argument('--baseline', default=BASELINE_PATH, help='JSON file of per-page baseline timings')
+        parser.add_argument('--save-baseline', action='store_true', help='Record this run as the new baseline')
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help='Allowed slowdown over the baseline before failing (0.25 = 25%%)')
+
+    def handle(self, *args, **options):
+        pages = sorted(name for name in os.listdir(options['pages']) if name.endswith('.html'))
+        if not pages:
+            raise CommandError(f"No .html files in {options['pages']}")
+
+        if options['backend'] == 'all':
+            backends = available_backends()
+        else:
+            backends = [options['backend'] or settings.MONITOR_HTML_PARSER]
+            if backends[0] not in available_backends():
+                raise CommandError(f"Backend {backends[0]!r} is not installed")
+
+        corpus = {}
+        for name in pages:
+            with open(os.path.join(options['pages'], name), 'rb') as f:
+                corpus[name] = f.read()
+
+        timings = {}
+        for backend in backends:
+            self.stdout.write(self.style.MIGRATE_HEADING(f"Backend: {backend}"))
+            timings[backend] = {}
+            for name, html in corpus.items():
+                timings[backend][name] = self.time_page(html, backend, options['rounds'])
+                self.stdout.write(f"  {name:<28} {len(html) / 1024:8.1f} KB "
+                                  f"{timings[backend][name] * 1000:9.2f} ms/page")
+            total = sum(timings[backend].values())
+            self.stdout.write(f"  {'total':<28} {'':>11} {total * 1000:9.2f} ms "
+                              f"({len(corpus) / total:.1f} pages/s)")
+
+        if options['save_baseline']:
+            baseline = self.load_baseline(options['baseline'])
+            baseline.update(timings)
+            with open(options['baseline'], 'w') as f:
+                json.dump(baseline, f, indent=2, sort_keys=True)
+            self.stdout.write(self.style.SUCCESS(f"Saved baseline to {options['baseline']}"))
+            return
+
+        if os.path.exists(options['baseline']):
+            self.check_regressions(timings, self.load_baseline(options['baseline']), options['tolerance'])
+
+    def time_page(self, html, backend, rounds):
+        best = float('inf')
+        for _ in range(rounds):
+            start = time.perf_counter()
+            analyze_html(html, 'https://www.example.org/', backend=backend)
+            best = min(best, time.perf_counter() - start)
+        return best
+
+    def load_baseline(self, path):
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            return json.load(f)
+
+    def check_regressions(self, timings, baseline, tolerance):
+        regressions = []
+        for backend, pages in timings.items():
+            for name, seconds in pages.items():
+                expected = baseline.get(backend, {}).get(name)
+                if expected is not None and seconds > expected * (1 + tolerance):
+                    regressions.append(f"{backend} {name}: {seconds * 1000:.2f} ms "
+                                       f"vs {expected * 1000:.2f} ms baseline")
+        if regressions:
+            raise CommandError("SEO parse time regressed:\n  " + "\n  ".join(regressions))
+        self.stdout.write(self.style.SUCCESS("No regressions against baseline"))
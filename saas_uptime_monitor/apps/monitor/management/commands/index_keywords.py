@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from apps.monitor.models import KeywordSample, SEOLog
+from apps.monitor.services import keywords
+
+
+class Command(BaseCommand):
+    help = "Rebuild the keyword trend index from the SEO reports still on record"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--website', type=int, default=None, help='Only rebuild this website id')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Reports indexed per transaction')
+
+    def handle(self, *args, **options):
+        reports = SEOLog.objects.only('website_id', 'checked_at', 'top_keywords', 'keyword_density')
+        samples = KeywordSample.objects.all()
+        if options['website'] is not None:
+            reports = reports.filter(website_id=options['website'])
+            samples = samples.filter(website_id=options['website'])
+
+        # Days thinned out of SEOLog by retention keep their old samples
+        days = reports.dates('checked_at', 'day')
+        deleted, _ = samples.filter(day__in=days).delete()
+
+        indexed = written = 0
+        last_id = 0
+        while True:
+            chunk = list(reports.filter(id__gt=last_id).order_by('id')[:options['chunk_size']])
+            if not chunk:
+                break
+            written += keywords.index_reports(chunk)
+            indexed += len(chunk)
+            last_id = chunk[-1].id
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {indexed} SEO reports: replaced {deleted} keyword samples with {written}"))
@@ -0,0 +1,292 @@
+import asyncio
+import multiprocessing
+import os
+import random
+import resource
+import socket
+import time
+import zlib
+from contextlib import contextmanager
+
+from aiohttp import web
+from celery import current_app
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from apps.monitor.models import SEOLog, UptimeLog, Website
+from apps.monitor.services import link_checker
+from apps.monitor.services.scheduler import claim_due_websites
+from apps.monitor.services.sink import get_result_sink
+from apps.monitor.signals import logs_written
+from apps.monitor.tasks import monitor_all_websites, monitor_website
+
+PAGES_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'benchmarks', 'pages')
+
+# Simulated sites live under this reserved domain, all resolving to the farm
+FARM_DOMAIN = 'farm.test'
+
+KINDS = ('ok', 'redirect', 'large', 'slowloris', 'trickle')
+
+
+def _serve(sites, pages, options, pipe):
+    # Runs in the farm's own process, so serving doesn't compete with the
+    # worker under test for the GIL
+    rng = random.Random(options['seed'])
+
+    async def handle(request):
+        host = request.host.split(':', 1)[0]
+        kind = sites.get(host)
+        if kind is None:
+            return web.Response(status=404)
+        if options['latency']:
+            await asyncio.sleep(rng.expovariate(1 / options['latency']))
+        if rng.random() < options['error_rate']:
+            return web.Response(status=rng.choice((500, 502, 503)))
+
+        if kind == 'redirect' and not request.path.startswith('/www'):
+            raise web.HTTPMovedPermanently(f'/www{request.path}')
+        if kind == 'large':
+            return await _stream(request, pages[0], options['large_page_kb'] * 1024, chunk_delay=0)
+        if kind in ('slowloris', 'trickle'):
+            # Headers right away, then a byte every drip_interval seconds for as
+            # long as the client listens: chunked, or announced by Content-Length
+            return await _stream(request, b'', 3600, chunk_delay=options['drip_interval'], chunk_size=1,
+                                 content_length=3600 + len(b'</html>') if kind == 'trickle' else None)
+        page = pages[zlib.crc32(host.encode()) % len(pages)]
+        etag = f'"{zlib.crc32(page):08x}"'
+        if request.headers.get('If-None-Match') == etag:
+            return web.Response(status=304, headers={'ETag': etag})
+        return web.Response(body=page, content_type='text/html', headers={'ETag': etag})
+
+    async def main():
+        app = web.Application()
+        app.router.add_route('GET', '/{tail:.*}', handle)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0, backlog=1024)
+        await site.start()
+        pipe.send(site._server.sockets[0].getsockname()[1])
+        await asyncio.Event().wait()
+
+    asyncio.run(main())
+
+
+async def _stream(request, page, size, chunk_delay, chunk_size=64 * 1024, content_length=None):
+    response = web.StreamResponse(headers={'Content-Type': 'text/html'})
+    if content_length is not None:
+        response.content_length = content_length
+    await response.prepare(request)
+    filler = page.replace(b'</html>', b'') or b'.'
+    sent = 0
+    try:
+        while sent < size:
+            chunk = (filler * (chunk_size // len(filler) + 1))[:chunk_size]
+            await response.write(chunk)
+            sent += len(chunk)
+            if chunk_delay:
+                await asyncio.sleep(chunk_delay)
+        await response.write(b'</html>')
+    except ConnectionError:
+        # The client stopped reading at its size cap or deadline
+        pass
+    return response
+
+
+class SiteFarm:
+    """Local HTTP server answering as every simulated site, in a child process
+
+    ``sites`` maps hostnames under FARM_DOMAIN to one of KINDS: a page from
+    the benchmark corpus (with an ETag, answering a matching If-None-Match
+    with a 304), a redirect to one, a page far past
+    MONITOR_MAX_BODY_BYTES, or a slow-loris body trickled a byte every
+    ``drip_interval`` seconds, either chunked ('slowloris') or with a
+    Content-Length ('trickle').
+    Every request waits an exponentially distributed ``latency`` and fails
+    with a 5xx at ``error_rate``. Use it together with farm_dns().
+    """
+
+    def __init__(self, sites, latency=0.1, error_rate=0.0, large_page_kb=4096, drip_interval=1, seed=0,
+                 pages_dir=PAGES_DIR):
+        self.sites = sites
+        self.options = {'latency': latency, 'error_rate': error_rate, 'large_page_kb': large_page_kb,
+                        'drip_interval': drip_interval, 'seed': seed}
+        self.pages = []
+        for name in sorted(os.listdir(pages_dir)):
+            if name.endswith('.html'):
+                with open(os.path.join(pages_dir, name), 'rb') as f:
+                    self.pages.append(f.read())
+        self.port = None
+        self.process = None
+
+    def __enter__(self):
+        context = multiprocessing.get_context('fork')
+        receiver, sender = context.Pipe(duplex=False)
+        self.process = context.Process(target=_serve, args=(self.sites, self.pages, self.options, sender),
+                                       daemon=True)
+        self.process.start()
+        if not receiver.poll(10):
+            self.process.terminate()
+            raise RuntimeError("Site farm did not start")
+        self.port = receiver.recv()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.process.terminate()
+        self.process.join()
+
+    def url(self, host):
+        return f'http://{host}:{self.port}/'
+
+
+@contextmanager
+def farm_dns():
+    """Resolve every host under FARM_DOMAIN to the loopback address
+
+    Any other lookup fails, so nothing in the run reaches the network (the
+    benchmark pages link to hosts outside the farm).
+    """
+    getaddrinfo = socket.getaddrinfo
+
+    def resolve(host, port, *args, **kwargs):
+        name = host.decode() if isinstance(host, bytes) else host
+        if name and (name == FARM_DOMAIN or name.endswith(f'.{FARM_DOMAIN}')):
+            return getaddrinfo('127.0.0.1', port, *args, **kwargs)
+        raise socket.gaierror(socket.EAI_NONAME, f"{name} is outside the load test farm")
+
+    socket.getaddrinfo = resolve
+    try:
+        yield
+    finally:
+        socket.getaddrinfo = getaddrinfo
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of sorted ``values``"""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, round(fraction * len(values)) - 1))]
+
+
+def rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Command(BaseCommand):
+    help = ("Load test the probe pipeline end to end against a local farm of simulated sites, "
+            "on a throwaway test database, and report throughput, latency and memory")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sites', type=int, default=2000, help='Number of simulated websites')
+        parser.add_argument('--rounds', type=int, default=3, help='Scheduler ticks to run, every site due each time')
+        parser.add_argument('--task', choices=['batch', 'website'], default='batch',
+                            help='Drive monitor_all_websites and its batches, or monitor_website per site')
+        parser.add_argument('--latency', type=float, default=0.1, help='Mean farm response latency in seconds')
+        parser.add_argument('--error-rate', type=float, default=0.05, help='Fraction of requests answered with a 5xx')
+        parser.add_argument('--redirect-rate', type=float, default=0.1, help='Fraction of sites behind a redirect')
+        parser.add_argument('--large-rate', type=float, default=0.02,
+                            help='Fraction of sites serving pages past MONITOR_MAX_BODY_BYTES')
+        parser.add_argument('--large-page-kb', type=int, default=4096, help='Size of the large pages')
+        parser.add_argument('--slowloris-rate', type=float, default=0.01,
+                            help='Fraction of sites trickling their body until MONITOR_FETCH_DEADLINE, '
+                                 'half of them chunked and half with a Content-Length')
+        parser.add_argument('--fetch-deadline', type=float, default=None,
+                            help='Override MONITOR_FETCH_DEADLINE for the run')
+        parser.add_argument('--batch-size', type=int, default=None, help='Override MONITOR_PROBE_BATCH_SIZE')
+        parser.add_argument('--link-checks', action='store_true',
+                            help='Also check the links on every analysed page, inline in the run')
+        parser.add_argument('--seed', type=int, default=1, help='Seed for site kinds and farm behaviour')
+
+    def handle(self, *args, **options):
+        if options['sites'] < 1 or options['rounds'] < 1:
+            raise CommandError("--sites and --rounds must be at least 1")
+
+        rng = random.Random(options['seed'])
+        sites = {f's{n}.{FARM_DOMAIN}': self.pick_kind(rng, options) for n in range(options['sites'])}
+        overrides = {}
+        if options['fetch_deadline'] is not None:
+            overrides['MONITOR_FETCH_DEADLINE'] = options['fetch_deadline']
+        if options['batch_size'] is not None:
+            overrides['MONITOR_PROBE_BATCH_SIZE'] = options['batch_size']
+
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        always_eager = current_app.conf.task_always_eager
+        # Batches (and link checks) run inline in this process instead of on a broker
+        current_app.conf.task_always_eager = True
+        if not options['link_checks']:
+            # In production they run on other workers, after the probes
+            logs_written.disconnect(link_checker.queue_link_checks)
+        try:
+            with SiteFarm(sites, latency=options['latency'], error_rate=options['error_rate'],
+                          large_page_kb=options['large_page_kb'], seed=options['seed']) as farm, \
+                    farm_dns(), override_settings(**overrides):
+                self.create_websites(farm, sites)
+                self.stdout.write(self.style.MIGRATE_HEADING(
+                    f"{len(sites)} sites on port {farm.port}: "
+                    + ', '.join(f"{sum(kind == k for kind in sites.values())} {k}" for k in KINDS)))
+                self.run_rounds(options)
+        finally:
+            current_app.conf.task_always_eager = always_eager
+            if not options['link_checks']:
+                logs_written.connect(link_checker.queue_link_checks)
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def pick_kind(self, rng, options):
+        roll = rng.random()
+        for kind in ('slowloris', 'large', 'redirect'):
+            roll -= options[f'{kind}_rate']
+            if roll < 0 and kind == 'slowloris':
+                # Half chunked, half with a Content-Length
+                return rng.choice(('slowloris', 'trickle'))
+            if roll < 0:
+                return kind
+        return 'ok'
+
+    def create_websites(self, farm, sites):
+        owner = User.objects.create_user('loadtest')
+        Website.objects.bulk_create(
+            [Website(name=host, url=farm.url(host), owner=owner) for host in sites], batch_size=1000)
+
+    def run_rounds(self, options):
+        started_rss = rss_mb()
+        elapsed_total = 0.0
+        probes_total = rows_total = 0
+        for number in range(1, options['rounds'] + 1):
+            Website.objects.update(next_check_at=timezone.now())
+            rows_before = UptimeLog.objects.count() + SEOLog.objects.count()
+            probes_before = UptimeLog.objects.count()
+
+            started = time.monotonic()
+            if options['task'] == 'batch':
+                monitor_all_websites()
+            else:
+                for website_id in claim_due_websites(limit=settings.MONITOR_SCHEDULER_MAX_PER_TICK):
+                    monitor_website(website_id)
+                get_result_sink().flush()
+            elapsed = time.monotonic() - started
+
+            probes = UptimeLog.objects.count() - probes_before
+            rows = UptimeLog.objects.count() + SEOLog.objects.count() - rows_before
+            elapsed_total += elapsed
+            probes_total += probes
+            rows_total += rows
+            self.stdout.write(f"  round {number}: {probes} probes in {elapsed:.2f}s "
+                              f"({probes / elapsed:.1f} probes/s), {rows / elapsed:.1f} rows/s, "
+                              f"peak RSS {rss_mb():.0f} MB")
+
+        latencies = sorted(UptimeLog.objects.filter(status_code__gt=0).values_list('response_time', flat=True))
+        up = UptimeLog.objects.filter(is_up=True).count()
+        failed = UptimeLog.objects.filter(status_code=0).count()
+        self.stdout.write(self.style.SUCCESS(
+            f"{probes_total} probes ({up} up, {probes_total - up - failed} down, {failed} errors) "
+            f"in {elapsed_total:.2f}s"))
+        self.stdout.write(f"  probes/s        {probes_total / elapsed_total:10.1f}")
+        self.stdout.write(f"  latency p50     {percentile(latencies, 0.5) * 1000:10.0f} ms")
+        self.stdout.write(f"  latency p99     {percentile(latencies, 0.99) * 1000:10.0f} ms")
+        self.stdout.write(f"  db rows/s       {rows_total / elapsed_total:10.1f}")
+        self.stdout.write(f"  worker peak RSS {rss_mb():10.0f} MB ({started_rss:.0f} MB before the first round)")
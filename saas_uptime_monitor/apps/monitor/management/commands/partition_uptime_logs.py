@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.monitor.services import partitions
+
+
+class Command(BaseCommand):
+    help = "Convert the UptimeLog table to native range partitions by checked_at (PostgreSQL only)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', choices=sorted(partitions.INTERVALS),
+                            default=settings.MONITOR_UPTIME_PARTITION_INTERVAL,
+                            help='Partition size (default: MONITOR_UPTIME_PARTITION_INTERVAL)')
+
+    def handle(self, *args, **options):
+        if not partitions.is_supported():
+            raise CommandError("Partitioning needs PostgreSQL; this database keeps a single UptimeLog table")
+        if partitions.is_partitioned():
+            raise CommandError("UptimeLog is already partitioned")
+        if options['interval'] != settings.MONITOR_UPTIME_PARTITION_INTERVAL:
+            self.stderr.write(self.style.WARNING(
+                f"MONITOR_UPTIME_PARTITION_INTERVAL is {settings.MONITOR_UPTIME_PARTITION_INTERVAL!r}; "
+                f"set it to {options['interval']!r} so new partitions match"))
+
+        copied = partitions.convert_table(options['interval'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Partitioned UptimeLog {options['interval']}; copied {copied} rows "
+            f"into {len(partitions.list_partitions())} partitions"))
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:29
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0002_seolog_content_quality_seolog_duplicate_percentage_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='seolog',
+            name='checked_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name='uptimelog',
+            name='checked_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
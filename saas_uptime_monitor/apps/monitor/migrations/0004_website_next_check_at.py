@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:30
+
+import random
+from datetime import timedelta
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def spread_existing_websites(apps, schema_editor):
+    # Without this every existing site would become due on the same tick.
+    Website = apps.get_model('monitor', 'Website')
+    now = django.utils.timezone.now()
+    websites = list(Website.objects.only('id', 'check_interval'))
+    for website in websites:
+        interval = max(website.check_interval, 1) * 60
+        website.next_check_at = now + timedelta(seconds=random.uniform(0, interval))
+    Website.objects.bulk_update(websites, ['next_check_at'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0003_checked_at_default'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='website',
+            name='next_check_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(spread_existing_websites, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='website',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['next_check_at'], name='website_due_idx'),
+        ),
+    ]
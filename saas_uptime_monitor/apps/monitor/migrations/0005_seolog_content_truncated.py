@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0004_website_next_check_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='seolog',
+            name='content_truncated',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0005_seolog_content_truncated'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UptimeRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.IntegerField(choices=[(60, '1 minute'), (3600, '1 hour'), (86400, '1 day')])),
+                ('bucket_start', models.DateTimeField()),
+                ('checks', models.IntegerField(default=0)),
+                ('up_count', models.IntegerField(default=0)),
+                ('response_time_sum', models.FloatField(default=0)),
+                ('response_time_min', models.FloatField(blank=True, null=True)),
+                ('response_time_max', models.FloatField(blank=True, null=True)),
+                ('response_time_p95', models.FloatField(blank=True, null=True)),
+                ('latency_histogram', models.JSONField(default=list)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='uptimelog',
+            index=models.Index(fields=['checked_at'], name='uptimelog_checked_at_idx'),
+        ),
+        migrations.AddField(
+            model_name='uptimerollup',
+            name='website',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='monitor.website'),
+        ),
+        migrations.AddIndex(
+            model_name='uptimerollup',
+            index=models.Index(fields=['resolution', 'bucket_start'], name='uptime_rollup_res_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='uptimerollup',
+            constraint=models.UniqueConstraint(fields=('website', 'resolution', 'bucket_start'), name='uptime_rollup_bucket_uniq'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0006_uptime_rollup'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='seolog',
+            options={},
+        ),
+        migrations.AlterModelOptions(
+            name='uptimelog',
+            options={},
+        ),
+        migrations.AddIndex(
+            model_name='seolog',
+            index=models.Index(fields=['website', '-checked_at'], name='seolog_website_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='uptimelog',
+            index=models.Index(fields=['website', '-checked_at'], name='uptimelog_website_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='uptimelog',
+            index=models.Index(condition=models.Q(('is_up', False)), fields=['website', '-checked_at'], name='uptimelog_website_down_idx'),
+        ),
+    ]
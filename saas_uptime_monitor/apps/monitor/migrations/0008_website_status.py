@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0007_log_website_recent_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WebsiteStatus',
+            fields=[
+                ('website', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='status', serialize=False, to='monitor.website')),
+                ('is_up', models.BooleanField(null=True)),
+                ('status_code', models.IntegerField(default=0)),
+                ('last_response_time', models.FloatField(blank=True, null=True)),
+                ('last_checked_at', models.DateTimeField(blank=True, null=True)),
+                ('last_changed_at', models.DateTimeField(blank=True, null=True)),
+                ('consecutive_failures', models.IntegerField(default=0)),
+                ('error_message', models.TextField(blank=True, default='')),
+            ],
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0008_website_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='websitestatus',
+            name='seo_content_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='websitestatus',
+            name='seo_etag',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='websitestatus',
+            name='seo_last_modified',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='websitestatus',
+            name='seo_verified_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
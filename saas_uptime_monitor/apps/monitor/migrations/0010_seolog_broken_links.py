@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0009_websitestatus_seo_fingerprint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='seolog',
+            name='broken_links',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='seolog',
+            name='links_checked',
+            field=models.IntegerField(default=0),
+        ),
+    ]
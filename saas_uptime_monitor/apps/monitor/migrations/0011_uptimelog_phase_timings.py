@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0010_seolog_broken_links'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uptimelog',
+            name='connect_time',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='uptimelog',
+            name='dns_time',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='uptimelog',
+            name='first_byte_time',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='uptimelog',
+            name='tls_time',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='uptimelog',
+            name='transfer_time',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0011_uptimelog_phase_timings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uptimelog',
+            name='probe_node',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
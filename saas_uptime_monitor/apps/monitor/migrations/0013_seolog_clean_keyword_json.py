@@ -0,0 +1,32 @@
+import json
+
+from django.db import migrations
+
+# Value for rows whose column is empty or not valid JSON
+EMPTY = {'top_keywords': '{}', 'keyword_density': '{}', 'google_terms_issues': '[]'}
+
+
+def clean_keyword_json(apps, schema_editor):
+    """Make every keyword column valid JSON so it can become a JSONField"""
+    SEOLog = apps.get_model('monitor', 'SEOLog')
+    for field, empty in EMPTY.items():
+        SEOLog.objects.filter(**{f'{field}__isnull': True}).update(**{field: empty})
+        SEOLog.objects.filter(**{field: ''}).update(**{field: empty})
+        invalid = []
+        for pk, value in SEOLog.objects.exclude(**{field: empty}).values_list('pk', field).iterator():
+            try:
+                json.loads(value)
+            except ValueError:
+                invalid.append(pk)
+        SEOLog.objects.filter(pk__in=invalid).update(**{field: empty})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0012_uptimelog_probe_node'),
+    ]
+
+    operations = [
+        migrations.RunPython(clean_keyword_json, migrations.RunPython.noop),
+    ]
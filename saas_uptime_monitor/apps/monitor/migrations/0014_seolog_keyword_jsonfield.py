@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0013_seolog_clean_keyword_json'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='seolog',
+            name='google_terms_issues',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AlterField(
+            model_name='seolog',
+            name='keyword_density',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AlterField(
+            model_name='seolog',
+            name='top_keywords',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
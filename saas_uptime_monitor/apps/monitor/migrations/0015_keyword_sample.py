@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0014_seolog_keyword_jsonfield'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='KeywordSample',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=100)),
+                ('day', models.DateField()),
+                ('count', models.IntegerField(default=0)),
+                ('density', models.FloatField(default=0)),
+                ('checked_at', models.DateTimeField()),
+                ('website', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='monitor.website')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['website', 'day'], name='keyword_sample_website_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('website', 'term', 'day'), name='keyword_sample_day_uniq')],
+            },
+        ),
+    ]
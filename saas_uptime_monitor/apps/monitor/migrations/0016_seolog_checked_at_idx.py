@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0015_keyword_sample'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='seolog',
+            index=models.Index(fields=['checked_at'], name='seolog_checked_at_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0016_seolog_checked_at_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='websitestatus',
+            name='report_job_claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='websitestatus',
+            name='report_job_id',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+    ]
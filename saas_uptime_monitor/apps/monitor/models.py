@@ -1,32 +1,177 @@
 from django.db import models
+from django.db.models.fields.json import KeyTextTransform
+from django.db.models.functions import Cast
+from django.utils import timezone
 from django.contrib.auth.models import User
 
 class Website(models.Model):
     name = models.CharField(max_length=200)
     url = models.URLField()
     check_interval = models.IntegerField(default=5)  # minutes
+    next_check_at = models.DateTimeField(default=timezone.now)
     is_active = models.BooleanField(default=True)
     owner = models.ForeignKey(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            # The scheduler only ever asks for active sites that are due.
+            models.Index(fields=['next_check_at'], condition=models.Q(is_active=True),
+                         name='website_due_idx'),
+        ]
+    
     def __str__(self):
         return self.name
 
+class WebsiteStatus(models.Model):
+    """Latest known state of a website, kept current as checks are written
+
+    Reading current status from here is one row per site instead of a
+    lookup of the newest UptimeLog.
+    """
+    website = models.OneToOneField(Website, on_delete=models.CASCADE, primary_key=True,
+                                   related_name='status')
+    is_up = models.BooleanField(null=True)  # None until the first check
+    status_code = models.IntegerField(default=0)
+    last_response_time = models.FloatField(null=True, blank=True)  # in seconds
+    last_checked_at = models.DateTimeField(null=True, blank=True)
+    last_changed_at = models.DateTimeField(null=True, blank=True)  # when is_up last flipped
+    consecutive_failures = models.IntegerField(default=0)
+    error_message = models.TextField(blank=True, default='')
+    
+    # Fingerprint of the page behind the latest SEOLog. Checks that find the
+    # page unchanged only move seo_verified_at instead of writing a new row.
+    seo_etag = models.CharField(max_length=255, blank=True, default='')
+    seo_last_modified = models.CharField(max_length=64, blank=True, default='')
+    seo_content_hash = models.CharField(max_length=64, blank=True, default='')
+    seo_verified_at = models.DateTimeField(null=True, blank=True)
+    
+    # The on-demand SEO report job in flight, claimed by report_jobs.claim
+    report_job_id = models.CharField(max_length=32, blank=True, default='')
+    report_job_claimed_at = models.DateTimeField(null=True, blank=True)
+    
+    def __str__(self):
+        if self.is_up is None:
+            return f"{self.website.name} - UNKNOWN"
+        return f"{self.website.name} - {'UP' if self.is_up else 'DOWN'}"
+    
+    @property
+    def status_duration(self):
+        """How long the website has been in its current state"""
+        if self.last_changed_at is None:
+            return None
+        return timezone.now() - self.last_changed_at
+
+class LogQuerySet(models.QuerySet):
+    def for_website(self, website):
+        """One website's checks, newest first, read in index order"""
+        return self.filter(website=website).order_by('-checked_at')
+
+class SEOLogQuerySet(LogQuerySet):
+    def keyword_trend(self, term):
+        """Count and density of ``term`` per report, oldest first, read out of the JSON in SQL
+
+        Reports whose top keywords don't include ``term`` are left out.
+        """
+        return (self.filter(top_keywords__has_key=term)
+                .annotate(keyword_count=Cast(KeyTextTransform(term, 'top_keywords'), models.IntegerField()),
+                          keyword_density_pct=Cast(KeyTextTransform(term, 'keyword_density'),
+                                                   models.FloatField()))
+                .order_by('checked_at')
+                .values('website_id', 'checked_at', 'keyword_count', 'keyword_density_pct'))
+
+class UptimeLogQuerySet(LogQuerySet):
+    def incidents(self):
+        """Failed checks only; served by the partial uptimelog_website_down_idx"""
+        return self.filter(is_up=False)
+
 class UptimeLog(models.Model):
     website = models.ForeignKey(Website, on_delete=models.CASCADE)
     status_code = models.IntegerField()
     response_time = models.FloatField()  # in seconds
     is_up = models.BooleanField(default=True)
-    checked_at = models.DateTimeField(auto_now_add=True)
+    checked_at = models.DateTimeField(default=timezone.now)
     error_message = models.TextField(blank=True, null=True)
+    # Where response_time went, in seconds, for probes made with phase
+    # timing. Null when not measured or not reached; connect and TLS stay
+    # null when a pooled connection was reused.
+    dns_time = models.FloatField(null=True, blank=True)
+    connect_time = models.FloatField(null=True, blank=True)
+    tls_time = models.FloatField(null=True, blank=True)
+    first_byte_time = models.FloatField(null=True, blank=True)
+    transfer_time = models.FloatField(null=True, blank=True)
+    # The probe node (sharding.local_node) that made the check
+    probe_node = models.CharField(max_length=64, blank=True, default='')
+    
+    objects = UptimeLogQuerySet.as_manager()
     
     class Meta:
-        ordering = ['-checked_at']
+        # No default ordering: reads that need one ask for it and get it
+        # from an index, everything else skips the sort.
+        indexes = [
+            # Rollup compaction reads every check in a time window
+            models.Index(fields=['checked_at'], name='uptimelog_checked_at_idx'),
+            models.Index(fields=['website', '-checked_at'], name='uptimelog_website_recent_idx'),
+            models.Index(fields=['website', '-checked_at'], condition=models.Q(is_up=False),
+                         name='uptimelog_website_down_idx'),
+        ]
     
     def __str__(self):
         return f"{self.website.name} - {'UP' if self.is_up else 'DOWN'}"
 
+class UptimeRollup(models.Model):
+    """Per-website uptime aggregate over one fixed time bucket
+
+    Written by the compaction task from raw UptimeLog rows. Latency figures
+    only cover successful checks; ``latency_histogram`` holds check counts per
+    rollups.LATENCY_BUCKETS bound so coarser buckets can estimate p95.
+    """
+    MINUTE = 60
+    HOUR = 3600
+    DAY = 86400
+    RESOLUTION_CHOICES = [
+        (MINUTE, '1 minute'),
+        (HOUR, '1 hour'),
+        (DAY, '1 day'),
+    ]
+    
+    website = models.ForeignKey(Website, on_delete=models.CASCADE)
+    resolution = models.IntegerField(choices=RESOLUTION_CHOICES)  # seconds
+    bucket_start = models.DateTimeField()
+    checks = models.IntegerField(default=0)
+    up_count = models.IntegerField(default=0)
+    response_time_sum = models.FloatField(default=0)  # over up checks, in seconds
+    response_time_min = models.FloatField(null=True, blank=True)
+    response_time_max = models.FloatField(null=True, blank=True)
+    response_time_p95 = models.FloatField(null=True, blank=True)
+    latency_histogram = models.JSONField(default=list)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['website', 'resolution', 'bucket_start'],
+                                    name='uptime_rollup_bucket_uniq'),
+        ]
+        indexes = [
+            # Compaction's cursor and retention both scan one resolution by time
+            models.Index(fields=['resolution', 'bucket_start'], name='uptime_rollup_res_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.website.name} - {self.get_resolution_display()} from {self.bucket_start}"
+    
+    @property
+    def response_time_avg(self):
+        if not self.up_count:
+            return None
+        return self.response_time_sum / self.up_count
+    
+    @property
+    def uptime_percentage(self):
+        if not self.checks:
+            return None
+        return self.up_count / self.checks * 100
+
 class SEOLog(models.Model):
     website = models.ForeignKey(Website, on_delete=models.CASCADE)
     title = models.CharField(max_length=500, blank=True, null=True)
@@ -35,7 +180,7 @@ class SEOLog(models.Model):
     word_count = models.IntegerField(default=0)
     internal_links = models.IntegerField(default=0)
     external_links = models.IntegerField(default=0)
-    checked_at = models.DateTimeField(auto_now_add=True)
+    checked_at = models.DateTimeField(default=timezone.now)
     
     # NEW FIELDS START HERE
     seo_score = models.IntegerField(default=0)
@@ -61,9 +206,9 @@ class SEOLog(models.Model):
     has_multiple_h1 = models.BooleanField(default=False)
     has_short_content = models.BooleanField(default=False)
     
-    # Keyword analysis
-    top_keywords = models.TextField(blank=True, null=True)
-    keyword_density = models.TextField(blank=True, null=True)
+    # Keyword analysis: {word: count} and {word: percent of words}
+    top_keywords = models.JSONField(default=dict, blank=True)
+    keyword_density = models.JSONField(default=dict, blank=True)
     
     # Technical SEO
     has_viewport_meta = models.BooleanField(default=False)
@@ -71,32 +216,51 @@ class SEOLog(models.Model):
     
     # Google terms analysis
     google_terms_score = models.IntegerField(default=0)
-    google_terms_issues = models.TextField(blank=True, null=True)
+    google_terms_issues = models.JSONField(default=list, blank=True)
     # NEW FIELDS END HERE
     
+    # Set when the page hit the download size cap or deadline
+    content_truncated = models.BooleanField(default=False)
+    
+    # Filled in by the link check stage after the row is written; None until then
+    broken_links = models.IntegerField(null=True, blank=True)
+    links_checked = models.IntegerField(default=0)
+    
+    objects = SEOLogQuerySet.as_manager()
+    
     class Meta:
-        ordering = ['-checked_at']
+        indexes = [
+            models.Index(fields=['website', '-checked_at'], name='seolog_website_recent_idx'),
+            # Retention thins old checks a window of days at a time
+            models.Index(fields=['checked_at'], name='seolog_checked_at_idx'),
+        ]
     
     def __str__(self):
         return f"SEO Check for {self.website.name}"
+
+class KeywordSample(models.Model):
+    """How often a term was among a website's top keywords on one UTC day
+
+    Kept up to date from each new SEOLog, so keyword trends read a row per
+    term per day instead of every report. ``count`` and ``density`` come
+    from the day's latest report (``checked_at``). A term missing on a day
+    that has samples fell out of the top keywords.
+    """
+    website = models.ForeignKey(Website, on_delete=models.CASCADE)
+    term = models.CharField(max_length=100)
+    day = models.DateField()
+    count = models.IntegerField(default=0)
+    density = models.FloatField(default=0)  # percent of the page's words
+    checked_at = models.DateTimeField()
     
-    # Property to parse JSON data
-    @property
-    def parsed_top_keywords(self):
-        import json
-        try:
-            if self.top_keywords:
-                return json.loads(self.top_keywords)
-        except:
-            pass
-        return {}
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['website', 'term', 'day'], name='keyword_sample_day_uniq'),
+        ]
+        indexes = [
+            # Movers read every term of a website over a range of days
+            models.Index(fields=['website', 'day'], name='keyword_sample_website_day_idx'),
+        ]
     
-    @property
-    def parsed_google_terms_issues(self):
-        import json
-        try:
-            if self.google_terms_issues:
-                return json.loads(self.google_terms_issues)
-        except:
-            pass
-        return []
\ No newline at end of file
+    def __str__(self):
+        return f"{self.website.name} - {self.term} on {self.day}"
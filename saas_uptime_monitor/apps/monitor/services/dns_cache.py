@@ -0,0 +1,54 @@
+# apps/monitor/services/dns_cache.py
+import socket
+import threading
+import time
+from typing import Any, Dict, List, Tuple
+
+from aiohttp.abc import AbstractResolver
+from aiohttp.resolver import DefaultResolver
+
+# (host, port, family) -> (expires at, addresses), shared by every event loop
+# in the process so lookups outlive the per-batch connector.
+_entries: Dict[Tuple[str, int, int], Tuple[float, List[Dict[str, Any]]]] = {}
+_lock = threading.Lock()
+
+# Expired entries are swept out once the cache holds this many
+MAX_ENTRIES = 100000
+
+
+class CachingResolver(AbstractResolver):
+    """aiohttp resolver that keeps successful lookups for ``ttl`` seconds
+
+    aiohttp's own DNS cache lives on the connector, and a connector only
+    lasts one probe batch, so every batch would resolve every host again.
+    These entries are per process instead. Failed lookups aren't cached.
+    """
+
+    def __init__(self, ttl: float = 300):
+        self.ttl = ttl
+        self.resolver = DefaultResolver()
+
+    async def resolve(self, host: str, port: int = 0,
+                      family: socket.AddressFamily = socket.AF_INET) -> List[Dict[str, Any]]:
+        key = (host, port, family)
+        now = time.monotonic()
+        with _lock:
+            entry = _entries.get(key)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+
+        addresses = await self.resolver.resolve(host, port, family)
+        with _lock:
+            if len(_entries) >= MAX_ENTRIES:
+                for stale in [stale for stale, (expires, _) in _entries.items() if expires <= now]:
+                    del _entries[stale]
+            _entries[key] = (now + self.ttl, addresses)
+        return addresses
+
+    async def close(self) -> None:
+        await self.resolver.close()
+
+
+def clear() -> None:
+    with _lock:
+        _entries.clear()
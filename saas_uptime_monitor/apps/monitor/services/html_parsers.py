@@ -0,0 +1,245 @@
+# apps/monitor/services/html_parsers.py
+import logging
+from html.parser import HTMLParser
+from typing import Callable, Dict, List, Optional, Union
+
+from bs4 import BeautifulSoup, Comment, Declaration, Doctype, NavigableString, ProcessingInstruction, Tag
+from bs4.dammit import UnicodeDammit
+
+logger = logging.getLogger(__name__)
+
+HEADINGS = ('h1', 'h2', 'h3', 'h4', 'h5', 'h6')
+
+# Text inside these elements isn't page copy. BeautifulSoup's get_text()
+# skips the same elements, so every backend agrees with it.
+NON_TEXT_ELEMENTS = frozenset(('script', 'style', 'template'))
+
+# Ruby annotations aren't page copy either, but their end tags are optional:
+# one ends at the next annotation or at the end of an enclosing element.
+RUBY_ANNOTATIONS = frozenset(('rt', 'rp'))
+
+# BeautifulSoup strings that are markup rather than text
+NON_TEXT_STRINGS = (Comment, Declaration, Doctype, ProcessingInstruction)
+
+
+class PageCollector:
+    """Accumulate SEO metrics from a stream of parser events.
+
+    Backends only have to report start tags, end tags and text in document
+    order; everything the analyzer needs is derived here, so all backends
+    produce identical metrics for the same markup.
+    """
+
+    def __init__(self):
+        self.heading_counts = dict.fromkeys(HEADINGS, 0)
+        self.title: Optional[str] = None
+        self.meta_description: Optional[str] = None
+        self.has_viewport_meta = False
+        self.has_favicon = False
+        self.links: List[str] = []
+        self.total_images = 0
+        self.images_without_alt = 0
+        self._found_meta_description = False
+        self._text_parts: List[str] = []
+        self._title_parts: Optional[List[str]] = None
+        self._title_depth = 0
+        self._skip_depth = 0
+        # Elements opened inside the open <rt>/<rp>, None outside one
+        self._annotation: Optional[List[str]] = None
+
+    @property
+    def text(self) -> str:
+        return ''.join(self._text_parts)
+
+    def start(self, name: str, attrs: Dict[str, Optional[str]]) -> None:
+        if name in RUBY_ANNOTATIONS:
+            # Also closes an annotation left open
+            self._annotation = []
+        elif self._annotation is not None:
+            self._annotation.append(name)
+
+        if name in NON_TEXT_ELEMENTS:
+            self._skip_depth += 1
+        elif name in self.heading_counts:
+            self.heading_counts[name] += 1
+        elif name == 'a':
+            href = attrs.get('href')
+            if href is not None:
+                self.links.append(href)
+        elif name == 'img':
+            self.total_images += 1
+            if not attrs.get('alt'):
+                self.images_without_alt += 1
+        elif name == 'meta':
+            meta_name = attrs.get('name')
+            if meta_name == 'description' and not self._found_meta_description:
+                self._found_meta_description = True
+                self.meta_description = attrs.get('content')
+            elif meta_name == 'viewport':
+                self.has_viewport_meta = True
+        elif name == 'link':
+            # 'shortcut icon' is two rel tokens, so this covers it too
+            if 'icon' in (attrs.get('rel') or '').split():
+                self.has_favicon = True
+        elif name == 'title':
+            if self._title_parts is None:
+                self._title_parts = []
+            if self.title is None:
+                self._title_depth += 1
+
+    def end(self, name: str) -> None:
+        if self._annotation is not None:
+            if name in self._annotation:
+                del self._annotation[len(self._annotation) - 1 - self._annotation[::-1].index(name):]
+            else:
+                # </rt>, </rp>, or the end of an element around the annotation
+                self._annotation = None
+
+        if name in NON_TEXT_ELEMENTS:
+            self._skip_depth = max(self._skip_depth - 1, 0)
+        elif name == 'title' and self._title_depth:
+            self._title_depth -= 1
+            if not self._title_depth:
+                self.title = ''.join(self._title_parts)
+
+    def data(self, text: str) -> None:
+        if self._skip_depth or self._annotation is not None:
+            return
+        self._text_parts.append(text)
+        if self._title_depth:
+            self._title_parts.append(text)
+
+    def close(self) -> None:
+        # An unclosed <title> runs to the end of the document
+        if self._title_depth:
+            self.title = ''.join(self._title_parts)
+            self._title_depth = 0
+
+
+def decode_html(html: Union[bytes, str]) -> str:
+    """Decode a page body the way BeautifulSoup would, honouring meta charset"""
+    if isinstance(html, str):
+        return html
+    return UnicodeDammit(html, is_html=True).unicode_markup or ''
+
+
+def feed_beautifulsoup(markup: str, collector: PageCollector) -> None:
+    """Reference backend: build a BeautifulSoup tree with html.parser and walk it"""
+    soup = BeautifulSoup(markup, 'html.parser')
+    # Iterative walk so deeply nested pages can't hit the recursion limit
+    stack = [iter(soup.contents)]
+    open_tags = []
+    while stack:
+        for node in stack[-1]:
+            if isinstance(node, Tag):
+                collector.start(node.name, _bs4_attrs(node.attrs))
+                open_tags.append(node.name)
+                stack.append(iter(node.contents))
+                break
+            if isinstance(node, NavigableString) and not isinstance(node, NON_TEXT_STRINGS):
+                collector.data(str(node))
+        else:
+            stack.pop()
+            if open_tags and len(open_tags) == len(stack):
+                collector.end(open_tags.pop())
+    collector.close()
+
+
+def _bs4_attrs(attrs):
+    # BeautifulSoup splits multi-valued attributes such as rel into lists
+    return {key: ' '.join(value) if isinstance(value, list) else value for key, value in attrs.items()}
+
+
+class _StreamParser(HTMLParser):
+    def __init__(self, collector: PageCollector):
+        super().__init__(convert_charrefs=True)
+        self.collector = collector
+
+    def handle_starttag(self, tag, attrs):
+        # Valueless attributes become '' and repeated ones keep the last
+        # value, as in BeautifulSoup.
+        self.collector.start(tag, {key: '' if value is None else value for key, value in attrs})
+
+    def handle_endtag(self, tag):
+        self.collector.end(tag)
+
+    def handle_data(self, data):
+        self.collector.data(data)
+
+    def unknown_decl(self, data):
+        # BeautifulSoup keeps CDATA sections as text
+        if data.upper().startswith('CDATA['):
+            self.collector.data(data[len('CDATA['):])
+
+
+def feed_stream(markup: str, collector: PageCollector) -> None:
+    """Pure-Python streaming backend: tokenize with html.parser, build no tree"""
+    parser = _StreamParser(collector)
+    parser.feed(markup)
+    parser.close()
+    collector.close()
+
+
+def feed_lxml(markup: str, collector: PageCollector) -> None:
+    """libxml2 backend: walk lxml's element tree with start/end events"""
+    from lxml import etree
+
+    parser = etree.HTMLParser(encoding='utf-8', remove_comments=True, remove_pis=True)
+    root = etree.fromstring(markup.encode('utf-8'), parser)
+    if root is not None:
+        for event, element in etree.iterwalk(root, events=('start', 'end')):
+            tag = element.tag
+            if not isinstance(tag, str):
+                continue
+            if event == 'start':
+                collector.start(tag, dict(element.attrib))
+                if element.text:
+                    collector.data(element.text)
+            else:
+                collector.end(tag)
+                if element.tail:
+                    collector.data(element.tail)
+    collector.close()
+
+
+BACKENDS: Dict[str, Callable[[str, PageCollector], None]] = {
+    'html.parser': feed_beautifulsoup,
+    'stream': feed_stream,
+    'lxml': feed_lxml,
+}
+
+# Backends that need an optional package, and the module to check for it
+OPTIONAL_BACKENDS = {'lxml': 'lxml'}
+
+FALLBACK_BACKEND = 'stream'
+
+
+def available_backends() -> List[str]:
+    """Names of the backends usable in this environment"""
+    names = []
+    for name in BACKENDS:
+        module = OPTIONAL_BACKENDS.get(name)
+        if module is not None:
+            try:
+                __import__(module)
+            except ImportError:
+                continue
+        names.append(name)
+    return names
+
+
+def get_backend(name: str) -> Callable[[str, PageCollector], None]:
+    """Return the named backend, falling back to pure Python if it's unavailable"""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown HTML parser backend {name!r}; choose from {', '.join(BACKENDS)}")
+    if name not in available_backends():
+        logger.warning(f"HTML parser backend {name!r} is not installed, using {FALLBACK_BACKEND!r}")
+        name = FALLBACK_BACKEND
+    return BACKENDS[name]
+
+
+def parse_page(html: Union[bytes, str], backend: str) -> PageCollector:
+    """Decode ``html`` and run it through the chosen backend"""
+    collector = PageCollector()
+    get_backend(backend)(decode_html(html), collector)
+    return collector
@@ -0,0 +1,114 @@
+# apps/monitor/services/http.py
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ReadTimeoutError
+from django.conf import settings
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+}
+
+CHUNK_SIZE = 64 * 1024
+
+_local = threading.local()
+
+
+def build_session() -> requests.Session:
+    """Create a keep-alive session with a connection pool sized from settings"""
+    session = requests.Session()
+    session.headers.update(DEFAULT_HEADERS)
+    adapter = HTTPAdapter(
+        pool_connections=settings.MONITOR_HTTP_POOL_CONNECTIONS,
+        pool_maxsize=settings.MONITOR_HTTP_POOL_MAXSIZE,
+    )
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def get_session() -> requests.Session:
+    """Return the pooled session for this worker, creating it on first use.
+
+    Sessions are never shared across a fork: a prefork child that inherited
+    its parent's session gets a fresh one instead of reusing its sockets.
+    """
+    pid = os.getpid()
+    if getattr(_local, 'pid', None) != pid:
+        _local.session = build_session()
+        _local.pid = pid
+    return _local.session
+
+
+def fetch_page(url: str, timeout: float = 10, max_bytes: Optional[int] = None,
+               deadline: Optional[float] = None,
+               headers: Optional[Dict[str, str]] = None) -> Tuple[requests.Response, bytes, bool]:
+    """Stream a page body instead of buffering it whole.
+
+    Reading stops once ``max_bytes`` have arrived, once ``deadline`` seconds
+    have passed since the request started, or right after the closing
+    ``</html>`` tag. Returns ``(response, body, truncated)``; ``truncated`` is
+    True when the cap or the deadline cut the body short.
+    """
+    start = time.monotonic()
+    chunks = []
+    size = 0
+    truncated = False
+    tail = b''
+
+    with get_session().get(url, timeout=timeout, headers=headers, stream=True) as response:
+        connection = getattr(response.raw, 'connection', None)
+        sock = getattr(connection, 'sock', None)
+        # The connection goes back to the pool afterwards; later requests on
+        # it must get the socket timeout they asked for, not our shortened one
+        sock_timeout = sock.gettimeout() if sock is not None else None
+        try:
+            while True:
+                # Whether a read timeout now means the deadline has passed
+                at_deadline = False
+                if deadline is not None:
+                    remaining = deadline - (time.monotonic() - start)
+                    if remaining <= 0:
+                        truncated = True
+                        break
+                    # A body trickled in slowly would otherwise hold a read
+                    # until a whole chunk arrives
+                    if sock is not None:
+                        sock.settimeout(min(remaining, timeout))
+                        at_deadline = remaining <= timeout
+                try:
+                    # Whatever has arrived, up to CHUNK_SIZE, after one socket read
+                    chunk = response.raw.read1(CHUNK_SIZE, decode_content=True)
+                except ReadTimeoutError as e:
+                    if not at_deadline:
+                        raise requests.exceptions.ConnectionError(e)
+                    truncated = True
+                    break
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                size += len(chunk)
+                if max_bytes is not None and size > max_bytes:
+                    truncated = True
+                    break
+                # Anything after </html> is irrelevant to the checks; keep the
+                # previous chunk's tail so a tag split across chunks is seen.
+                if b'</html' in (tail + chunk).lower():
+                    break
+                tail = chunk[-len(b'</html'):]
+        finally:
+            if sock is not None:
+                try:
+                    sock.settimeout(sock_timeout)
+                except OSError:
+                    # Already closed, so it won't be reused
+                    pass
+
+    body = b''.join(chunks)
+    if max_bytes is not None:
+        body = body[:max_bytes]
+    return response, body, truncated
@@ -0,0 +1,138 @@
+# apps/monitor/services/keywords.py
+import logging
+from datetime import date, datetime, timedelta
+from datetime import timezone as dt_timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.db import DatabaseError, transaction
+from django.db.models import Max, Q
+from django.dispatch import receiver
+from django.utils import timezone
+
+from ..models import KeywordSample, SEOLog, Website
+from ..signals import logs_written
+
+logger = logging.getLogger(__name__)
+
+TERM_MAX_LENGTH = KeywordSample._meta.get_field('term').max_length
+
+
+def _day(checked_at: datetime) -> date:
+    return checked_at.astimezone(dt_timezone.utc).date()
+
+
+def index_reports(seo_logs: Iterable[SEOLog]) -> int:
+    """Fold the top keywords of new SEO reports into the KeywordSample index
+
+    A website's samples for a day are those of the day's latest report: a
+    newer report replaces them, including dropping terms it no longer
+    lists, and a report older than the day's samples changes nothing. The
+    websites' rows are locked in id order first, so concurrent writers for
+    the same website take turns. Returns the samples written.
+    """
+    # (website, day) -> the latest report among these
+    latest: Dict[Tuple[int, date], SEOLog] = {}
+    for log in seo_logs:
+        key = (log.website_id, _day(log.checked_at))
+        if key not in latest or latest[key].checked_at < log.checked_at:
+            latest[key] = log
+    if not latest:
+        return 0
+
+    with transaction.atomic():
+        list(Website.objects.select_for_update()
+             .filter(id__in={website_id for website_id, _ in latest})
+             .order_by('id').values_list('id', flat=True))
+
+        indexed = (KeywordSample.objects
+                   .filter(website_id__in={website_id for website_id, _ in latest},
+                           day__in={day for _, day in latest})
+                   .values_list('website_id', 'day')
+                   .annotate(newest=Max('checked_at')))
+        for website_id, day, newest in indexed:
+            if (website_id, day) in latest and latest[(website_id, day)].checked_at < newest:
+                del latest[(website_id, day)]
+        if not latest:
+            return 0
+
+        stale = Q()
+        for (website_id, day), log in latest.items():
+            stale |= Q(website_id=website_id, day=day, checked_at__lt=log.checked_at)
+        KeywordSample.objects.filter(stale).delete()
+
+        samples = {}
+        for (website_id, day), log in latest.items():
+            density = log.keyword_density or {}
+            for term, count in (log.top_keywords or {}).items():
+                samples[(website_id, term[:TERM_MAX_LENGTH], day)] = KeywordSample(
+                    website_id=website_id, term=term[:TERM_MAX_LENGTH], day=day, count=count,
+                    density=density.get(term, 0), checked_at=log.checked_at)
+        KeywordSample.objects.bulk_create(
+            samples.values(), update_conflicts=True, unique_fields=['website', 'term', 'day'],
+            update_fields=['count', 'density', 'checked_at'], batch_size=1000)
+
+    return len(samples)
+
+
+@receiver(logs_written)
+def update_keyword_index(sender, seo_logs=(), **kwargs):
+    try:
+        index_reports(seo_logs)
+    except DatabaseError as e:
+        # The reports are committed; `manage.py index_keywords` rebuilds the index.
+        logger.error(f"Indexing keywords of {len(seo_logs)} SEO reports failed: {str(e)}")
+
+
+def keyword_series(website: Website, term: str, days: int = 90,
+                   today: Optional[date] = None) -> List[Dict]:
+    """``term``'s count and density per day over the last ``days`` days, oldest first
+
+    Days on which the term wasn't among the top keywords are absent.
+    """
+    today = today or _day(timezone.now())
+    return list(KeywordSample.objects
+                .filter(website=website, term=term, day__gt=today - timedelta(days=days), day__lte=today)
+                .order_by('day')
+                .values('day', 'count', 'density'))
+
+
+def _standing(samples: List[Tuple[str, date, int]]) -> Dict[str, int]:
+    # Each term's count on its latest day in the window; terms missing from
+    # the window's latest indexed day have dropped out of the top keywords
+    if not samples:
+        return {}
+    last_day = max(day for _, day, _ in samples)
+    latest = {}
+    for term, day, count in sorted(samples, key=lambda sample: sample[1]):
+        latest[term] = count if day == last_day else 0
+    return latest
+
+
+def biggest_movers(website: Website, days: int = 7, limit: int = 10,
+                   today: Optional[date] = None) -> List[Dict]:
+    """Terms whose count changed most between the previous ``days`` days and the last ``days``
+
+    Compares where each term stood at the end of each window. Terms new to
+    the top keywords start from 0 and terms that dropped out end at 0.
+    Returns ``{'term', 'previous', 'current', 'change'}`` dicts, largest
+    change (either way) first.
+    """
+    today = today or _day(timezone.now())
+    start = today - timedelta(days=days)
+    rows = (KeywordSample.objects
+            .filter(website=website, day__gt=start - timedelta(days=days), day__lte=today)
+            .values_list('term', 'day', 'count'))
+
+    current, previous = [], []
+    for term, day, count in rows:
+        (current if day > start else previous).append((term, day, count))
+    now, before = _standing(current), _standing(previous)
+
+    movers = [
+        {'term': term, 'previous': before.get(term, 0), 'current': now.get(term, 0),
+         'change': now.get(term, 0) - before.get(term, 0)}
+        for term in now.keys() | before.keys()
+    ]
+    movers = [mover for mover in movers if mover['change']]
+    movers.sort(key=lambda mover: (-abs(mover['change']), mover['term']))
+    return movers[:limit]
@@ -0,0 +1,140 @@
+# apps/monitor/services/link_checker.py
+import asyncio
+import hashlib
+import logging
+from collections import defaultdict
+from typing import Dict, Iterable, List
+from urllib.parse import urlparse
+
+import aiohttp
+from django.conf import settings
+from django.core.cache import cache
+from django.dispatch import receiver
+from kombu.exceptions import OperationalError
+
+from ..signals import logs_written
+from . import metrics
+from .http import DEFAULT_HEADERS
+
+logger = logging.getLogger(__name__)
+
+# Status recorded for links that couldn't be fetched at all
+UNREACHABLE = 0
+
+
+def is_broken(status: int) -> bool:
+    return status == UNREACHABLE or status >= 400
+
+
+def _cache_key(url: str) -> str:
+    return 'monitor:link:' + hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+
+class LinkChecker:
+    """Check many links concurrently, each distinct URL at most once.
+
+    Statuses are shared through the cache, good links for
+    MONITOR_LINK_CACHE_TTL and broken ones for the shorter
+    MONITOR_LINK_BROKEN_CACHE_TTL, so a link found on thousands of pages is
+    fetched once per TTL. Links are tried with HEAD and, when that fails,
+    again with GET, since plenty of servers mishandle HEAD.
+    """
+
+    def __init__(self, max_in_flight: int = 100, per_host_limit: int = 4, timeout: int = 5):
+        self.max_in_flight = max_in_flight
+        self.per_host_limit = per_host_limit
+        self.timeout = timeout
+
+    def check(self, urls: Iterable[str]) -> Dict[str, int]:
+        """Return the HTTP status of every URL, UNREACHABLE for failures"""
+        keys = {url: _cache_key(url) for url in set(urls)}
+        if not keys:
+            return {}
+
+        cached = cache.get_many(list(keys.values()))
+        statuses = {url: cached[key] for url, key in keys.items() if key in cached}
+        pending = [url for url in keys if url not in statuses]
+        metrics.incr('link_checks_cached', len(statuses))
+
+        if pending:
+            fresh = asyncio.run(self._run(pending))
+            statuses.update(fresh)
+            metrics.incr('link_checks_made', len(fresh))
+            cache.set_many({keys[url]: status for url, status in fresh.items() if not is_broken(status)},
+                           timeout=settings.MONITOR_LINK_CACHE_TTL)
+            cache.set_many({keys[url]: status for url, status in fresh.items() if is_broken(status)},
+                           timeout=settings.MONITOR_LINK_BROKEN_CACHE_TTL)
+        return statuses
+
+    async def _run(self, urls: List[str]) -> Dict[str, int]:
+        in_flight = asyncio.Semaphore(self.max_in_flight)
+        host_limits = defaultdict(lambda: asyncio.Semaphore(self.per_host_limit))
+        connector = aiohttp.TCPConnector(limit=self.max_in_flight, limit_per_host=self.per_host_limit)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout,
+                                         headers=DEFAULT_HEADERS) as session:
+            async def bounded(url):
+                async with in_flight, host_limits[urlparse(url).hostname or '']:
+                    return await self._check(session, url)
+
+            results = await asyncio.gather(*(bounded(url) for url in urls))
+
+        return dict(zip(urls, results))
+
+    async def _check(self, session: aiohttp.ClientSession, url: str) -> int:
+        try:
+            async with session.head(url, allow_redirects=True) as response:
+                if response.status < 400:
+                    return response.status
+        except asyncio.TimeoutError:
+            return UNREACHABLE
+        except (aiohttp.ClientError, ValueError):
+            pass
+
+        # Only the status matters; leaving the block drops the body unread
+        try:
+            async with session.get(url, allow_redirects=True) as response:
+                return response.status
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+            return UNREACHABLE
+
+
+def get_link_checker() -> LinkChecker:
+    return LinkChecker(
+        max_in_flight=settings.MONITOR_LINK_CHECK_MAX_IN_FLIGHT,
+        per_host_limit=settings.MONITOR_LINK_CHECK_PER_HOST_LIMIT,
+        timeout=settings.MONITOR_LINK_CHECK_TIMEOUT,
+    )
+
+
+def count_broken(links_by_page: Dict[int, List[str]]) -> Dict[int, Dict[str, int]]:
+    """Check every page's links in one deduplicated pass
+
+    Returns ``{page: {'broken_links': n, 'links_checked': m}}``. At most
+    MONITOR_LINK_CHECK_MAX_PER_PAGE links are checked per page.
+    """
+    limit = settings.MONITOR_LINK_CHECK_MAX_PER_PAGE
+    links_by_page = {page: links[:limit] for page, links in links_by_page.items()}
+    statuses = get_link_checker().check(link for links in links_by_page.values() for link in links)
+    return {
+        page: {
+            'broken_links': sum(is_broken(statuses[link]) for link in links),
+            'links_checked': len(links),
+        }
+        for page, links in links_by_page.items()
+    }
+
+
+@receiver(logs_written)
+def queue_link_checks(sender, seo_logs=(), **kwargs):
+    # Writers attach the page's links to each new SEOLog as ``links``
+    links_by_log = {log.id: log.links for log in seo_logs
+                    if log.id is not None and getattr(log, 'links', None)}
+    if links_by_log:
+        from ..tasks import check_page_links
+        try:
+            check_page_links.delay(links_by_log)
+        except OperationalError as e:
+            # The rows are written; they just keep broken_links unset.
+            logger.error(f"Could not queue link checks for {len(links_by_log)} pages: {str(e)}")
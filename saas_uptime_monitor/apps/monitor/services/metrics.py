@@ -0,0 +1,228 @@
+# apps/monitor/services/metrics.py
+import logging
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import redis
+from celery.signals import task_postrun, worker_process_shutdown, worker_shutdown
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+PREFIX = 'monitor_'
+STORE_KEY = 'monitor:metrics'
+
+LE_RE = re.compile(r'\ble="([^"]+)",?')
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+FAST_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+LAG_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 900, 3600)
+STAGE_BUCKETS = (0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# name -> (help, buckets). Counters need no declaration; incr() of an unknown
+# name just creates ``monitor_<name>_total``.
+HISTOGRAMS = {
+    'probe_response_seconds': ("Probe response time by outcome", LATENCY_BUCKETS),
+    'seo_parse_seconds': ("Time to parse and score one page", FAST_BUCKETS),
+    'db_write_seconds': ("Time to write one sink flush to the database", FAST_BUCKETS),
+    'scheduler_lag_seconds': ("How long past its due time a website was dispatched", LAG_BUCKETS),
+    'task_stage_seconds': ("Time per stage of profiled task runs", STAGE_BUCKETS),
+}
+COUNTER_HELP = {
+    'probes': "Probes by outcome: up, down, error or deferred by the rate limiter",
+    'rows_written': "Log rows written by the result sink",
+}
+
+
+def _series(name: str, labels: Dict[str, str]) -> str:
+    if not labels:
+        return name
+    pairs = ','.join(f'{key}="{value}"' for key, value in sorted(labels.items()))
+    return f'{name}{{{pairs}}}'
+
+
+def _sort_key(series: str) -> Tuple[str, float]:
+    # Keep each histogram's buckets together and in numeric order
+    match = LE_RE.search(series)
+    return LE_RE.sub('', series), float(match.group(1)) if match else 0.0
+
+
+def _format(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Registry:
+    """Counters and histograms buffered per process.
+
+    Recording only touches a dict. ``flush()`` adds the buffered deltas to a
+    Redis hash shared by every process (one HINCRBYFLOAT per series in a
+    pipeline), so /metrics on any web process reports the totals of all
+    workers. Without MONITOR_REDIS_URL, or while Redis is down, the totals
+    stay in this process.
+    """
+
+    def __init__(self, redis_url: Optional[str] = None, flush_interval: float = 10):
+        self.flush_interval = flush_interval
+        self.client = redis.Redis.from_url(redis_url, decode_responses=True) if redis_url else None
+        self._lock = threading.Lock()
+        self._pending: Dict[str, float] = {}
+        self._local: Dict[str, float] = {}
+        self._flushed_at = time.monotonic()
+
+    def incr(self, name: str, amount: float = 1, **labels) -> None:
+        self._add([(_series(f'{PREFIX}{name}_total', labels), amount)])
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        _, buckets = HISTOGRAMS[name]
+        base = f'{PREFIX}{name}'
+        # Every bucket gets a delta, even of 0, so all of them exist from the
+        # first observation on
+        deltas = [(_series(f'{base}_bucket', {**labels, 'le': _format(bound)}), int(value <= bound))
+                  for bound in buckets]
+        deltas.append((_series(f'{base}_bucket', {**labels, 'le': '+Inf'}), 1))
+        deltas.append((_series(f'{base}_sum', labels), value))
+        deltas.append((_series(f'{base}_count', labels), 1))
+        self._add(deltas)
+
+    def _add(self, deltas: List[Tuple[str, float]]) -> None:
+        with self._lock:
+            for series, amount in deltas:
+                self._pending[series] = self._pending.get(series, 0) + amount
+            due = time.monotonic() - self._flushed_at >= self.flush_interval
+        if due:
+            self.flush()
+
+    def flush(self) -> None:
+        """Push the buffered deltas to the shared store"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._flushed_at = time.monotonic()
+        if not pending:
+            return
+
+        if self.client is not None:
+            try:
+                pipe = self.client.pipeline(transaction=False)
+                for series, amount in pending.items():
+                    pipe.hincrbyfloat(STORE_KEY, series, amount)
+                pipe.execute()
+                return
+            except redis.RedisError as e:
+                logger.warning(f"Could not push {len(pending)} metric series: {str(e)}")
+        with self._lock:
+            for series, amount in pending.items():
+                self._local[series] = self._local.get(series, 0) + amount
+
+    def totals(self) -> Dict[str, float]:
+        """Every series with its total across processes, after flushing this one"""
+        self.flush()
+        totals = {}
+        if self.client is not None:
+            try:
+                totals = {series: float(value) for series, value in self.client.hgetall(STORE_KEY).items()}
+            except redis.RedisError as e:
+                logger.warning(f"Could not read metrics: {str(e)}")
+        with self._lock:
+            for series, value in self._local.items():
+                totals[series] = totals.get(series, 0) + value
+        return totals
+
+
+_registry = None
+
+
+def get_registry() -> Registry:
+    global _registry
+    if _registry is None:
+        _registry = Registry(redis_url=settings.MONITOR_REDIS_URL,
+                             flush_interval=settings.MONITOR_METRICS_FLUSH_INTERVAL)
+    return _registry
+
+
+def incr(name: str, amount: float = 1, **labels) -> None:
+    """Add ``amount`` to the counter ``monitor_<name>_total``"""
+    get_registry().incr(name, amount, **labels)
+
+
+def observe(name: str, value: float, **labels) -> None:
+    """Record ``value`` in one of the HISTOGRAMS"""
+    get_registry().observe(name, value, **labels)
+
+
+@contextmanager
+def timer(name: str, **labels) -> Iterator[None]:
+    """Observe how long the block takes in the histogram ``name``"""
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        observe(name, time.monotonic() - started, **labels)
+
+
+def get(name: str, **labels) -> float:
+    """Return the current total of a counter"""
+    return get_registry().totals().get(_series(f'{PREFIX}{name}_total', labels), 0)
+
+
+def queue_depths(queues: List[str]) -> Dict[str, int]:
+    """Messages waiting in each Celery queue, skipping queues the broker doesn't have"""
+    from celery import current_app
+
+    depths = {}
+    with current_app.connection_for_read() as connection:
+        connection.ensure_connection(max_retries=1, interval_start=0, interval_step=0)
+        channel = connection.default_channel
+        for queue in queues:
+            try:
+                depths[queue] = channel.queue_declare(queue=queue, passive=True).message_count
+            except connection.channel_errors:
+                # Not declared yet: no worker or producer has used it
+                channel = connection.channel()
+    return depths
+
+
+def render(gauges: Optional[Dict[str, Tuple[str, List[Tuple[Dict[str, str], float]]]]] = None) -> str:
+    """The Prometheus text exposition of every series
+
+    ``gauges`` adds values computed at scrape time, as
+    ``{name: (help, [(labels, value), ...])}``.
+    """
+    families = {}
+    for series, value in get_registry().totals().items():
+        name = series.split('{', 1)[0]
+        for suffix in ('_bucket', '_sum', '_count'):
+            if name.endswith(suffix) and name[len(PREFIX):-len(suffix)] in HISTOGRAMS:
+                family = name[:-len(suffix)]
+                break
+        else:
+            family = name
+        families.setdefault(family, []).append((series, value))
+
+    lines = []
+    for family in sorted(families):
+        short = family[len(PREFIX):]
+        if short in HISTOGRAMS:
+            lines += [f'# HELP {family} {HISTOGRAMS[short][0]}', f'# TYPE {family} histogram']
+        else:
+            counter = short[:-len('_total')]
+            lines += [f'# HELP {family} {COUNTER_HELP.get(counter, counter.replace("_", " ").capitalize())}',
+                      f'# TYPE {family} counter']
+        lines += [f'{series} {_format(value)}'
+                  for series, value in sorted(families[family], key=lambda item: _sort_key(item[0]))]
+
+    for name, (help_text, values) in sorted((gauges or {}).items()):
+        lines += [f'# HELP {PREFIX}{name} {help_text}', f'# TYPE {PREFIX}{name} gauge']
+        lines += [f'{_series(PREFIX + name, labels)} {_format(value)}' for labels, value in values]
+    return '\n'.join(lines) + '\n'
+
+
+@task_postrun.connect
+@worker_process_shutdown.connect
+@worker_shutdown.connect
+def flush_metrics(**kwargs):
+    """Push what a task recorded instead of waiting for the next interval"""
+    if _registry is not None:
+        _registry.flush()
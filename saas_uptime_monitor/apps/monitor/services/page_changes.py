@@ -0,0 +1,90 @@
+# apps/monitor/services/page_changes.py
+import hashlib
+import logging
+from typing import Dict, Optional
+
+from django.db import DatabaseError
+from django.dispatch import receiver
+from django.utils import timezone
+
+from ..models import Website, WebsiteStatus
+from ..signals import logs_written
+
+logger = logging.getLogger(__name__)
+
+FINGERPRINT_FIELDS = ['seo_etag', 'seo_last_modified', 'seo_content_hash', 'seo_verified_at']
+
+
+def current_status(website: Website) -> Optional[WebsiteStatus]:
+    """The website's WebsiteStatus, or None before its first check"""
+    try:
+        return website.status
+    except WebsiteStatus.DoesNotExist:
+        return None
+
+
+def conditional_headers(status: Optional[WebsiteStatus]) -> Dict[str, str]:
+    """If-None-Match / If-Modified-Since headers for the page's last SEO fetch"""
+    headers = {}
+    if status is not None and status.seo_content_hash:
+        if status.seo_etag:
+            headers['If-None-Match'] = status.seo_etag
+        if status.seo_last_modified:
+            headers['If-Modified-Since'] = status.seo_last_modified
+    return headers
+
+
+def content_hash(body: bytes) -> str:
+    return hashlib.sha256(body).hexdigest()
+
+
+def is_unchanged(status: Optional[WebsiteStatus], uptime_result: Dict) -> bool:
+    """Whether a check shows the page is the one the latest SEOLog describes"""
+    if status is None or not status.seo_content_hash:
+        return False
+    if uptime_result.get('status_code') == 304:
+        return True
+    body = uptime_result.get('body')
+    return body is not None and content_hash(body) == status.seo_content_hash
+
+
+def fingerprint(uptime_result: Dict) -> Dict:
+    """The WebsiteStatus fingerprint fields for a freshly analysed page"""
+    return {
+        'seo_etag': (uptime_result.get('etag') or '')[:255],
+        'seo_last_modified': (uptime_result.get('last_modified') or '')[:64],
+        'seo_content_hash': content_hash(uptime_result['body']),
+        'seo_verified_at': timezone.now(),
+    }
+
+
+def save_fingerprints(fingerprints: Dict[int, Dict]) -> None:
+    """Write fingerprint updates, keyed by website id, in one bulk update
+
+    An update holding only ``seo_verified_at`` just marks the page as
+    checked and unchanged.
+    """
+    if not fingerprints:
+        return
+    WebsiteStatus.objects.bulk_create(
+        [WebsiteStatus(website_id=website_id) for website_id in fingerprints], ignore_conflicts=True)
+    full, verified = [], []
+    for website_id, update in fingerprints.items():
+        status = WebsiteStatus(website_id=website_id, **update)
+        (full if 'seo_content_hash' in update else verified).append(status)
+    WebsiteStatus.objects.bulk_update(full, FINGERPRINT_FIELDS, batch_size=1000)
+    WebsiteStatus.objects.bulk_update(verified, ['seo_verified_at'], batch_size=1000)
+
+
+@receiver(logs_written)
+def save_written_fingerprints(sender, seo_logs=(), **kwargs):
+    # Writers attach the analysed page's fingerprint to each new SEOLog as
+    # ``fingerprint``; it's only saved once the SEOLog it describes is
+    # committed, so a lost SEOLog never leaves a page marked as analysed.
+    fingerprints = {log.website_id: log.fingerprint for log in seo_logs
+                    if log.id is not None and getattr(log, 'fingerprint', None)}
+    try:
+        save_fingerprints(fingerprints)
+    except DatabaseError as e:
+        # Without it the next check just analyses the page again
+        logger.error(f"Saving fingerprints of {len(fingerprints)} pages failed: {str(e)}")
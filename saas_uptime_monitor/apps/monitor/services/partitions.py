@@ -0,0 +1,211 @@
+# apps/monitor/services/partitions.py
+import logging
+import re
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import List, NamedTuple, Optional
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from ..models import UptimeLog
+
+logger = logging.getLogger(__name__)
+
+INTERVALS = {
+    'daily': timedelta(days=1),
+    'weekly': timedelta(weeks=1),
+}
+
+BOUND_RE = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+
+class Partition(NamedTuple):
+    name: str
+    start: datetime
+    end: datetime
+
+
+def table_name() -> str:
+    return UptimeLog._meta.db_table
+
+
+def is_supported() -> bool:
+    """Native partitioning needs PostgreSQL; other databases keep one table"""
+    return connection.vendor == 'postgresql'
+
+
+def is_partitioned() -> bool:
+    """Whether the UptimeLog table has been converted by ``convert_table``"""
+    if not is_supported():
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", [table_name()])
+        return cursor.fetchone() is not None
+
+
+def period_start(moment: datetime, interval: str) -> datetime:
+    """Start of the UTC day, or of the week starting Monday, holding ``moment``"""
+    day = moment.astimezone(dt_timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    if interval == 'weekly':
+        day -= timedelta(days=day.weekday())
+    return day
+
+
+def list_partitions() -> List[Partition]:
+    """Return the range partitions of the UptimeLog table, oldest first"""
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT child.relname, pg_get_expr(child.relpartbound, child.oid)
+            FROM pg_inherits
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE pg_inherits.inhparent = to_regclass(%s)
+        """, [table_name()])
+        rows = cursor.fetchall()
+
+    partitions = []
+    for name, bound in rows:
+        match = BOUND_RE.search(bound)
+        if match is None:
+            continue  # the DEFAULT partition
+        start, end = (datetime.fromisoformat(value) for value in match.groups())
+        partitions.append(Partition(name, start, end))
+    return sorted(partitions, key=lambda partition: partition.start)
+
+
+def ensure_partitions(now: Optional[datetime] = None, interval: Optional[str] = None) -> List[str]:
+    """Create the partitions for the current period and the next few.
+
+    MONITOR_UPTIME_PARTITION_PREMAKE periods are kept ready ahead of time so
+    inserts never fall through to the default partition. Returns the names
+    of the partitions created.
+    """
+    interval = interval or settings.MONITOR_UPTIME_PARTITION_INTERVAL
+    now = now or timezone.now()
+    existing = {partition.start for partition in list_partitions()}
+
+    created = []
+    start = period_start(now, interval)
+    for _ in range(settings.MONITOR_UPTIME_PARTITION_PREMAKE + 1):
+        end = start + INTERVALS[interval]
+        if start not in existing:
+            created.append(_create_partition(start, end))
+        start = end
+    return created
+
+
+def drop_partitions_before(cutoff: datetime) -> List[str]:
+    """Drop every partition that ends at or before ``cutoff``.
+
+    Dropping a partition removes its rows without a DELETE, so expiring a
+    day of checks costs the same however many rows it holds.
+    """
+    dropped = []
+    qn = connection.ops.quote_name
+    for partition in list_partitions():
+        if partition.end > cutoff:
+            break
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE {qn(partition.name)}")
+        dropped.append(partition.name)
+        logger.info(f"Dropped uptime log partition {partition.name}")
+    return dropped
+
+
+def convert_table(interval: str) -> int:
+    """Turn the UptimeLog table into a table partitioned by ``checked_at``.
+
+    Existing rows are copied into partitions covering their time range,
+    indexes and foreign keys are recreated under their Django names, and
+    ``id`` keeps counting from its current value. PostgreSQL requires the
+    primary key to include the partition key, so it becomes
+    ``(id, checked_at)``. Runs in one transaction and returns the number of
+    rows copied.
+    """
+    table = table_name()
+    legacy = f'{table}_unpartitioned'
+    qn = connection.ops.quote_name
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"LOCK TABLE {qn(table)} IN ACCESS EXCLUSIVE MODE")
+
+        # Capture index and FK definitions while they still name this table
+        cursor.execute("""
+            SELECT indexdef FROM pg_indexes
+            WHERE tablename = %s AND indexname NOT IN (
+                SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(%s) AND contype = 'p'
+            )
+        """, [table, table])
+        index_sql = [row[0] for row in cursor.fetchall()]
+        cursor.execute("""
+            SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint
+            WHERE conrelid = to_regclass(%s) AND contype = 'f'
+        """, [table])
+        foreign_keys = cursor.fetchall()
+        cursor.execute(f"SELECT MIN(checked_at), MAX(checked_at), MAX(id) FROM {qn(table)}")
+        oldest, newest, max_id = cursor.fetchone()
+
+        cursor.execute(f"ALTER TABLE {qn(table)} RENAME TO {qn(legacy)}")
+        cursor.execute(
+            f"CREATE TABLE {qn(table)} (LIKE {qn(legacy)} INCLUDING DEFAULTS) "
+            f"PARTITION BY RANGE (checked_at)")
+        cursor.execute(f"ALTER TABLE {qn(table)} ADD PRIMARY KEY (id, checked_at)")
+
+        # Identity columns aren't allowed on partitioned tables before
+        # PostgreSQL 17, so ids come from a plain sequence instead. The old
+        # identity sequence still holds the usual _id_seq name.
+        sequence = f'{table}_pk_seq'
+        cursor.execute(f"CREATE SEQUENCE {qn(sequence)} OWNED BY {qn(table)}.id")
+        cursor.execute(f"ALTER TABLE {qn(table)} ALTER COLUMN id SET DEFAULT nextval(%s)", [sequence])
+        if max_id is not None:
+            cursor.execute("SELECT setval(%s, %s)", [sequence, max_id])
+
+        cursor.execute(f"CREATE TABLE {qn(table + '_default')} PARTITION OF {qn(table)} DEFAULT")
+
+        # Partitions must exist before the rows are copied in
+        start = period_start(oldest or timezone.now(), interval)
+        while newest is not None and start <= newest:
+            end = start + INTERVALS[interval]
+            _create_partition(start, end)
+            start = end
+        ensure_partitions(interval=interval)
+
+        cursor.execute(f"INSERT INTO {qn(table)} SELECT * FROM {qn(legacy)}")
+        copied = cursor.rowcount
+        cursor.execute(f"DROP TABLE {qn(legacy)}")
+
+        for sql in index_sql:
+            cursor.execute(sql)
+        for name, definition in foreign_keys:
+            cursor.execute(f"ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(name)} {definition}")
+
+    logger.info(f"Partitioned {table} {interval}, copied {copied} rows")
+    return copied
+
+
+def _create_partition(start: datetime, end: datetime) -> str:
+    # Rows that fell through to the default partition (e.g. clock skew, or a
+    # gap in ensure_partitions runs) would make a plain PARTITION OF fail, so
+    # the partition is built standalone, takes over those rows, and is then
+    # attached. ATTACH adds the parent's indexes and foreign keys.
+    qn = connection.ops.quote_name
+    table = table_name()
+    name = f"{table}_p{start:%Y%m%d}"
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [name])
+        if cursor.fetchone()[0]:
+            return name
+        cursor.execute(f"CREATE TABLE {qn(name)} (LIKE {qn(table)} INCLUDING DEFAULTS)")
+        cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [f'{table}_default'])
+        if cursor.fetchone()[0]:
+            cursor.execute(
+                f"WITH moved AS (DELETE FROM {qn(table + '_default')} "
+                f"WHERE checked_at >= %s AND checked_at < %s RETURNING *) "
+                f"INSERT INTO {qn(name)} SELECT * FROM moved", [start, end])
+            if cursor.rowcount:
+                logger.warning(f"Moved {cursor.rowcount} uptime logs out of the default partition into {name}")
+        cursor.execute(
+            f"ALTER TABLE {qn(table)} ATTACH PARTITION {qn(name)} FOR VALUES FROM (%s) TO (%s)", [start, end])
+    logger.info(f"Created uptime log partition {name}")
+    return name
@@ -0,0 +1,88 @@
+# apps/monitor/services/phases.py
+import ssl
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+import aiohttp
+
+# UptimeLog fields filled from durations()
+PHASE_FIELDS = ['dns_time', 'connect_time', 'tls_time', 'first_byte_time', 'transfer_time']
+
+# Monotonic timestamps for the probe running in the current task. Each probe
+# runs in its own asyncio task, so each sees its own dict.
+_marks: ContextVar[Optional[Dict[str, float]]] = ContextVar('probe_phase_marks', default=None)
+
+
+def start() -> Dict[str, float]:
+    """Begin recording phase marks for the probe in the current task"""
+    marks = {'start': time.monotonic()}
+    _marks.set(marks)
+    return marks
+
+
+def mark(name: str, first: bool = True) -> None:
+    """Record that ``name`` happened now; with ``first`` an earlier mark is kept"""
+    marks = _marks.get()
+    if marks is not None and (not first or name not in marks):
+        marks[name] = time.monotonic()
+
+
+class TimedSSLObject(ssl.SSLObject):
+    """SSLObject that marks when its handshake starts and completes
+
+    asyncio calls do_handshake() until it stops raising SSLWantReadError, from
+    callbacks that run in the context of the task that opened the connection.
+    """
+
+    def do_handshake(self) -> None:
+        mark('tls_start')
+        super().do_handshake()
+        mark('tls_end')
+
+
+def ssl_context() -> ssl.SSLContext:
+    context = ssl.create_default_context()
+    context.sslobject_class = TimedSSLObject
+    return context
+
+
+def _marker(name: str, first: bool = True):
+    async def on_signal(session, trace_config_ctx, params):
+        mark(name, first)
+    return on_signal
+
+
+def trace_config() -> aiohttp.TraceConfig:
+    """aiohttp hooks marking DNS, connection and request progress
+
+    Connection phases describe the first connection a probe opens; the
+    request marks follow redirects to the final response.
+    """
+    config = aiohttp.TraceConfig()
+    config.on_dns_resolvehost_start.append(_marker('dns_start'))
+    config.on_dns_resolvehost_end.append(_marker('dns_end'))
+    config.on_connection_create_start.append(_marker('connect_start'))
+    config.on_connection_create_end.append(_marker('connect_end'))
+    config.on_request_headers_sent.append(_marker('request_sent', first=False))
+    config.on_request_end.append(_marker('response_start', first=False))
+    return config
+
+
+def durations(marks: Dict[str, float]) -> Dict[str, Optional[float]]:
+    """Seconds spent in each phase, None for phases that didn't happen"""
+    def span(begin, end):
+        if begin not in marks or end not in marks:
+            return None
+        return round(marks[end] - marks[begin], 4)
+
+    # TCP connect runs from the end of the lookup (none for IP literals) to
+    # the start of the TLS handshake, or to the connection being ready
+    connected = 'tls_start' if 'tls_start' in marks else 'connect_end'
+    return {
+        'dns_time': span('dns_start', 'dns_end'),
+        'connect_time': span('dns_end' if 'dns_end' in marks else 'connect_start', connected),
+        'tls_time': span('tls_start', 'tls_end'),
+        'first_byte_time': span('request_sent', 'response_start'),
+        'transfer_time': span('response_start', 'body_done'),
+    }
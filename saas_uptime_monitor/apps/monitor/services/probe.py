@@ -0,0 +1,192 @@
+# apps/monitor/services/probe.py
+import asyncio
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import aiohttp
+
+from . import phases
+from .dns_cache import CachingResolver
+from .http import CHUNK_SIZE, DEFAULT_HEADERS
+from .rate_limit import HostRateLimiter, retry_after_seconds
+
+# Statuses whose Retry-After header is honoured
+THROTTLE_STATUSES = (429, 503)
+
+
+class ProbeEngine:
+    """Run many uptime checks concurrently on a single asyncio event loop.
+
+    ``max_in_flight`` caps the number of requests open at once across the
+    whole batch and ``per_host_limit`` caps them per hostname, so a batch
+    full of sites on one origin doesn't hammer it. Bodies are streamed and
+    cut off at ``max_body_bytes`` or ``deadline`` seconds, like
+    ``http.fetch_page``. Results have the same shape as
+    ``tasks.check_uptime``, including the kept body when ``keep_body`` is set;
+    once a run has kept ``max_kept_bytes`` of bodies, further ones are dropped.
+
+    With a ``limiter`` each probe first reserves a token for its host and
+    waits its turn. Probes to hosts that are blocked, or whose wait would be
+    too long, are not made; their result only has ``deferred``, the seconds
+    to put them off for. A 429/503 with Retry-After blocks the host.
+
+    With ``phase_timing`` results also break the response time down into the
+    ``phases.PHASE_FIELDS``. ``dns_cache_ttl`` keeps DNS lookups for that many
+    seconds across batches instead of only for one batch's connector.
+    """
+
+    def __init__(self, max_in_flight: int = 200, per_host_limit: int = 4, timeout: int = 10,
+                 max_body_bytes: Optional[int] = None, deadline: Optional[float] = None,
+                 keep_body: bool = False, limiter: Optional[HostRateLimiter] = None,
+                 phase_timing: bool = False, dns_cache_ttl: Optional[float] = None,
+                 max_kept_bytes: Optional[int] = None):
+        self.max_in_flight = max_in_flight
+        self.per_host_limit = per_host_limit
+        self.timeout = timeout
+        self.max_body_bytes = max_body_bytes
+        self.deadline = deadline
+        self.keep_body = keep_body
+        self.limiter = limiter
+        self.phase_timing = phase_timing
+        self.dns_cache_ttl = dns_cache_ttl
+        self.max_kept_bytes = max_kept_bytes
+        self._kept_bytes = 0
+
+    def run(self, targets: Iterable[Tuple[int, str]],
+            headers: Optional[Dict[int, Dict[str, str]]] = None) -> Dict[int, Dict]:
+        """Probe every ``(key, url)`` pair and return the results keyed by ``key``
+
+        ``headers`` maps keys to extra request headers, e.g. conditional ones.
+        """
+        targets = list(targets)
+        if not targets:
+            return {}
+        return asyncio.run(self._run(targets, headers or {}))
+
+    async def _run(self, targets: List[Tuple[int, str]], headers: Dict[int, Dict[str, str]]) -> Dict[int, Dict]:
+        self._kept_bytes = 0
+        in_flight = asyncio.Semaphore(self.max_in_flight)
+        host_limits = defaultdict(lambda: asyncio.Semaphore(self.per_host_limit))
+        connector_options = {}
+        if self.dns_cache_ttl:
+            connector_options.update(resolver=CachingResolver(self.dns_cache_ttl), use_dns_cache=False)
+        if self.phase_timing:
+            connector_options['ssl'] = phases.ssl_context()
+        connector = aiohttp.TCPConnector(limit=self.max_in_flight, limit_per_host=self.per_host_limit,
+                                         **connector_options)
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=self.timeout, sock_read=self.timeout)
+        trace_configs = [phases.trace_config()] if self.phase_timing else []
+
+        starts, deferred = self._book(targets) if self.limiter is not None else ({}, {})
+
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout, headers=DEFAULT_HEADERS,
+                                         trace_configs=trace_configs) as session:
+            async def bounded(key, url):
+                if key in deferred:
+                    return {'deferred': deferred[key]}
+                host = urlparse(url).hostname or ''
+                await asyncio.sleep(starts.get(key, 0))
+                # Acquire both slots before the clock starts so queueing
+                # behind other probes is never reported as response time.
+                async with in_flight, host_limits[host]:
+                    result = await self._probe(session, url, headers.get(key))
+                if self.limiter is not None and result.get('retry_after'):
+                    self.limiter.block(host, result['retry_after'])
+                return result
+
+            results = await asyncio.gather(*(bounded(key, url) for key, url in targets))
+
+        return {key: result for (key, _), result in zip(targets, results)}
+
+    def _book(self, targets: List[Tuple[int, str]]) -> Tuple[Dict[int, float], Dict[int, float]]:
+        # One limiter call per host: the delay before each probe starts, and
+        # the probes to defer with how long for
+        keys_by_host = defaultdict(list)
+        for key, url in targets:
+            keys_by_host[urlparse(url).hostname or ''].append(key)
+        blocked = self.limiter.blocked_for(keys_by_host)
+
+        starts, deferred = {}, {}
+        for host, keys in keys_by_host.items():
+            if host in blocked:
+                deferred.update((key, blocked[host]) for key in keys)
+                continue
+            waits = self.limiter.reserve(host, len(keys))
+            starts.update(zip(keys, waits))
+            deferred.update((key, self.limiter.max_wait) for key in keys[len(waits):])
+        return starts, deferred
+
+    async def _probe(self, session: aiohttp.ClientSession, url: str,
+                     headers: Optional[Dict[str, str]] = None) -> Dict:
+        result = {
+            'status_code': 0,
+            'response_time': 0,
+            'is_up': False,
+            'error_message': ''
+        }
+
+        marks = phases.start() if self.phase_timing else None
+        try:
+            start_time = time.monotonic()
+            async with session.get(url, headers=headers) as response:
+                body, truncated = await self._read_body(response, start_time)
+                response_time = time.monotonic() - start_time
+                phases.mark('body_done')
+
+                result['status_code'] = response.status
+                result['response_time'] = round(response_time, 2)
+                result['is_up'] = 200 <= response.status < 400
+                if response.status in THROTTLE_STATUSES:
+                    result['retry_after'] = retry_after_seconds(response.headers.get('Retry-After'))
+
+                if self.keep_body and response.status == 200 and self._keep(body):
+                    result['body'] = body
+                    result['body_truncated'] = truncated
+                    result['etag'] = response.headers.get('ETag', '')
+                    result['last_modified'] = response.headers.get('Last-Modified', '')
+
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            result['error_message'] = str(e) or e.__class__.__name__
+
+        if marks is not None:
+            result.update(phases.durations(marks))
+        return result
+
+    def _keep(self, body: bytes) -> bool:
+        # Bodies past the run's max_kept_bytes are dropped; their SEO check
+        # downloads the page again instead of the batch holding them all
+        if self.max_kept_bytes is not None and self._kept_bytes + len(body) > self.max_kept_bytes:
+            return False
+        self._kept_bytes += len(body)
+        return True
+
+    async def _read_body(self, response: aiohttp.ClientResponse, started: float) -> Tuple[bytes, bool]:
+        body = bytearray()
+
+        async def read() -> bool:
+            tail = b''
+            async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                body.extend(chunk)
+                if self.max_body_bytes is not None and len(body) > self.max_body_bytes:
+                    return True
+                if b'</html' in (tail + chunk).lower():
+                    break
+                tail = chunk[-len(b'</html'):]
+            return False
+
+        if self.deadline is None:
+            truncated = await read()
+        else:
+            # The deadline runs from when the request was sent, and a body
+            # trickled in slowly is cut off mid-read rather than at its next chunk
+            try:
+                truncated = await asyncio.wait_for(read(), max(self.deadline - (time.monotonic() - started), 0))
+            except aiohttp.ServerTimeoutError:
+                raise
+            except asyncio.TimeoutError:
+                truncated = True
+        if self.max_body_bytes is not None:
+            del body[self.max_body_bytes:]
+        return bytes(body), truncated
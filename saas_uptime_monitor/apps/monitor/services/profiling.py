@@ -0,0 +1,133 @@
+# apps/monitor/services/profiling.py
+import cProfile
+import functools
+import json
+import logging
+import os
+import random
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from datetime import datetime
+from typing import ContextManager, Dict, Iterator, Optional
+
+from django.conf import settings
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+CAPTURES = ('', 'cprofile', 'tracemalloc')
+
+# The profiler of the task running in this thread/task, if it's being profiled
+_active: ContextVar[Optional['StageProfiler']] = ContextVar('stage_profiler', default=None)
+
+# Handed out whenever profiling is off; entering it does nothing
+_NULL = nullcontext()
+
+
+class StageProfiler:
+    """Timing spans for the stages of one task run.
+
+    Time spent in each ``stage()`` is summed per stage name, sent to the
+    ``task_stage_seconds`` histogram and logged when the run ends. With
+    ``capture`` set to 'cprofile' or 'tracemalloc' the whole run is also
+    profiled, and runs slower than ``slow_seconds`` save the profile, with
+    their stage timings, to ``output_dir``.
+    """
+
+    def __init__(self, task: str, capture: str = '', slow_seconds: float = 10,
+                 output_dir: Optional[str] = None):
+        if capture not in CAPTURES:
+            raise ValueError(f"Unknown profile capture {capture!r}, expected one of {CAPTURES}")
+        self.task = task
+        self.capture = capture
+        self.slow_seconds = slow_seconds
+        self.output_dir = output_dir
+        self.spans: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+        self.total = 0.0
+        self._profile = None
+        self._stop_tracemalloc = False
+
+    def __enter__(self) -> 'StageProfiler':
+        self._token = _active.set(self)
+        if self.capture == 'cprofile':
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        elif self.capture == 'tracemalloc' and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._stop_tracemalloc = True
+        self._started = time.monotonic()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.total = time.monotonic() - self._started
+        if self._profile is not None:
+            self._profile.disable()
+        snapshot = tracemalloc.take_snapshot() if self.capture == 'tracemalloc' else None
+        if self._stop_tracemalloc:
+            tracemalloc.stop()
+        _active.reset(self._token)
+
+        metrics.observe('task_stage_seconds', self.total, task=self.task, stage='total')
+        spans = ', '.join(f"{name} {seconds:.3f}s" for name, seconds in self.spans.items())
+        logger.info(f"Profiled {self.task} in {self.total:.3f}s: {spans}")
+        if self.capture and self.total >= self.slow_seconds:
+            self._save(snapshot)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - started
+            self.spans[name] = self.spans.get(name, 0.0) + elapsed
+            self.counts[name] = self.counts.get(name, 0) + 1
+            metrics.observe('task_stage_seconds', elapsed, task=self.task, stage=name)
+
+    def _save(self, snapshot: Optional[tracemalloc.Snapshot]) -> None:
+        os.makedirs(self.output_dir, exist_ok=True)
+        base = os.path.join(self.output_dir, f"{self.task}-{datetime.now():%Y%m%dT%H%M%S}-{os.getpid()}")
+        if self._profile is not None:
+            path = f'{base}.prof'
+            self._profile.dump_stats(path)
+        else:
+            path = f'{base}.tracemalloc'
+            snapshot.dump(path)
+        with open(f'{base}.json', 'w') as f:
+            json.dump({'task': self.task, 'total': self.total, 'spans': self.spans, 'counts': self.counts}, f)
+        logger.warning(f"Slow {self.task} run ({self.total:.1f}s), saved {path}")
+
+
+def profile_task(task: str) -> ContextManager:
+    """Profile this run of ``task`` if it's in MONITOR_PROFILE_TASKS or sampled
+
+    Returns a context manager that does nothing when the run isn't
+    profiled, so an unprofiled run only pays for this check.
+    """
+    rate = settings.MONITOR_PROFILE_SAMPLE_RATE
+    if task not in settings.MONITOR_PROFILE_TASKS and not (rate and random.random() < rate):
+        return _NULL
+    return StageProfiler(task, capture=settings.MONITOR_PROFILE_CAPTURE,
+                         slow_seconds=settings.MONITOR_PROFILE_SLOW_SECONDS,
+                         output_dir=settings.MONITOR_PROFILE_DIR)
+
+
+def profiled(func):
+    """Decorator running each call of a task function under profile_task"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with profile_task(func.__name__):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def stage(name: str) -> ContextManager:
+    """Time a block as stage ``name`` of the task being profiled, if any"""
+    profiler = _active.get()
+    if profiler is None:
+        return _NULL
+    return profiler.stage(name)
@@ -0,0 +1,177 @@
+# apps/monitor/services/rate_limit.py
+import email.utils
+import logging
+import threading
+import time
+from datetime import timezone as dt_timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import redis
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Reserves up to ARGV[3] tokens from the bucket in KEYS[1] and returns the
+# wait before each granted one in microseconds. Reserving ahead lets the
+# token count go negative; reservations stop once the wait would exceed
+# ARGV[4] seconds. Redis' clock is used so workers with skewed clocks agree.
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local count = tonumber(ARGV[3])
+local max_wait = tonumber(ARGV[4])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+
+local waits = {}
+for i = 1, count do
+    local wait = math.max(0, (1 - tokens) / rate)
+    if wait > max_wait then
+        break
+    end
+    tokens = tokens - 1
+    waits[i] = math.floor(wait * 1000000)
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate + max_wait) + 1)
+return waits
+"""
+
+
+def _bucket_key(host: str) -> str:
+    return f'monitor:ratelimit:bucket:{host}'
+
+
+def _block_key(host: str) -> str:
+    return f'monitor:ratelimit:block:{host}'
+
+
+def retry_after_seconds(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header (seconds or an HTTP date), capped at MONITOR_RETRY_AFTER_MAX"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        seconds = float(value)
+    else:
+        try:
+            when = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=dt_timezone.utc)
+        seconds = (when - timezone.now()).total_seconds()
+    return min(max(seconds, 0.0), settings.MONITOR_RETRY_AFTER_MAX)
+
+
+class LocalBuckets:
+    """The token bucket script's logic for a single process"""
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def reserve(self, key: str, rate: float, burst: int, count: int, max_wait: float) -> List[float]:
+        with self._lock:
+            now = time.monotonic()
+            tokens, ts = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + max(0.0, now - ts) * rate)
+
+            waits = []
+            for _ in range(count):
+                wait = max(0.0, (1 - tokens) / rate)
+                if wait > max_wait:
+                    break
+                tokens -= 1
+                waits.append(wait)
+
+            self._buckets[key] = (tokens, now)
+            return waits
+
+
+class HostRateLimiter:
+    """Token bucket per host, shared by all workers through Redis.
+
+    Each host refills at ``rate`` requests per second up to ``burst``.
+    Callers reserve tokens ahead and start each request after its returned
+    wait, so a batch spreads its requests to one host over time instead of
+    sending them together. Without ``redis_url``, or while Redis is unreachable, buckets
+    are kept per process. Hosts that answered 429/503 with Retry-After are
+    blocked through the cache until it passes.
+    """
+
+    def __init__(self, rate: float = 2.0, burst: int = 10, max_wait: float = 30,
+                 redis_url: Optional[str] = None):
+        self.rate = rate
+        self.burst = burst
+        self.max_wait = max_wait
+        self.local = LocalBuckets()
+        self.script = None
+        if redis_url:
+            self.script = redis.Redis.from_url(redis_url).register_script(TOKEN_BUCKET_SCRIPT)
+
+    def reserve(self, host: str, count: int = 1) -> List[float]:
+        """Reserve up to ``count`` requests to ``host``, returning the wait in seconds before each
+
+        Fewer than ``count`` waits come back when the rest would have to wait
+        longer than ``max_wait``.
+        """
+        if self.script is not None:
+            try:
+                waits = self.script(keys=[_bucket_key(host)],
+                                    args=[self.rate, self.burst, count, self.max_wait])
+                return [wait / 1000000 for wait in waits]
+            except redis.RedisError as e:
+                logger.warning(f"Rate limiter falling back to local buckets: {str(e)}")
+        return self.local.reserve(_bucket_key(host), self.rate, self.burst, count, self.max_wait)
+
+    def acquire(self, host: str) -> Tuple[float, bool]:
+        """Reserve one request to ``host`` without waiting for it
+
+        Returns ``(delay, reserved)``: the seconds until the request may go
+        out, and whether a token is reserved for it then. When the host is
+        blocked or its bucket is booked up past ``max_wait`` nothing is
+        reserved, and the request should be put off and ask again.
+        """
+        blocked = self.blocked_for([host])
+        if host in blocked:
+            return blocked[host], False
+        waits = self.reserve(host)
+        if not waits:
+            return self.max_wait, False
+        return waits[0], True
+
+    def block(self, host: str, seconds: float) -> None:
+        """Stop requests to ``host`` for ``seconds``, e.g. from a Retry-After header"""
+        if seconds > 0:
+            cache.set(_block_key(host), time.time() + seconds, timeout=seconds)
+
+    def blocked_for(self, hosts: Iterable[str]) -> Dict[str, float]:
+        """Return the seconds each blocked host among ``hosts`` stays blocked"""
+        keys = {_block_key(host): host for host in set(hosts)}
+        now = time.time()
+        return {keys[key]: max(until - now, 0.0) for key, until in cache.get_many(list(keys)).items()}
+
+
+_limiter = None
+
+
+def get_rate_limiter() -> HostRateLimiter:
+    # One per process, so the local fallback buckets persist between batches
+    global _limiter
+    if _limiter is None:
+        _limiter = HostRateLimiter(
+            rate=settings.MONITOR_HOST_RATE,
+            burst=settings.MONITOR_HOST_BURST,
+            max_wait=settings.MONITOR_HOST_MAX_WAIT,
+            redis_url=settings.MONITOR_REDIS_URL,
+        )
+    return _limiter
@@ -0,0 +1,82 @@
+# apps/monitor/services/report_jobs.py
+import uuid
+from datetime import timedelta
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+
+from ..models import WebsiteStatus
+
+PENDING = 'pending'
+DONE = 'done'
+FAILED = 'failed'
+
+# Claims that lose a race with the job they saw finishing try again this often
+CLAIM_ATTEMPTS = 3
+
+
+class ClaimFailed(Exception):
+    """Neither a new job nor the one in flight could be had for a website"""
+
+
+def _status_key(website_id: int) -> str:
+    return f'monitor:report_job:{website_id}'
+
+
+def claim(website_id: int) -> Tuple[str, bool]:
+    """Reserve a report job for a website.
+
+    Returns ``(job_id, created)``. While a job is in flight every further
+    claim gets that job's id back with ``created=False``, so repeated clicks
+    collapse into one job. The reservation expires after
+    MONITOR_REPORT_JOB_TIMEOUT seconds in case a worker dies mid-job.
+
+    The reservation lives on the website's WebsiteStatus row and is taken
+    with a conditional UPDATE, so it holds across web processes even when
+    the cache is the per-process local-memory fallback. Raises ClaimFailed
+    if jobs keep finishing between the update and the read.
+    """
+    WebsiteStatus.objects.bulk_create([WebsiteStatus(website_id=website_id)], ignore_conflicts=True)
+    for _ in range(CLAIM_ATTEMPTS):
+        job_id = uuid.uuid4().hex
+        now = timezone.now()
+        expired = now - timedelta(seconds=settings.MONITOR_REPORT_JOB_TIMEOUT)
+        claimed = (WebsiteStatus.objects
+                   .filter(Q(report_job_id='') | Q(report_job_claimed_at__lt=expired), website_id=website_id)
+                   .update(report_job_id=job_id, report_job_claimed_at=now))
+        if claimed:
+            _set_status(website_id, {'job_id': job_id, 'state': PENDING})
+            return job_id, True
+
+        existing = (WebsiteStatus.objects.filter(website_id=website_id)
+                    .values_list('report_job_id', flat=True).first())
+        if existing:
+            return existing, False
+        # The job finished between our update and the read; try again.
+    raise ClaimFailed(f"Could not claim a report job for website {website_id}")
+
+
+def release(website_id: int, job_id: str, seo_log_id: Optional[int] = None, error: str = '') -> None:
+    """Record how a job ended and let a new one be claimed"""
+    _set_status(website_id, {
+        'job_id': job_id,
+        'state': FAILED if error else DONE,
+        'seo_log_id': seo_log_id,
+        'error': error,
+    })
+    # A job that outlived its reservation must not release its successor's.
+    (WebsiteStatus.objects.filter(website_id=website_id, report_job_id=job_id)
+     .update(report_job_id='', report_job_claimed_at=None))
+
+
+def status(website_id: int) -> Optional[Dict]:
+    """Return the latest job status for a website, or None if there isn't one"""
+    return cache.get(_status_key(website_id))
+
+
+def _set_status(website_id: int, job: Dict) -> None:
+    job['updated_at'] = timezone.now().isoformat()
+    cache.set(_status_key(website_id), job, timeout=settings.MONITOR_REPORT_STATUS_TTL)
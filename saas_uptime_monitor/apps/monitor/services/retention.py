@@ -0,0 +1,135 @@
+# apps/monitor/services/retention.py
+import logging
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Exists, OuterRef, QuerySet
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from ..models import KeywordSample, SEOLog, UptimeLog, UptimeRollup
+from . import metrics, partitions, rollups
+
+logger = logging.getLogger(__name__)
+
+LOCK_KEY = 'monitor:retention:running'
+LOCK_TIMEOUT = 30 * 60
+# Start of the UTC day before which old SEO checks are already thinned
+SEO_CURSOR_KEY = 'monitor:retention:seo_thinned_until'
+
+
+def apply_retention(now: Optional[datetime] = None) -> Dict[str, int]:
+    """Delete history that has outlived the MONITOR_RETENTION_* settings.
+
+    - raw uptime checks older than the raw window, but only once the rollup
+      compaction has counted them. On a partitioned table whole partitions
+      are dropped first and DELETE only handles the partly expired one;
+    - SEO checks older than their raw window, keeping the last one of each
+      UTC day per website as that day's snapshot. Only days since the last
+      finished pass are looked at;
+    - 1 minute and 1 hour rollups older than their windows. Daily rollups
+      are kept unless MONITOR_RETENTION_DAY_ROLLUP_DAYS is set;
+    - keyword index samples for days before their window.
+
+    Rows go in chunks of MONITOR_RETENTION_CHUNK_SIZE, each in its own short
+    transaction, and a run stops after MONITOR_RETENTION_MAX_CHUNKS chunks per
+    table so a large backlog is worked off over several runs. Returns the
+    number of rows deleted per table.
+    """
+    if not cache.add(LOCK_KEY, True, timeout=LOCK_TIMEOUT):
+        logger.info("Retention already running, skipping")
+        return {}
+
+    try:
+        now = now or timezone.now()
+        deleted = {}
+
+        uptime_cutoff = _cutoff(now, settings.MONITOR_RETENTION_RAW_UPTIME_DAYS)
+        compacted = rollups.compacted_until()
+        if uptime_cutoff is not None and compacted is not None:
+            uptime_cutoff = min(uptime_cutoff, compacted)
+            if partitions.is_partitioned():
+                dropped = partitions.drop_partitions_before(uptime_cutoff)
+                metrics.incr('retention_uptime_partitions_dropped', len(dropped))
+            deleted['uptime_logs'] = _delete_in_chunks(
+                'uptime_logs', UptimeLog.objects.filter(checked_at__lt=uptime_cutoff))
+
+        seo_cutoff = _cutoff(now, settings.MONITOR_RETENTION_RAW_SEO_DAYS)
+        if seo_cutoff is not None:
+            deleted['seo_logs'] = _thin_seo_logs(seo_cutoff)
+
+        for resolution, days in ((UptimeRollup.MINUTE, settings.MONITOR_RETENTION_MINUTE_ROLLUP_DAYS),
+                                 (UptimeRollup.HOUR, settings.MONITOR_RETENTION_HOUR_ROLLUP_DAYS),
+                                 (UptimeRollup.DAY, settings.MONITOR_RETENTION_DAY_ROLLUP_DAYS)):
+            cutoff = _cutoff(now, days)
+            if cutoff is None:
+                continue
+            if resolution == UptimeRollup.MINUTE and compacted is not None:
+                # The newest minute rollup is compaction's cursor; keep it.
+                cutoff = min(cutoff, compacted - timedelta(seconds=UptimeRollup.MINUTE))
+            name = f'rollups_{resolution}s'
+            deleted[name] = _delete_in_chunks(name, UptimeRollup.objects.filter(
+                resolution=resolution, bucket_start__lt=cutoff))
+
+        keyword_cutoff = _cutoff(now, settings.MONITOR_RETENTION_KEYWORD_DAYS)
+        if keyword_cutoff is not None:
+            deleted['keyword_samples'] = _delete_in_chunks(
+                'keyword_samples', KeywordSample.objects.filter(day__lt=keyword_cutoff.date()))
+
+        logger.info("Retention deleted " + ", ".join(f"{count} {name}" for name, count in deleted.items()))
+        return deleted
+    finally:
+        cache.delete(LOCK_KEY)
+
+
+def _cutoff(now: datetime, days: Optional[int]) -> Optional[datetime]:
+    if days is None:
+        return None
+    return now - timedelta(days=days)
+
+
+def _thin_seo_logs(cutoff: datetime) -> int:
+    # Without the cursor (first run, or the cache lost it) this is one pass
+    # over all old SEO checks; after that each run starts where the last
+    # finished one stopped.
+    since = cache.get(SEO_CURSOR_KEY)
+    deleted = _delete_in_chunks('seo_logs', _superseded_seo_logs(cutoff, since))
+    if deleted < settings.MONITOR_RETENTION_CHUNK_SIZE * settings.MONITOR_RETENTION_MAX_CHUNKS:
+        # The cutoff's own day can still gain checks before the cutoff, which
+        # supersede its current last one, so the next pass starts with it.
+        day_start = cutoff.astimezone(dt_timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+        cache.set(SEO_CURSOR_KEY, day_start, timeout=None)
+    return deleted
+
+
+def _superseded_seo_logs(cutoff: datetime, since: Optional[datetime] = None) -> QuerySet:
+    # Old SEO checks that aren't the last of their website's day
+    window = {'checked_at__lt': cutoff}
+    if since is not None:
+        window['checked_at__gte'] = since
+    return (SEOLog.objects
+            .filter(**window)
+            .annotate(day=TruncDate('checked_at'))
+            .filter(Exists(SEOLog.objects
+                           .filter(website_id=OuterRef('website_id'), **window)
+                           .annotate(day=TruncDate('checked_at'))
+                           .filter(day=OuterRef('day'), checked_at__gt=OuterRef('checked_at')))))
+
+
+def _delete_in_chunks(name: str, queryset: QuerySet) -> int:
+    chunk_size = settings.MONITOR_RETENTION_CHUNK_SIZE
+    deleted = 0
+    for _ in range(settings.MONITOR_RETENTION_MAX_CHUNKS):
+        ids = list(queryset.order_by().values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            break
+        with transaction.atomic():
+            queryset.model.objects.filter(id__in=ids).delete()
+        deleted += len(ids)
+        metrics.incr(f'retention_{name}_deleted', len(ids))
+        logger.debug(f"Retention deleted {deleted} {name} so far")
+    return deleted
@@ -0,0 +1,220 @@
+# apps/monitor/services/rollups.py
+import bisect
+import logging
+import math
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from ..models import UptimeLog, UptimeRollup
+from ..signals import rollups_written
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds of the latency histogram buckets. The histogram has
+# one more slot than this for everything slower than the last bound.
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 0.75, 1, 1.5, 2, 3, 5, 10)
+
+COARSE_RESOLUTIONS = (UptimeRollup.HOUR, UptimeRollup.DAY)
+
+LOCK_KEY = 'monitor:rollups:compacting'
+LOCK_TIMEOUT = 10 * 60
+
+
+def bucket_start(moment: datetime, resolution: int) -> datetime:
+    """Return the start of the UTC-aligned bucket ``moment`` falls in"""
+    epoch = int(moment.timestamp())
+    return datetime.fromtimestamp(epoch - epoch % resolution, tz=dt_timezone.utc)
+
+
+def empty_rollup(website_id: int, resolution: int, start: datetime) -> UptimeRollup:
+    return UptimeRollup(website_id=website_id, resolution=resolution, bucket_start=start,
+                        latency_histogram=[0] * (len(LATENCY_BUCKETS) + 1))
+
+
+def merge(target: UptimeRollup, source: UptimeRollup) -> None:
+    """Add ``source``'s checks to ``target`` and re-estimate its p95"""
+    target.checks += source.checks
+    target.up_count += source.up_count
+    target.response_time_sum += source.response_time_sum
+    if source.response_time_min is not None:
+        target.response_time_min = source.response_time_min if target.response_time_min is None \
+            else min(target.response_time_min, source.response_time_min)
+    if source.response_time_max is not None:
+        target.response_time_max = source.response_time_max if target.response_time_max is None \
+            else max(target.response_time_max, source.response_time_max)
+    target.latency_histogram = [a + b for a, b in zip(target.latency_histogram, source.latency_histogram)]
+    target.response_time_p95 = histogram_percentile(target, 0.95)
+
+
+def histogram_percentile(rollup: UptimeRollup, quantile: float) -> Optional[float]:
+    """Estimate a latency percentile as the upper bound of the bucket holding it
+
+    The estimate is clamped to the rollup's min/max, so it is never further
+    off than the width of one histogram bucket.
+    """
+    total = sum(rollup.latency_histogram)
+    if not total:
+        return None
+    rank = math.ceil(quantile * total)
+    seen = 0
+    for index, count in enumerate(rollup.latency_histogram):
+        seen += count
+        if seen >= rank:
+            break
+    if index >= len(LATENCY_BUCKETS):
+        return rollup.response_time_max
+    return max(min(LATENCY_BUCKETS[index], rollup.response_time_max), rollup.response_time_min)
+
+
+def compact(now: Optional[datetime] = None) -> int:
+    """Roll raw UptimeLog rows up into 1 minute, 1 hour and 1 day buckets.
+
+    Minutes are compacted once, in order, after MONITOR_ROLLUP_GRACE seconds
+    have passed so buffered results have landed. The cursor is the newest
+    1 minute rollup, so a run picks up exactly where the last one stopped;
+    checks written later than the grace period are not counted. Only one
+    run works at a time. Returns the number of minute rollups written.
+    """
+    if not cache.add(LOCK_KEY, True, timeout=LOCK_TIMEOUT):
+        logger.info("Rollup compaction already running, skipping")
+        return 0
+
+    try:
+        now = now or timezone.now()
+        end = bucket_start(now - timedelta(seconds=settings.MONITOR_ROLLUP_GRACE), UptimeRollup.MINUTE)
+        batch = timedelta(minutes=settings.MONITOR_ROLLUP_BATCH_MINUTES)
+        written = 0
+        for _ in range(settings.MONITOR_ROLLUP_MAX_BATCHES):
+            start = _next_minute()
+            if start is None or start >= end:
+                break
+            written += _compact_window(start, min(start + batch, end))
+        return written
+    finally:
+        cache.delete(LOCK_KEY)
+
+
+def compacted_until() -> Optional[datetime]:
+    """Return the end of the newest compacted minute, or None before the first run
+
+    Raw checks before this moment are already counted in the rollups.
+    """
+    last = (UptimeRollup.objects.filter(resolution=UptimeRollup.MINUTE)
+            .aggregate(last=Max('bucket_start'))['last'])
+    if last is None:
+        return None
+    return last + timedelta(seconds=UptimeRollup.MINUTE)
+
+
+def _next_minute() -> Optional[datetime]:
+    # First minute after the cursor that actually has checks, so gaps in the
+    # raw data are skipped in one query.
+    cursor = compacted_until()
+    pending = UptimeLog.objects.order_by('checked_at')
+    if cursor is not None:
+        pending = pending.filter(checked_at__gte=cursor)
+    first = pending.values_list('checked_at', flat=True).first()
+    return bucket_start(first, UptimeRollup.MINUTE) if first else None
+
+
+def _compact_window(start: datetime, end: datetime) -> int:
+    samples = defaultdict(list)
+    checks = defaultdict(int)
+    rows = (UptimeLog.objects
+            .filter(checked_at__gte=start, checked_at__lt=end)
+            .order_by()
+            .values_list('website_id', 'checked_at', 'is_up', 'response_time')
+            .iterator(chunk_size=5000))
+    for website_id, checked_at, is_up, response_time in rows:
+        key = (website_id, bucket_start(checked_at, UptimeRollup.MINUTE))
+        checks[key] += 1
+        if is_up:
+            samples[key].append(response_time)
+
+    minutes = [_minute_rollup(website_id, minute, checks[website_id, minute], samples[website_id, minute])
+               for website_id, minute in checks]
+
+    with transaction.atomic():
+        UptimeRollup.objects.bulk_create(minutes, batch_size=1000)
+        for resolution in COARSE_RESOLUTIONS:
+            _merge_into(resolution, minutes)
+
+    rollups_written.send(sender=UptimeRollup, website_ids={minute.website_id for minute in minutes})
+    logger.info(f"Compacted {len(minutes)} minute rollups from {start:%Y-%m-%d %H:%M} to {end:%H:%M}")
+    return len(minutes)
+
+
+def _minute_rollup(website_id: int, minute: datetime, checks: int, times: List[float]) -> UptimeRollup:
+    rollup = empty_rollup(website_id, UptimeRollup.MINUTE, minute)
+    rollup.checks = checks
+    rollup.up_count = len(times)
+    if times:
+        times.sort()
+        rollup.response_time_sum = sum(times)
+        rollup.response_time_min = times[0]
+        rollup.response_time_max = times[-1]
+        # Exact nearest-rank p95; coarser buckets estimate it from the histogram
+        rollup.response_time_p95 = times[math.ceil(0.95 * len(times)) - 1]
+        for response_time in times:
+            rollup.latency_histogram[bisect.bisect_left(LATENCY_BUCKETS, response_time)] += 1
+    return rollup
+
+
+def _merge_into(resolution: int, minutes: Iterable[UptimeRollup]) -> None:
+    updates: Dict[tuple, UptimeRollup] = {}
+    for minute in minutes:
+        key = (minute.website_id, bucket_start(minute.bucket_start, resolution))
+        if key not in updates:
+            updates[key] = empty_rollup(key[0], resolution, key[1])
+        merge(updates[key], minute)
+
+    existing = {
+        (rollup.website_id, rollup.bucket_start): rollup
+        for rollup in UptimeRollup.objects.filter(
+            resolution=resolution,
+            website_id__in={website_id for website_id, _ in updates},
+            bucket_start__in={start for _, start in updates},
+        )
+    }
+
+    created, changed = [], []
+    for key, update in updates.items():
+        rollup = existing.get(key)
+        if rollup is None:
+            created.append(update)
+        else:
+            merge(rollup, update)
+            changed.append(rollup)
+
+    UptimeRollup.objects.bulk_create(created, batch_size=1000)
+    UptimeRollup.objects.bulk_update(changed, [
+        'checks', 'up_count', 'response_time_sum', 'response_time_min',
+        'response_time_max', 'response_time_p95', 'latency_histogram',
+    ], batch_size=1000)
+
+
+def combine(rollups: List[UptimeRollup]) -> Optional[UptimeRollup]:
+    """Merge one website's rollups, oldest first, into a single unsaved rollup"""
+    if not rollups:
+        return None
+    first = rollups[0]
+    total = empty_rollup(first.website_id, first.resolution, first.bucket_start)
+    for rollup in rollups:
+        merge(total, rollup)
+    return total
+
+
+def history(website_ids: Iterable[int], since: datetime, resolution: int) -> List[UptimeRollup]:
+    """Return the websites' rollups from ``since`` onwards, oldest first"""
+    return list(UptimeRollup.objects.filter(
+        website_id__in=list(website_ids),
+        resolution=resolution,
+        bucket_start__gte=bucket_start(since, resolution),
+    ).order_by('bucket_start'))
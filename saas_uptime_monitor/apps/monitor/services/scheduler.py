@@ -0,0 +1,77 @@
+# apps/monitor/services/scheduler.py
+import random
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from ..models import Website
+from . import metrics
+from .page_changes import current_status
+
+
+def backoff_factor(failures: int) -> int:
+    """How many check intervals to wait after ``failures`` failed checks in a row"""
+    doublings = failures - settings.MONITOR_BACKOFF_AFTER_FAILURES + 1
+    if doublings <= 0:
+        return 1
+    return 2 ** min(doublings, 16)
+
+
+def next_check_time(website: Website, now: datetime) -> datetime:
+    """Return when ``website`` is next due, spread by the configured jitter
+
+    Sites that keep failing back off exponentially, but never past
+    MONITOR_BACKOFF_MAX_INTERVAL minutes (or their own interval, if longer).
+    """
+    interval = max(website.check_interval, 1) * 60
+    status = current_status(website)
+    if status is not None and status.consecutive_failures:
+        ceiling = max(interval, settings.MONITOR_BACKOFF_MAX_INTERVAL * 60)
+        interval = min(interval * backoff_factor(status.consecutive_failures), ceiling)
+    jitter = interval * settings.MONITOR_SCHEDULER_JITTER
+    return now + timedelta(seconds=interval + random.uniform(-jitter, jitter))
+
+
+def claim_due_websites(now: Optional[datetime] = None, limit: Optional[int] = None) -> List[int]:
+    """Return the ids of active websites that are due and reschedule them.
+
+    Due sites are read through the partial ``website_due_idx`` index, so a
+    tick costs time proportional to the number of due sites rather than the
+    size of the table. Rows are locked with SKIP LOCKED where the database
+    supports it, so overlapping ticks never claim the same site twice.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        due = (Website.objects
+               .select_for_update(skip_locked=True, of=('self',))
+               .filter(is_active=True, next_check_at__lte=now)
+               .select_related('status')
+               .order_by('next_check_at')
+               .only('id', 'check_interval', 'next_check_at', 'status__consecutive_failures'))
+        if limit:
+            due = due[:limit]
+        websites = list(due)
+
+        for website in websites:
+            metrics.observe('scheduler_lag_seconds', (now - website.next_check_at).total_seconds())
+            website.next_check_at = next_check_time(website, now)
+        Website.objects.bulk_update(websites, ['next_check_at'], batch_size=1000)
+
+    return [website.id for website in websites]
+
+
+def defer(delays: Dict[int, float], now: Optional[datetime] = None) -> None:
+    """Make each website due again the given number of seconds from now
+
+    For probes that were claimed but not made, e.g. because their host was
+    rate limited; the claim already pushed them a full interval ahead.
+    """
+    now = now or timezone.now()
+    by_delay = {}
+    for website_id, delay in delays.items():
+        by_delay.setdefault(round(delay), []).append(website_id)
+    for delay, website_ids in by_delay.items():
+        Website.objects.filter(id__in=website_ids).update(next_check_at=now + timedelta(seconds=delay))
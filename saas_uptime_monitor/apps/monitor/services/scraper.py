@@ -1,19 +1,21 @@
 # apps/monitor/services/scraper.py
-import asyncio
 import requests
-from bs4 import BeautifulSoup
 import time
 from typing import Dict, List, Optional, Tuple
 
+from django.conf import settings
+
+from .html_parsers import parse_page
+from .http import get_session
+from .link_checker import count_broken
+from .seo_analyzer import page_links
+
 class WebsiteScraper:
-    """Web scraper using requests + BeautifulSoup (no Playwright for now)"""
+    """Web scraper using requests + the configured HTML parser (no Playwright for now)"""
     
     def __init__(self, timeout: int = 10):
         self.timeout = timeout
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        })
+        self.session = get_session()
     
     def check_uptime(self, url: str) -> Tuple[str, float, Optional[int]]:
         """Check website uptime and response time"""
@@ -45,7 +47,7 @@ class WebsiteScraper:
             return 'down', response_time, None
     
     def analyze_seo(self, url: str, keywords: List[str] = None) -> Dict:
-        """Perform SEO analysis using requests + BeautifulSoup"""
+        """Perform SEO analysis using requests + the configured HTML parser"""
         if keywords is None:
             keywords = []
         
@@ -55,22 +57,18 @@ class WebsiteScraper:
             if response.status_code != 200:
                 return {'error': f'HTTP {response.status_code}', 'status_code': response.status_code}
             
-            soup = BeautifulSoup(response.content, 'html.parser')
+            page = parse_page(response.content, settings.MONITOR_HTML_PARSER)
             
             # Extract basic SEO elements
-            page_title = soup.title.string if soup.title else ''
-            meta_desc = soup.find('meta', attrs={'name': 'description'})
-            meta_description = meta_desc.get('content', '') if meta_desc else ''
+            page_title = page.title or ''
+            meta_description = page.meta_description or ''
             
             # Count headings
-            h1_count = len(soup.find_all('h1'))
-            h2_count = len(soup.find_all('h2'))
+            h1_count = page.heading_counts['h1']
+            h2_count = page.heading_counts['h2']
             
-            # Get main text content
-            for script in soup(["script", "style"]):
-                script.decompose()
-            
-            main_text = soup.get_text()
+            # Get main text content (script and style bodies are never included)
+            main_text = page.text
             words = main_text.split()
             word_count = len(words)
             
@@ -88,19 +86,8 @@ class WebsiteScraper:
                         'density': round(density, 2)
                     }
             
-            # Check for broken links (sample)
-            broken_links = 0
-            links = soup.find_all('a', href=True)[:5]
-            
-            for link in links:
-                href = link['href']
-                if href.startswith('http'):
-                    try:
-                        resp = self.session.head(href, timeout=5, allow_redirects=True)
-                        if resp.status_code >= 400:
-                            broken_links += 1
-                    except:
-                        broken_links += 1
+            # Check every link on the page concurrently
+            broken_links = count_broken({url: page_links(page, url)})[url]['broken_links']
             
             return {
                 'page_title': page_title[:500],
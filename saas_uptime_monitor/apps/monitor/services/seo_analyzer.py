@@ -0,0 +1,275 @@
+# apps/monitor/services/seo_analyzer.py
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Union
+from urllib.parse import urldefrag, urljoin, urlparse
+
+from django.conf import settings
+
+from .html_parsers import PageCollector, parse_page
+from .profiling import stage
+
+STOP_WORDS = frozenset({
+    'the', 'and', 'a', 'an', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by', 'is', 'are',
+    'was', 'were', 'be', 'been', 'being', 'have', 'has', 'had', 'do', 'does', 'did', 'but',
+    'or', 'as', 'if', 'then', 'else', 'when', 'where', 'why', 'how', 'all', 'any', 'both',
+    'each', 'few', 'more', 'most', 'other', 'some', 'such', 'no', 'nor', 'not', 'only', 'own',
+    'same', 'so', 'than', 'too', 'very', 's', 't', 'can', 'will', 'just', 'don', 'should', 'now',
+})
+
+WORD_RE = re.compile(r'\w+')
+SENTENCE_SPLIT_RE = re.compile(r'[.!?]+')
+
+
+def analyze_html(html: Union[bytes, str], url: str, backend: Optional[str] = None,
+                 with_links: bool = False) -> Dict:
+    """Parse a page and return every SEOLog field for it, scores included
+
+    ``backend`` picks the HTML parser (see html_parsers.BACKENDS) and
+    defaults to the MONITOR_HTML_PARSER setting. With ``with_links`` the
+    page's absolute links are added under ``links`` for the link checker;
+    pop them before building an SEOLog.
+    """
+    with stage('parse'):
+        page = parse_page(html, backend or settings.MONITOR_HTML_PARSER)
+    with stage('score'):
+        metrics = extract_metrics(page, url)
+        fields = score_metrics(metrics)
+        if with_links:
+            fields['links'] = page_links(page, url)
+    return fields
+
+
+def page_links(page: PageCollector, url: str) -> List[str]:
+    """The page's distinct http(s) links, made absolute and without fragments"""
+    links = {}
+    for href in page.links:
+        link = urldefrag(urljoin(url, href.strip())).url
+        if urlparse(link).scheme in ('http', 'https'):
+            links[link] = None
+    return list(links)
+
+
+def extract_metrics(page: PageCollector, url: str) -> Dict:
+    """Turn what the parser collected into the raw page metrics"""
+    base_domain = urlparse(url).netloc
+    internal_links = 0
+    external_links = 0
+    for href in page.links:
+        netloc = urlparse(href).netloc
+        if netloc == '' or netloc == base_domain:
+            internal_links += 1
+        else:
+            external_links += 1
+
+    title = page.title.strip() if page.title is not None else None
+
+    body_text = page.text
+    words = WORD_RE.findall(body_text.lower())
+
+    metrics = {
+        'title': title[:500] if title else None,
+        'meta_description': page.meta_description,
+        'word_count': len(words),
+        'internal_links': internal_links,
+        'external_links': external_links,
+        'total_images': page.total_images,
+        'images_without_alt': page.images_without_alt,
+        'has_viewport_meta': page.has_viewport_meta,
+        'has_favicon': page.has_favicon,
+    }
+    for heading, count in page.heading_counts.items():
+        metrics[f'{heading}_count'] = count
+    metrics.update(_keyword_metrics(words))
+    metrics['duplicate_percentage'] = _duplicate_percentage(body_text, len(words))
+    return metrics
+
+
+def _keyword_metrics(words):
+    top_keywords = {}
+    keyword_density = {}
+    if words:
+        word_freq = Counter(words)
+
+        # Filter out stop words and short words
+        filtered_words = {k: v for k, v in word_freq.items()
+                          if k not in STOP_WORDS and len(k) > 3}
+
+        # Top 10 keywords and their density (percentage)
+        if filtered_words:
+            top_keywords = dict(sorted(filtered_words.items(),
+                                       key=lambda x: x[1],
+                                       reverse=True)[:10])
+            keyword_density = {k: round((v / len(words)) * 100, 2)
+                               for k, v in top_keywords.items()}
+
+    return {'top_keywords': top_keywords, 'keyword_density': keyword_density}
+
+
+def _duplicate_percentage(body_text, word_count):
+    # Simple estimate from repeated sentences
+    if word_count == 0:
+        return 0.0
+
+    sentences = SENTENCE_SPLIT_RE.split(body_text)
+    unique_sentences = set()
+    for sentence in sentences:
+        clean_sentence = sentence.strip().lower()
+        if len(clean_sentence) > 20:  # Only consider meaningful sentences
+            unique_sentences.add(clean_sentence)
+
+    if sentences and unique_sentences:
+        return round((1 - len(unique_sentences) / len(sentences)) * 100, 1)
+    return 0.0
+
+
+def score_metrics(metrics: Dict) -> Dict:
+    """Turn raw page metrics into the full set of SEOLog fields"""
+    title = metrics['title']
+    meta_description = metrics['meta_description']
+    h1_count = metrics['h1_count']
+    h2_count = metrics['h2_count']
+    word_count = metrics['word_count']
+    images_without_alt = metrics['images_without_alt']
+    duplicate_percentage = metrics['duplicate_percentage']
+    has_viewport_meta = metrics['has_viewport_meta']
+    top_keywords = metrics['top_keywords']
+
+    # Content issues detection
+    has_missing_meta_description = meta_description is None or len(meta_description.strip()) == 0
+    has_missing_title = title is None or len(title.strip()) == 0
+    has_missing_h1 = h1_count == 0
+
+    # SEO Friendliness Score (0-100)
+    seo_friendliness = 0
+    if title and 50 <= len(title) <= 60:
+        seo_friendliness += 15
+    elif title:
+        seo_friendliness += 5
+
+    if meta_description and 120 <= len(meta_description) <= 160:
+        seo_friendliness += 15
+    elif meta_description:
+        seo_friendliness += 5
+
+    if h1_count == 1:
+        seo_friendliness += 20
+    elif h1_count > 1:
+        seo_friendliness += 5
+
+    if h2_count >= 2:
+        seo_friendliness += 10
+    elif h2_count == 1:
+        seo_friendliness += 5
+
+    if has_viewport_meta:
+        seo_friendliness += 10
+
+    if word_count >= 500:
+        seo_friendliness += 15
+    elif word_count >= 300:
+        seo_friendliness += 10
+    else:
+        seo_friendliness += 5
+
+    if images_without_alt == 0:
+        seo_friendliness += 10
+    elif images_without_alt < 3:
+        seo_friendliness += 5
+
+    if duplicate_percentage < 10:
+        seo_friendliness += 10
+    elif duplicate_percentage < 20:
+        seo_friendliness += 5
+
+    # Content Quality Score (0-100)
+    content_quality = 0
+    if word_count >= 800:
+        content_quality += 25
+    elif word_count >= 500:
+        content_quality += 20
+    elif word_count >= 300:
+        content_quality += 15
+    else:
+        content_quality += 5
+
+    if h1_count == 1:
+        content_quality += 15
+
+    if h2_count >= 2:
+        content_quality += 15
+    elif h2_count == 1:
+        content_quality += 10
+
+    if duplicate_percentage < 5:
+        content_quality += 20
+    elif duplicate_percentage < 15:
+        content_quality += 10
+    elif duplicate_percentage < 25:
+        content_quality += 5
+
+    if images_without_alt == 0:
+        content_quality += 15
+    elif images_without_alt < 3:
+        content_quality += 10
+    elif images_without_alt < 6:
+        content_quality += 5
+
+    if top_keywords:
+        content_quality += 10
+
+    # Google Terms Score (0-100)
+    google_terms_score = 100
+    google_terms_issues = []
+
+    if has_missing_title:
+        google_terms_score -= 20
+        google_terms_issues.append("Missing page title")
+
+    if has_missing_meta_description:
+        google_terms_score -= 15
+        google_terms_issues.append("Missing meta description")
+
+    if has_missing_h1:
+        google_terms_score -= 20
+        google_terms_issues.append("Missing H1 tag")
+
+    if images_without_alt > 0:
+        deduction = min(images_without_alt * 3, 25)
+        google_terms_score -= deduction
+        google_terms_issues.append(f"{images_without_alt} images without alt text")
+
+    if word_count < 300:
+        google_terms_score -= 20
+        google_terms_issues.append("Content too short (less than 300 words)")
+
+    if duplicate_percentage > 30:
+        google_terms_score -= 15
+        google_terms_issues.append(f"High duplicate content ({duplicate_percentage}%)")
+
+    if not has_viewport_meta:
+        google_terms_score -= 10
+        google_terms_issues.append("Missing viewport meta tag (not mobile-friendly)")
+
+    # Ensure score is between 0-100
+    google_terms_score = max(0, min(100, google_terms_score))
+
+    # Overall SEO Score (average of three scores)
+    seo_score = round((seo_friendliness + content_quality + google_terms_score) / 3)
+
+    fields = dict(metrics)
+    fields.update({
+        'seo_score': seo_score,
+        'seo_friendliness': seo_friendliness,
+        'content_quality': content_quality,
+        'google_terms_score': google_terms_score,
+        'has_missing_meta_description': has_missing_meta_description,
+        'has_missing_title': has_missing_title,
+        'has_missing_h1': has_missing_h1,
+        'has_multiple_h1': h1_count > 1,
+        'has_short_content': word_count < 300,
+        'top_keywords': top_keywords,
+        'keyword_density': metrics['keyword_density'],
+        'google_terms_issues': google_terms_issues,
+    })
+    return fields
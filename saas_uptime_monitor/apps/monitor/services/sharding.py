@@ -0,0 +1,155 @@
+# apps/monitor/services/sharding.py
+import bisect
+import hashlib
+import logging
+import socket
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+import redis
+from celery.signals import worker_ready, worker_shutdown
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+MEMBERS_KEY = 'monitor:probe_nodes'
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode('utf-8')).digest()[:8], 'big')
+
+
+class HashRing:
+    """Consistent hash ring mapping website ids to probe nodes
+
+    Each node is placed on the ring ``replicas`` times. When a node joins it
+    takes over roughly 1/n of the websites, all from the other nodes, and
+    when one leaves only its websites move; everything else keeps its node.
+    """
+
+    def __init__(self, nodes: Iterable[str], replicas: int = 400):
+        points = sorted((_hash(f'{node}#{replica}'), node)
+                        for node in set(nodes) for replica in range(replicas))
+        self.hashes = [point for point, _ in points]
+        self.nodes = [node for _, node in points]
+
+    def __bool__(self) -> bool:
+        return bool(self.nodes)
+
+    def node_for(self, website_id: int) -> str:
+        index = bisect.bisect(self.hashes, _hash(str(website_id))) % len(self.hashes)
+        return self.nodes[index]
+
+    def assign(self, website_ids: Iterable[int]) -> Dict[str, List[int]]:
+        """Group ``website_ids`` by the node each belongs to"""
+        assignments = {}
+        for website_id in website_ids:
+            assignments.setdefault(self.node_for(website_id), []).append(website_id)
+        return assignments
+
+
+def local_node() -> str:
+    """The name this process tags its results with"""
+    return settings.MONITOR_PROBE_NODE or socket.gethostname()
+
+
+def queue_for(node: str) -> str:
+    return f'{settings.MONITOR_PROBE_QUEUE_PREFIX}{node}'
+
+
+_client = None
+
+
+def _redis() -> Optional[redis.Redis]:
+    global _client
+    if _client is None and settings.MONITOR_REDIS_URL:
+        _client = redis.Redis.from_url(settings.MONITOR_REDIS_URL, decode_responses=True)
+    return _client
+
+
+def join(node: str) -> None:
+    """Announce ``node`` as alive for the next MONITOR_PROBE_NODE_TTL seconds"""
+    client = _redis()
+    if client is None:
+        return
+    try:
+        client.zadd(MEMBERS_KEY, {node: time.time()})
+    except redis.RedisError as e:
+        logger.warning(f"Probe node {node} heartbeat failed: {str(e)}")
+
+
+def leave(node: str) -> None:
+    client = _redis()
+    if client is None:
+        return
+    try:
+        client.zrem(MEMBERS_KEY, node)
+    except redis.RedisError as e:
+        logger.warning(f"Probe node {node} could not leave: {str(e)}")
+
+
+def alive_nodes() -> List[str]:
+    """Probe nodes to shard over: MONITOR_PROBE_NODES if set, else those heartbeating
+
+    Returns an empty list when neither is available, in which case checks
+    go to the default queue unsharded.
+    """
+    if settings.MONITOR_PROBE_NODES:
+        return list(settings.MONITOR_PROBE_NODES)
+    client = _redis()
+    if client is None:
+        return []
+    cutoff = time.time() - settings.MONITOR_PROBE_NODE_TTL
+    try:
+        client.zremrangebyscore(MEMBERS_KEY, '-inf', cutoff)
+        return sorted(client.zrangebyscore(MEMBERS_KEY, cutoff, '+inf'))
+    except redis.RedisError as e:
+        logger.warning(f"Could not read probe nodes: {str(e)}")
+        return []
+
+
+def get_ring() -> HashRing:
+    return HashRing(alive_nodes(), replicas=settings.MONITOR_PROBE_RING_REPLICAS)
+
+
+class Heartbeat(threading.Thread):
+    """Keeps a probe node's membership fresh while its worker runs"""
+
+    daemon = True
+
+    def __init__(self, node: str, interval: float):
+        super().__init__(name=f'probe-heartbeat-{node}')
+        self.node = node
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self) -> None:
+        join(self.node)
+        while not self.stopped.wait(self.interval):
+            join(self.node)
+
+    def stop(self) -> None:
+        self.stopped.set()
+        leave(self.node)
+
+
+_heartbeat = None
+
+
+@worker_ready.connect
+def start_heartbeat(sender=None, **kwargs):
+    # Only workers started with MONITOR_PROBE_NODE are probe nodes
+    global _heartbeat
+    if not settings.MONITOR_PROBE_NODE or _redis() is None:
+        return
+    _heartbeat = Heartbeat(settings.MONITOR_PROBE_NODE, settings.MONITOR_PROBE_NODE_TTL / 3)
+    _heartbeat.start()
+    logger.info(f"Probe node {settings.MONITOR_PROBE_NODE} joined, consuming {queue_for(settings.MONITOR_PROBE_NODE)}")
+
+
+@worker_shutdown.connect
+def stop_heartbeat(sender=None, **kwargs):
+    # Leaving right away hands this node's websites on at the next tick
+    if _heartbeat is not None:
+        _heartbeat.stop()
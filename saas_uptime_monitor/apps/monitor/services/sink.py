@@ -0,0 +1,133 @@
+# apps/monitor/services/sink.py
+import logging
+import threading
+import time
+from typing import List, Optional
+
+from celery.signals import worker_process_shutdown, worker_shutdown
+from django.conf import settings
+from django.db import DatabaseError, connections, transaction
+
+from ..models import UptimeLog, SEOLog
+from ..signals import logs_written
+from . import metrics
+from .profiling import stage
+
+logger = logging.getLogger(__name__)
+
+
+class ResultSink:
+    """Buffer unsaved UptimeLog/SEOLog rows and write them with bulk_create.
+
+    The buffer is flushed in a single transaction once it holds ``max_size``
+    rows or its oldest row is ``max_age`` seconds old. A timer makes sure the
+    age threshold also applies when no further rows arrive; pass
+    ``max_age=None`` to only flush on size or explicit ``flush()`` calls.
+    """
+
+    def __init__(self, max_size: int = 500, max_age: Optional[float] = 5.0):
+        self.max_size = max_size
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._uptime_logs: List[UptimeLog] = []
+        self._seo_logs: List[SEOLog] = []
+        self._opened_at: Optional[float] = None
+        self._timer: Optional[threading.Timer] = None
+
+    def __len__(self):
+        return len(self._uptime_logs) + len(self._seo_logs)
+
+    def add(self, log) -> None:
+        """Queue an unsaved UptimeLog or SEOLog instance"""
+        with self._lock:
+            if isinstance(log, UptimeLog):
+                self._uptime_logs.append(log)
+            elif isinstance(log, SEOLog):
+                self._seo_logs.append(log)
+            else:
+                raise TypeError(f"Cannot buffer {type(log).__name__} rows")
+
+            if self._opened_at is None:
+                self._opened_at = time.monotonic()
+                if self.max_age is not None:
+                    self._timer = threading.Timer(self.max_age, self._flush_from_timer)
+                    self._timer.daemon = True
+                    self._timer.start()
+
+            due = len(self) >= self.max_size or (
+                self.max_age is not None and time.monotonic() - self._opened_at >= self.max_age
+            )
+
+        if due:
+            self.flush()
+
+    def flush(self) -> int:
+        """Write every buffered row in one transaction and return the row count"""
+        with self._lock:
+            uptime_logs, self._uptime_logs = self._uptime_logs, []
+            seo_logs, self._seo_logs = self._seo_logs, []
+            self._opened_at = None
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+        if not uptime_logs and not seo_logs:
+            return 0
+
+        try:
+            with stage('persist'), metrics.timer('db_write_seconds'), transaction.atomic():
+                UptimeLog.objects.bulk_create(uptime_logs)
+                SEOLog.objects.bulk_create(seo_logs)
+        except DatabaseError as e:
+            # One bad row (e.g. a website deleted mid-batch) shouldn't cost us
+            # the rest of the batch, so fall back to row-at-a-time writes.
+            logger.error(f"Bulk write of {len(uptime_logs) + len(seo_logs)} logs failed: {str(e)}")
+            uptime_logs = self._save_individually(uptime_logs)
+            seo_logs = self._save_individually(seo_logs)
+
+        metrics.incr('rows_written', len(uptime_logs), table='uptime_logs')
+        metrics.incr('rows_written', len(seo_logs), table='seo_logs')
+        logs_written.send(sender=self.__class__, uptime_logs=uptime_logs, seo_logs=seo_logs)
+        return len(uptime_logs) + len(seo_logs)
+
+    def _save_individually(self, logs):
+        saved = []
+        for log in logs:
+            try:
+                with transaction.atomic():
+                    log.save(force_insert=True)
+                saved.append(log)
+            except DatabaseError as e:
+                logger.error(f"Dropping {type(log).__name__} for website {log.website_id}: {str(e)}")
+        return saved
+
+    def _flush_from_timer(self):
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"Timed flush of result sink failed: {str(e)}")
+        finally:
+            # The timer thread opened its own connection; don't leak it.
+            connections.close_all()
+
+
+_default_sink: Optional[ResultSink] = None
+
+
+def get_result_sink() -> ResultSink:
+    """Return the sink shared by every task in this worker process"""
+    global _default_sink
+    if _default_sink is None:
+        _default_sink = ResultSink(
+            max_size=settings.MONITOR_SINK_MAX_SIZE,
+            max_age=settings.MONITOR_SINK_MAX_AGE,
+        )
+    return _default_sink
+
+
+@worker_process_shutdown.connect
+@worker_shutdown.connect
+def flush_result_sink(**kwargs):
+    """Don't lose buffered results when a worker (or pool process) exits"""
+    if _default_sink is not None:
+        _default_sink.flush()
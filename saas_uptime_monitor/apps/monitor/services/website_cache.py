@@ -0,0 +1,121 @@
+# apps/monitor/services/website_cache.py
+from datetime import timedelta
+from typing import Dict, Iterable, List
+
+from django.conf import settings
+from django.core.cache import cache
+from django.dispatch import receiver
+from django.utils import timezone
+
+from ..models import SEOLog, UptimeLog, UptimeRollup, Website
+from ..signals import logs_written, rollups_written
+from . import rollups
+
+# Rows kept per list: what the dashboard and report pages show
+RECENT = 5
+OWNER_RECENT = 10
+
+
+def _logs_key(website_id: int) -> str:
+    return f'monitor:website:{website_id}:logs'
+
+
+def _history_key(website_id: int) -> str:
+    return f'monitor:website:{website_id}:history'
+
+
+def _owner_key(owner_id: int) -> str:
+    return f'monitor:owner:{owner_id}:recent_checks'
+
+
+def website_logs(website: Website) -> Dict:
+    """Latest checks, incidents and SEO reports for a website
+
+    Cached until new logs for the website are written. ``seo_reports`` is
+    newest first, so its first entry is the latest report.
+    """
+    data = cache.get(_logs_key(website.id))
+    if data is None:
+        data = {
+            'recent_checks': list(UptimeLog.objects.for_website(website)[:RECENT]),
+            'recent_incidents': list(UptimeLog.objects.for_website(website).incidents()[:RECENT]),
+            'seo_reports': list(SEOLog.objects.for_website(website)[:RECENT]),
+        }
+        cache.set(_logs_key(website.id), data, timeout=settings.MONITOR_VIEW_CACHE_TTL)
+    return data
+
+
+def owner_recent_checks(owner_id: int) -> List[UptimeLog]:
+    """The newest checks across all of a user's websites, cached like website_logs"""
+    checks = cache.get(_owner_key(owner_id))
+    if checks is None:
+        checks = list(UptimeLog.objects.filter(website__owner_id=owner_id)
+                      .select_related('website').order_by('-checked_at')[:OWNER_RECENT])
+        cache.set(_owner_key(owner_id), checks, timeout=settings.MONITOR_VIEW_CACHE_TTL)
+    return checks
+
+
+def uptime_history(website_ids: Iterable[int]) -> Dict[int, Dict]:
+    """Rollup-based uptime summaries per website, cached until compaction adds buckets
+
+    Each entry has ``summary`` (label, rollup) pairs for the last 24 hours,
+    7 days and 30 days, ``last_24h`` and ``daily`` rollups for 14 days.
+    """
+    website_ids = list(website_ids)
+    cached = cache.get_many([_history_key(website_id) for website_id in website_ids])
+    histories = {website_id: cached[_history_key(website_id)]
+                 for website_id in website_ids if _history_key(website_id) in cached}
+    missing = [website_id for website_id in website_ids if website_id not in histories]
+    if missing:
+        built = _build_histories(missing)
+        cache.set_many({_history_key(website_id): history for website_id, history in built.items()},
+                       timeout=settings.MONITOR_VIEW_CACHE_TTL)
+        histories.update(built)
+    return histories
+
+
+def _build_histories(website_ids: List[int]) -> Dict[int, Dict]:
+    # Two queries however many websites are missing
+    now = timezone.now()
+    daily = rollups.history(website_ids, now - timedelta(days=30), UptimeRollup.DAY)
+    hourly = rollups.history(website_ids, now - timedelta(hours=24), UptimeRollup.HOUR)
+    two_weeks = rollups.bucket_start(now - timedelta(days=14), UptimeRollup.DAY)
+    week = rollups.bucket_start(now - timedelta(days=7), UptimeRollup.DAY)
+
+    histories = {}
+    for website_id in website_ids:
+        days = [rollup for rollup in daily if rollup.website_id == website_id]
+        last_24h = rollups.combine([rollup for rollup in hourly if rollup.website_id == website_id])
+        histories[website_id] = {
+            'last_24h': last_24h,
+            'summary': [
+                ('Last 24 hours', last_24h),
+                ('Last 7 days', rollups.combine([rollup for rollup in days if rollup.bucket_start >= week])),
+                ('Last 30 days', rollups.combine(days)),
+            ],
+            'daily': [rollup for rollup in days if rollup.bucket_start >= two_weeks],
+        }
+    return histories
+
+
+def invalidate_website_logs(website_ids: Iterable[int]) -> None:
+    """Drop the cached website_logs of websites whose logs were changed in place"""
+    cache.delete_many([_logs_key(website_id) for website_id in set(website_ids)])
+
+
+@receiver(logs_written)
+def invalidate_logs(sender, uptime_logs=(), seo_logs=(), **kwargs):
+    website_ids = {log.website_id for log in uptime_logs} | {log.website_id for log in seo_logs}
+    if not website_ids:
+        return
+    keys = [_logs_key(website_id) for website_id in website_ids]
+    if uptime_logs:
+        owner_ids = Website.objects.filter(
+            id__in={log.website_id for log in uptime_logs}).values_list('owner_id', flat=True)
+        keys.extend(_owner_key(owner_id) for owner_id in set(owner_ids))
+    cache.delete_many(keys)
+
+
+@receiver(rollups_written)
+def invalidate_history(sender, website_ids=(), **kwargs):
+    cache.delete_many([_history_key(website_id) for website_id in website_ids])
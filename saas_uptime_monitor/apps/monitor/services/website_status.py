@@ -0,0 +1,74 @@
+# apps/monitor/services/website_status.py
+import logging
+from typing import Iterable, List, Tuple
+
+from django.db import DatabaseError, transaction
+from django.dispatch import receiver
+
+from ..models import UptimeLog, WebsiteStatus
+from ..signals import logs_written, status_changed
+
+logger = logging.getLogger(__name__)
+
+STATUS_FIELDS = [
+    'is_up', 'status_code', 'last_response_time', 'last_checked_at',
+    'last_changed_at', 'consecutive_failures', 'error_message',
+]
+
+
+def apply_checks(uptime_logs: Iterable[UptimeLog]) -> List[Tuple[WebsiteStatus, bool]]:
+    """Fold new checks into each website's WebsiteStatus row.
+
+    The rows are created and locked in website id order for the update, so
+    concurrent writers for the same websites apply their checks one after
+    the other instead of deadlocking. Checks older than the
+    row's last check are ignored. Returns ``(status, previous_is_up)`` for
+    every website whose up/down state flipped.
+    """
+    by_website = {}
+    for log in sorted(uptime_logs, key=lambda log: log.checked_at):
+        by_website.setdefault(log.website_id, []).append(log)
+    if not by_website:
+        return []
+
+    updated, changes = [], []
+    with transaction.atomic():
+        WebsiteStatus.objects.bulk_create(
+            [WebsiteStatus(website_id=website_id) for website_id in sorted(by_website)], ignore_conflicts=True)
+        statuses = (WebsiteStatus.objects.select_for_update()
+                    .filter(website_id__in=by_website).order_by('website_id'))
+
+        for status in statuses:
+            previous = status.is_up
+            for log in by_website[status.website_id]:
+                if status.last_checked_at is not None and log.checked_at < status.last_checked_at:
+                    continue
+                if status.is_up is None or status.is_up != log.is_up:
+                    status.last_changed_at = log.checked_at
+                status.is_up = log.is_up
+                status.status_code = log.status_code
+                status.last_response_time = log.response_time
+                status.last_checked_at = log.checked_at
+                status.error_message = log.error_message or ''
+                status.consecutive_failures = 0 if log.is_up else status.consecutive_failures + 1
+            updated.append(status)
+            if previous is not None and previous != status.is_up:
+                changes.append((status, previous))
+
+        WebsiteStatus.objects.bulk_update(updated, STATUS_FIELDS, batch_size=1000)
+
+    return changes
+
+
+@receiver(logs_written)
+def update_statuses(sender, uptime_logs=(), **kwargs):
+    try:
+        changes = apply_checks(uptime_logs)
+    except DatabaseError as e:
+        # The logs are already committed; a stale status row is recoverable.
+        logger.error(f"Updating status for {len(uptime_logs)} checks failed: {str(e)}")
+        return
+
+    for status, previous in changes:
+        logger.info(f"Website {status.website_id} is now {'UP' if status.is_up else 'DOWN'}")
+        status_changed.send(sender=WebsiteStatus, status=status, previous=previous)
@@ -0,0 +1,13 @@
+from django.dispatch import Signal
+
+# Sent after a batch of UptimeLog/SEOLog rows has been committed.
+# Receivers get ``uptime_logs`` and ``seo_logs`` keyword arguments.
+logs_written = Signal()
+
+# Sent after rollup compaction has committed new buckets. Receivers get a
+# ``website_ids`` keyword argument.
+rollups_written = Signal()
+
+# Sent when a website goes up or down (not on its first check). Receivers
+# get ``status`` (the updated WebsiteStatus) and ``previous`` (the old is_up).
+status_changed = Signal()
@@ -1,15 +1,34 @@
 
 from celery import shared_task
+from django.conf import settings
+from django.utils import timezone
 from .models import Website, UptimeLog, SEOLog
+from .services import (link_checker, metrics, page_changes, partitions, rate_limit, report_jobs, rollups,
+                       sharding, website_cache)
+from .services.profiling import profiled, stage
+from .services.http import fetch_page
+from .services.phases import PHASE_FIELDS
+from .services.probe import THROTTLE_STATUSES, ProbeEngine
+from .services.retention import apply_retention
+from .services.scheduler import claim_due_websites, defer
+from .services.seo_analyzer import analyze_html
+from .services.sink import ResultSink, get_result_sink
+from urllib.parse import urlparse
 import requests
 import time
-from bs4 import BeautifulSoup
 import logging        
 
 logger = logging.getLogger(__name__)
 
-def check_uptime(url, timeout=10):
-    """Check website uptime and response time"""
+def check_uptime(url, timeout=10, keep_body=False, headers=None):
+    """Check website uptime and response time
+
+    The body is streamed and capped at MONITOR_MAX_BODY_BYTES and
+    MONITOR_FETCH_DEADLINE. With ``keep_body`` the body of a 200 response is
+    returned under ``body``, with its validators, so the SEO check doesn't
+    fetch it again. ``headers`` can make the request conditional; a 304
+    still counts as up. A 429/503 carries its Retry-After as ``retry_after``.
+    """
     result = {
         'status_code': 0,
         'response_time': 0,
@@ -18,95 +37,166 @@ def check_uptime(url, timeout=10):
     }
     
     try:
-        start_time = time.time()
-        response = requests.get(url, timeout=timeout, headers={
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        })
-        response_time = time.time() - start_time
+        start_time = time.monotonic()
+        response, body, truncated = fetch_page(url, timeout=timeout,
+                                               max_bytes=settings.MONITOR_MAX_BODY_BYTES,
+                                               deadline=settings.MONITOR_FETCH_DEADLINE,
+                                               headers=headers)
+        response_time = time.monotonic() - start_time
         
         result['status_code'] = response.status_code
         result['response_time'] = round(response_time, 2)
         result['is_up'] = 200 <= response.status_code < 400
+        if response.status_code in THROTTLE_STATUSES:
+            result['retry_after'] = rate_limit.retry_after_seconds(response.headers.get('Retry-After'))
+        
+        if keep_body and response.status_code == 200:
+            result['body'] = body
+            result['body_truncated'] = truncated
+            result['etag'] = response.headers.get('ETag', '')
+            result['last_modified'] = response.headers.get('Last-Modified', '')
         
     except requests.exceptions.RequestException as e:
         result['error_message'] = str(e)
     
     return result
 
-def check_seo(url):
-    """Check SEO metrics using BeautifulSoup"""
-    result = {
-        'title': '',
-        'meta_description': '',
-        'h1_count': 0,
-        'word_count': 0,
-        'internal_links': 0,
-        'external_links': 0
-    }
-    
+def check_seo(url, body=None, truncated=False):
+    """Run the SEO analyzer on a page, returning None if it can't be fetched
+
+    Pass the ``body`` kept by check_uptime (and whether it was ``truncated``)
+    to analyse it without downloading the page a second time.
+    """
     try:
-        response = requests.get(url, timeout=10, headers={
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        })
+        if body is None:
+            with stage('fetch'):
+                response, body, truncated = fetch_page(url, timeout=10,
+                                                       max_bytes=settings.MONITOR_MAX_BODY_BYTES,
+                                                       deadline=settings.MONITOR_FETCH_DEADLINE)
+            if response.status_code != 200:
+                return None
+        else:
+            metrics.incr('seo_refetches_avoided')
         
-        if response.status_code == 200:
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            # Get title
-            title_tag = soup.find('title')
-            if title_tag:
-                result['title'] = title_tag.text.strip()
-            
-            # Get meta description
-            meta_desc = soup.find('meta', attrs={'name': 'description'})
-            if meta_desc and meta_desc.get('content'):
-                result['meta_description'] = meta_desc['content'].strip()
-            
-            # Count H1 tags
-            result['h1_count'] = len(soup.find_all('h1'))
-            
-            # Count words in body
-            body = soup.find('body')
-            if body:
-                text = body.get_text()
-                words = text.split()
-                result['word_count'] = len(words)
+        with metrics.timer('seo_parse_seconds'):
+            result = analyze_html(body, url, with_links=True)
+        result['content_truncated'] = truncated
+        return result
     
     except Exception as e:
         logger.error(f"Error checking SEO for {url}: {str(e)}")
-    
-    return result
+        return None
+
+def count_probe(uptime_result):
+    """Record a probe's outcome and response time in the metrics"""
+    if 'deferred' in uptime_result:
+        metrics.incr('probes', outcome='deferred')
+        return
+    if uptime_result['is_up']:
+        outcome = 'up'
+    elif uptime_result['status_code']:
+        outcome = 'down'
+    else:
+        outcome = 'error'
+    metrics.incr('probes', outcome=outcome)
+    metrics.observe('probe_response_seconds', uptime_result['response_time'], outcome=outcome)
+
+def page_seo_log(website, seo_result):
+    """Build an SEOLog from an analysis made ``with_links``
+
+    The links ride along on the unsaved row so the link check stage can
+    pick them up once the row is written.
+    """
+    links = seo_result.pop('links', [])
+    seo_log = SEOLog(website=website, **seo_result)
+    seo_log.links = links
+    if not links:
+        seo_log.broken_links = 0
+    return seo_log
+
+def record_results(website, uptime_result, sink):
+    """Queue an uptime result and, if the site is up, its SEO check on the sink
+
+    Returns what record_seo returns.
+    """
+    record_uptime(website, uptime_result, sink)
+    return record_seo(website, uptime_result, sink)
+
+def record_uptime(website, uptime_result, sink):
+    """Queue the UptimeLog for a probe result on the sink"""
+    sink.add(UptimeLog(
+        website=website,
+        status_code=uptime_result['status_code'],
+        response_time=uptime_result['response_time'],
+        is_up=uptime_result['is_up'],
+        error_message=uptime_result.get('error_message', ''),
+        probe_node=sharding.local_node(),
+        **{field: uptime_result.get(field) for field in PHASE_FIELDS}
+    ))
+
+def record_seo(website, uptime_result, sink):
+    """Queue the SEO check of a site that is up on the sink
+
+    The SEO check is skipped when the page is the one the latest SEOLog was
+    made from (a 304, or the same body hash); the ``seo_verified_at`` update
+    for page_changes.save_fingerprints is returned instead, else None. A new
+    SEOLog carries the page's fingerprint, saved once the sink writes it.
+    """
+    if not uptime_result['is_up']:
+        return None
+
+    # Unchanged page: same SEO result, so only note that it was verified
+    if page_changes.is_unchanged(page_changes.current_status(website), uptime_result):
+        metrics.incr('seo_unchanged_skipped')
+        return {'seo_verified_at': timezone.now()}
+
+    # Check SEO if website is up
+    seo_result = check_seo(website.url, body=uptime_result.get('body'),
+                           truncated=uptime_result.get('body_truncated', False))
+    if seo_result is None:
+        return None
+    seo_log = page_seo_log(website, seo_result)
+    if uptime_result.get('body') is not None:
+        seo_log.fingerprint = page_changes.fingerprint(uptime_result)
+    sink.add(seo_log)
+    return None
 
 @shared_task
-def monitor_website(website_id):
+@profiled
+def monitor_website(website_id, reserved=False):
+    """Check one website, within its host's rate limit
+
+    ``reserved`` is set on the re-queued task once a rate limit token has
+    been reserved for when it runs.
+    """
     try:
-        website = Website.objects.get(id=website_id, is_active=True)
+        website = Website.objects.select_related('status').get(id=website_id, is_active=True)
         
-        # Check uptime
-        uptime_result = check_uptime(website.url)
-        
-        # Save uptime log
-        UptimeLog.objects.create(
-            website=website,
-            status_code=uptime_result['status_code'],
-            response_time=uptime_result['response_time'],
-            is_up=uptime_result['is_up'],
-            error_message=uptime_result.get('error_message', '')
-        )
+        # Take the host's rate limit turn, or put the check off
+        limiter = rate_limit.get_rate_limiter()
+        host = urlparse(website.url).hostname or ''
+        if not reserved:
+            delay, reserved = limiter.acquire(host)
+            if not reserved:
+                defer({website.id: delay})
+                count_probe({'deferred': delay})
+                return f"Deferred {website.name} for {delay:.0f}s"
+            if delay > 0:
+                # Come back for the reserved turn instead of holding this worker until then
+                monitor_website.apply_async((website.id,), {'reserved': True}, countdown=delay)
+                return f"Queued {website.name} for its turn in {delay:.1f}s"
         
-        # Check SEO if website is up
-        if uptime_result['is_up']:
-            seo_result = check_seo(website.url)
-            
-            SEOLog.objects.create(
-                website=website,
-                title=seo_result.get('title'),
-                meta_description=seo_result.get('meta_description'),
-                h1_count=seo_result.get('h1_count', 0),
-                word_count=seo_result.get('word_count', 0),
-                internal_links=seo_result.get('internal_links', 0),
-                external_links=seo_result.get('external_links', 0)
-            )
+        # Check uptime
+        headers = page_changes.conditional_headers(page_changes.current_status(website))
+        with stage('fetch'):
+            uptime_result = check_uptime(website.url, keep_body=True, headers=headers)
+        count_probe(uptime_result)
+        if uptime_result.get('retry_after'):
+            limiter.block(host, uptime_result['retry_after'])
+        update = record_results(website, uptime_result, get_result_sink())
+        if update is not None:
+            with stage('persist'):
+                page_changes.save_fingerprints({website.id: update})
         
         logger.info(f"Checked {website.name}: {uptime_result['status_code']}")
         return f"Successfully monitored {website.name}"
@@ -118,11 +208,154 @@ def monitor_website(website_id):
         logger.error(f"Error monitoring website {website_id}: {str(e)}")
         return f"Error: {str(e)}"
 
+@shared_task
+@profiled
+def generate_seo_report(website_id, job_id):
+    """Fetch and score a website for an on-demand SEO report"""
+    try:
+        website = Website.objects.get(id=website_id)
+        with stage('fetch'):
+            response, body, truncated = fetch_page(website.url, timeout=10,
+                                                   max_bytes=settings.MONITOR_MAX_BODY_BYTES,
+                                                   deadline=settings.MONITOR_FETCH_DEADLINE)
+        with metrics.timer('seo_parse_seconds'):
+            seo_result = analyze_html(body, website.url, with_links=True)
+        seo_log = page_seo_log(website, seo_result)
+        seo_log.content_truncated = truncated
+        
+        sink = ResultSink(max_age=None)
+        sink.add(seo_log)
+        sink.flush()
+        
+        report_jobs.release(website_id, job_id, seo_log_id=seo_log.id)
+        return f"Generated SEO report for {website.name}"
+        
+    except Website.DoesNotExist:
+        report_jobs.release(website_id, job_id, error="Website not found")
+        return f"Website {website_id} not found"
+    except requests.RequestException as e:
+        report_jobs.release(website_id, job_id, error=f"Could not fetch website: {str(e)}")
+        return f"Error: {str(e)}"
+    except Exception as e:
+        logger.error(f"Error generating report for website {website_id}: {str(e)}")
+        report_jobs.release(website_id, job_id, error="Report generation failed")
+        return f"Error: {str(e)}"
+
+@shared_task
+@profiled
+def monitor_website_batch(website_ids):
+    """Probe a batch of websites concurrently on one event loop"""
+    websites = list(Website.objects.filter(id__in=website_ids, is_active=True).select_related('status'))
+    
+    engine = ProbeEngine(
+        max_in_flight=settings.MONITOR_PROBE_MAX_IN_FLIGHT,
+        per_host_limit=settings.MONITOR_PROBE_PER_HOST_LIMIT,
+        timeout=settings.MONITOR_PROBE_TIMEOUT,
+        max_body_bytes=settings.MONITOR_MAX_BODY_BYTES,
+        deadline=settings.MONITOR_FETCH_DEADLINE,
+        keep_body=True,
+        max_kept_bytes=settings.MONITOR_PROBE_MAX_KEPT_BYTES,
+        limiter=rate_limit.get_rate_limiter(),
+        phase_timing=settings.MONITOR_PROBE_PHASE_TIMING,
+        dns_cache_ttl=settings.MONITOR_DNS_CACHE_TTL,
+    )
+    headers = {website.id: page_changes.conditional_headers(page_changes.current_status(website))
+               for website in websites}
+    with stage('fetch'):
+        uptime_results = engine.run(((website.id, website.url) for website in websites), headers=headers)
+    for uptime_result in uptime_results.values():
+        count_probe(uptime_result)
+    
+    # Probes held back by the rate limiter go back in the schedule
+    deferred = {website_id: result['deferred'] for website_id, result in uptime_results.items()
+                if 'deferred' in result}
+    if deferred:
+        defer(deferred)
+    websites = [website for website in websites if website.id not in deferred]
+    
+    reused = sum('body' in result for result in uptime_results.values())
+    sink = ResultSink(max_size=settings.MONITOR_SINK_MAX_SIZE, max_age=None)
+    # Uptime rows first, so slow SEO parsing doesn't hold them back
+    for website in websites:
+        record_uptime(website, uptime_results[website.id], sink)
+    sink.flush()
+
+    up_count = 0
+    verified = {}
+    for website in websites:
+        uptime_result = uptime_results[website.id]
+        up_count += uptime_result['is_up']
+        try:
+            update = record_seo(website, uptime_result, sink)
+        except Exception as e:
+            logger.error(f"Error recording results for website {website.id}: {str(e)}")
+            continue
+        finally:
+            # Let each page body go once it's been analysed
+            uptime_result.pop('body', None)
+        if update is not None:
+            verified[website.id] = update
+    sink.flush()
+    with stage('persist'):
+        page_changes.save_fingerprints(verified)
+    
+    logger.info(f"Checked batch of {len(websites)} websites: {up_count} up, {len(deferred)} deferred, "
+                f"{reused} page bodies reused for SEO, {len(verified)} unchanged pages not re-analysed")
+    return f"Monitored {len(websites)} websites"
+
 @shared_task
 def monitor_all_websites():
-    active_websites = Website.objects.filter(is_active=True)
-    results = []
-    for website in active_websites:
-        result = monitor_website.delay(website.id)
-        results.append(result)
-    return f"Started monitoring {len(results)} websites"
\ No newline at end of file
+    """Dispatch the active websites whose check_interval has elapsed
+
+    With probe nodes up, each website's batch goes to the queue of the node
+    the hash ring assigns it to; otherwise to the default queue.
+    """
+    website_ids = claim_due_websites(limit=settings.MONITOR_SCHEDULER_MAX_PER_TICK)
+    ring = sharding.get_ring()
+    if ring:
+        assignments = {sharding.queue_for(node): ids for node, ids in ring.assign(website_ids).items()}
+    else:
+        assignments = {None: website_ids}
+    
+    batch_size = settings.MONITOR_PROBE_BATCH_SIZE
+    batches = 0
+    for queue, ids in assignments.items():
+        for start in range(0, len(ids), batch_size):
+            # A batch left on the queue of a node that died is dropped; its
+            # websites come due again after one interval.
+            monitor_website_batch.apply_async(args=[ids[start:start + batch_size]], queue=queue,
+                                              expires=settings.MONITOR_PROBE_BATCH_EXPIRES)
+            batches += 1
+    return (f"Started monitoring {len(website_ids)} due websites in {batches} batches "
+            f"across {len(assignments)} queues")
+
+@shared_task
+def compact_uptime_rollups():
+    """Fold newly written uptime checks into the per-website rollups"""
+    written = rollups.compact()
+    return f"Compacted {written} minute rollups"
+
+@shared_task
+def prune_history():
+    """Delete uptime and SEO history past its retention window"""
+    deleted = apply_retention()
+    return f"Deleted {sum(deleted.values())} rows"
+
+@shared_task
+def maintain_uptime_partitions():
+    """Keep upcoming UptimeLog partitions created (PostgreSQL only)"""
+    if not partitions.is_partitioned():
+        return "UptimeLog is not partitioned"
+    created = partitions.ensure_partitions()
+    return f"Created {len(created)} partitions"
+
+@shared_task
+def check_page_links(links_by_log):
+    """Count broken links on newly written SEO checks, keyed by SEOLog id"""
+    counts = link_checker.count_broken({int(log_id): links for log_id, links in links_by_log.items()})
+    SEOLog.objects.bulk_update([SEOLog(id=log_id, **fields) for log_id, fields in counts.items()],
+                               ['broken_links', 'links_checked'], batch_size=1000)
+    # The report pages cache these rows with the counts still unset
+    website_cache.invalidate_website_logs(
+        SEOLog.objects.filter(id__in=counts).values_list('website_id', flat=True))
+    return f"Checked links on {len(counts)} pages"
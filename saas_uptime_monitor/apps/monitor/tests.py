@@ -1,3 +1,1009 @@
-from django.test import TestCase
+import os
+import tempfile
+import time
+from collections import Counter
+from datetime import timedelta
+from unittest import mock, skipUnless
+from urllib.parse import urlparse
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+from celery.signals import worker_shutdown
+from kombu.exceptions import OperationalError
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+from .management.commands.loadtest import SiteFarm, farm_dns
+from .models import SEOLog, UptimeLog, UptimeRollup, Website, WebsiteStatus
+from .signals import logs_written, status_changed
+from .services import sink as sink_module
+from .services.sink import ResultSink
+from .services.html_parsers import available_backends
+from .services import (keywords, link_checker, metrics, partitions, phases, profiling, rate_limit, report_jobs,
+                       rollups, website_cache)
+from .services.http import fetch_page, get_session
+from .services.probe import ProbeEngine
+from .services.link_checker import count_broken, LinkChecker
+from .services.rate_limit import HostRateLimiter, retry_after_seconds
+from .services.retention import apply_retention
+from .services.scheduler import backoff_factor, claim_due_websites
+from .services.sharding import HashRing
+from .tasks import (check_page_links, check_uptime, generate_seo_report, monitor_all_websites, monitor_website,
+                    monitor_website_batch)
+from .services.seo_analyzer import analyze_html
+
+PAGES_DIR = os.path.join(os.path.dirname(__file__), 'benchmarks', 'pages')
+
+# Queries per page view on a cold cache, independent of how many checks exist
+DASHBOARD_QUERIES = 6
+REPORT_QUERIES = 8
+
+
+def load_page(name):
+    with open(os.path.join(PAGES_DIR, name), 'rb') as f:
+        return f.read()
+
+
+class SEOAnalyzerTests(SimpleTestCase):
+    def test_landing_page_metrics(self):
+        result = analyze_html(load_page('landing.html'), 'https://www.acme-analytics.example/')
+
+        self.assertEqual(result['title'], 'Acme Analytics - Product analytics for growing SaaS teams')
+        self.assertEqual(result['h1_count'], 1)
+        self.assertEqual(result['h2_count'], 2)
+        self.assertEqual(result['h3_count'], 3)
+        self.assertEqual(result['internal_links'], 8)
+        self.assertEqual(result['external_links'], 3)
+        self.assertEqual(result['total_images'], 4)
+        self.assertEqual(result['images_without_alt'], 2)
+        self.assertTrue(result['has_viewport_meta'])
+        self.assertTrue(result['has_favicon'])
+        self.assertTrue(result['has_short_content'])
+
+    def test_script_and_style_text_is_not_counted(self):
+        html = ('<html><head><title>T</title>\n<style>.a { color: red }</style></head>\n'
+                '<body><script>var words = "one two three";</script>\n<p>Just four words here</p></body></html>')
+        result = analyze_html(html, 'https://example.com/')
+
+        # The title text counts, script and style bodies don't
+        self.assertEqual(result['word_count'], 5)
+
+    def test_legacy_markup(self):
+        result = analyze_html(load_page('legacy.html'), 'http://www.bobshardware.example/')
+
+        self.assertEqual(result['h1_count'], 2)
+        self.assertTrue(result['has_multiple_h1'])
+        self.assertTrue(result['has_missing_meta_description'])
+        self.assertTrue(result['has_favicon'])
+        self.assertIn("Missing viewport meta tag (not mobile-friendly)",
+                      result['google_terms_issues'])
+
+
+class ParserBackendParityTests(SimpleTestCase):
+    """Every backend must produce the same SEOLog fields as the BeautifulSoup reference"""
+
+    REFERENCE = 'html.parser'
+
+    SNIPPETS = {
+        'template': '<template><p>x y</p></template><p>z</p>',
+        'valueless_attributes': '<a href>x</a><img alt><link rel=ICON><meta name=viewport>',
+        'entities': '<title>A &amp; B &#8211; C&nbsp;D</title><p>caf&eacute; &lt;tag&gt;</p>',
+        'uppercase': '<HTML><BODY><H1>X</H1><A HREF="http://other.example/">o</A></BODY></HTML>',
+        'meta_charset': '<meta charset="iso-8859-1"><title>caf\xe9</title>'.encode('latin-1'),
+        'ruby': '<ruby>kan<rt>k</rt><rp>(</rp></ruby> ji',
+        'ruby_unclosed': '<ruby>kan<rp>(<rt>k<rp>)<rt>j</ruby> ji <ruby>ka<rt>k<b>x</b>y</ruby> na',
+        'ruby_unclosed_in_paragraph': '<p><ruby>kan<rt>k</p><p>after</p>',
+        'unclosed_inline': '<p>one<b>two</b>three</p><p>four',
+        'script_with_markup': '<body>before<script>if (a < b) { x = "</p>"; }</script>after</body>',
+        'empty': '',
+        'text_only': 'just some text. no tags at all.',
+    }
+
+    # libxml2 reads an unclosed <title> as raw text up to the end of the
+    # document and drops CDATA sections, so lxml differs on these.
+    LXML_DIVERGES = {
+        'unclosed_title': '<html><head><title>Hello world<body><p>Text here</p>',
+        'cdata': '<p>a <![CDATA[b c]]> d</p>',
+    }
+
+    def assert_parity(self, html, label, backends):
+        expected = analyze_html(html, 'https://www.example.org/', backend=self.REFERENCE)
+        for backend in backends:
+            with self.subTest(page=label, backend=backend):
+                self.assertEqual(analyze_html(html, 'https://www.example.org/', backend=backend), expected)
+
+    def test_corpus(self):
+        backends = [name for name in available_backends() if name != self.REFERENCE]
+        for name in sorted(os.listdir(PAGES_DIR)):
+            self.assert_parity(load_page(name), name, backends)
+
+    def test_snippets(self):
+        backends = [name for name in available_backends() if name != self.REFERENCE]
+        for label, html in self.SNIPPETS.items():
+            self.assert_parity(html, label, backends)
+        for label, html in self.LXML_DIVERGES.items():
+            self.assert_parity(html, label, [name for name in backends if name != 'lxml'])
+
+
+class LogQueryTests(TestCase):
+    """Per-website log reads must come straight off an index, unsorted"""
+
+    # What a sort step looks like in each backend's EXPLAIN output
+    SORT_MARKERS = {'sqlite': 'TEMP B-TREE', 'postgresql': 'Sort'}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('owner', password='secret')
+        cls.website = Website.objects.create(name='Acme', url='https://acme.example/', owner=cls.user)
+        UptimeLog.objects.bulk_create(
+            UptimeLog(website=cls.website, status_code=200 if i % 7 else 503,
+                      response_time=0.2, is_up=bool(i % 7)) for i in range(50))
+        SEOLog.objects.bulk_create(SEOLog(website=cls.website) for _ in range(10))
+
+    def setUp(self):
+        cache.clear()
+
+    def plan(self, queryset):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                # Tiny test tables would always be scanned sequentially
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.explain()
+
+    def assert_index_only(self, queryset, index):
+        plan = self.plan(queryset)
+        self.assertIn(index, plan)
+        marker = self.SORT_MARKERS.get(connection.vendor)
+        if marker:
+            self.assertNotIn(marker, plan)
+
+    def test_recent_uptime_checks_use_index(self):
+        self.assert_index_only(UptimeLog.objects.for_website(self.website)[:5],
+                               'uptimelog_website_recent_idx')
+
+    def test_incidents_use_partial_index(self):
+        self.assert_index_only(UptimeLog.objects.for_website(self.website).incidents()[:5],
+                               'uptimelog_website_down_idx')
+
+    def test_recent_seo_checks_use_index(self):
+        self.assert_index_only(SEOLog.objects.for_website(self.website)[:5],
+                               'seolog_website_recent_idx')
+
+    def test_no_default_ordering(self):
+        self.assertNotIn('ORDER BY', str(UptimeLog.objects.filter(website=self.website).query))
+        self.assertNotIn('ORDER BY', str(SEOLog.objects.filter(website=self.website).query))
+
+    def test_keyword_trend(self):
+        SEOLog.objects.bulk_create([
+            SEOLog(website=self.website, checked_at=timezone.now() - timedelta(days=1),
+                   top_keywords={'analytics': 12, 'teams': 4}, keyword_density={'analytics': 2.4, 'teams': 0.8}),
+            SEOLog(website=self.website, top_keywords={'analytics': 9}, keyword_density={'analytics': 1.5}),
+        ])
+
+        trend = list(SEOLog.objects.filter(website=self.website).keyword_trend('analytics'))
+        self.assertEqual([(row['keyword_count'], row['keyword_density_pct']) for row in trend],
+                         [(12, 2.4), (9, 1.5)])
+        self.assertEqual(SEOLog.objects.keyword_trend('teams').count(), 1)
+
+    def test_dashboard_query_count(self):
+        self.client.force_login(self.user)
+        with self.assertNumQueries(DASHBOARD_QUERIES):
+            response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_report_query_count(self):
+        self.client.force_login(self.user)
+        with self.assertNumQueries(REPORT_QUERIES):
+            response = self.client.get(reverse('view_report', args=[self.website.id]))
+        self.assertEqual(response.status_code, 200)
+
+    def test_cached_page_views(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse('dashboard'))
+        self.client.get(reverse('view_report', args=[self.website.id]))
+        # Session, user and website lookups only
+        with self.assertNumQueries(3):
+            self.client.get(reverse('dashboard'))
+        with self.assertNumQueries(3):
+            self.client.get(reverse('view_report', args=[self.website.id]))
+
+    def test_new_logs_invalidate_cached_checks(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse('dashboard'))
+
+        sink = ResultSink(max_age=None)
+        sink.add(UptimeLog(website=self.website, status_code=500, response_time=0.1,
+                           is_up=False, error_message='fresh failure'))
+        sink.flush()
+
+        response = self.client.get(reverse('view_report', args=[self.website.id]))
+        self.assertContains(response, 'fresh failure')
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.context['recent_logs'][0].status_code, 500)
+
+
+class LinkCheckCacheTests(TestCase):
+    def test_link_counts_invalidate_cached_reports(self):
+        cache.clear()
+        user = User.objects.create_user('owner')
+        website = Website.objects.create(name='Acme', url='https://acme.example/', owner=user)
+        seo_log = SEOLog.objects.create(website=website)
+        self.assertIsNone(website_cache.website_logs(website)['seo_reports'][0].broken_links)
+
+        with mock.patch.object(link_checker, 'count_broken',
+                               return_value={seo_log.id: {'broken_links': 1, 'links_checked': 4}}):
+            check_page_links({str(seo_log.id): ['https://acme.example/gone']})
+        self.assertEqual(website_cache.website_logs(website)['seo_reports'][0].broken_links, 1)
+
+
+class LinkCheckerTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_page_links(self):
+        result = analyze_html(load_page('landing.html'), 'https://www.acme-analytics.example/', with_links=True)
+
+        self.assertIn('https://www.acme-analytics.example/pricing/', result['links'])
+        self.assertTrue(all(link.startswith(('http://', 'https://')) for link in result['links']))
+        self.assertTrue(all('#' not in link for link in result['links']))
+        self.assertEqual(len(result['links']), len(set(result['links'])))
+
+    def test_shared_links_are_checked_once(self):
+        statuses = {'https://a.example/': 200, 'https://a.example/gone': 404, 'https://b.example/': 200}
+        checked = []
+
+        async def check(self, session, url):
+            checked.append(url)
+            return statuses[url]
+
+        with mock.patch.object(LinkChecker, '_check', check):
+            counts = count_broken({1: ['https://a.example/', 'https://a.example/gone'],
+                                   2: ['https://a.example/gone', 'https://b.example/']})
+            self.assertEqual(sorted(checked), sorted(statuses))
+            self.assertEqual(counts[1], {'broken_links': 1, 'links_checked': 2})
+            self.assertEqual(counts[2], {'broken_links': 1, 'links_checked': 2})
+
+            # Statuses come from the cache the second time
+            count_broken({3: list(statuses)})
+            self.assertEqual(len(checked), 3)
+
+
+class RateLimitTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_reservations_spread_requests(self):
+        limiter = HostRateLimiter(rate=1, burst=2, max_wait=2)
+
+        waits = limiter.reserve('acme.example', 5)
+        self.assertEqual([round(wait) for wait in waits], [0, 0, 1, 2])
+        # Other hosts have their own bucket
+        self.assertEqual(limiter.reserve('other.example'), [0])
+
+    def test_retry_after_blocks_host(self):
+        limiter = HostRateLimiter()
+        self.assertEqual(retry_after_seconds('120'), 120)
+        self.assertIsNone(retry_after_seconds('soon'))
+
+        limiter.block('acme.example', retry_after_seconds('120'))
+        self.assertEqual(list(limiter.blocked_for(['acme.example', 'other.example'])), ['acme.example'])
+        delay, reserved = limiter.acquire('acme.example')
+        self.assertGreater(delay, 100)
+        self.assertFalse(reserved)
+        self.assertEqual(limiter.acquire('other.example'), (0, True))
+
+    def test_acquire_does_not_wait(self):
+        limiter = HostRateLimiter(rate=0.1, burst=1, max_wait=15)
+        self.assertEqual(limiter.acquire('acme.example'), (0, True))
+        started = time.monotonic()
+        delay, reserved = limiter.acquire('acme.example')
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertTrue(reserved)
+        self.assertAlmostEqual(delay, 10, delta=0.5)
+        # Booked up past max_wait
+        self.assertEqual(limiter.acquire('acme.example'), (15, False))
+
+    @skipUnless(fakeredis, "Needs fakeredis[lua] to run the token bucket script")
+    def test_redis_token_bucket(self):
+        server = fakeredis.FakeRedis()
+        with mock.patch.object(rate_limit.redis.Redis, 'from_url', return_value=server):
+            limiter = HostRateLimiter(rate=1, burst=2, max_wait=2, redis_url='redis://buckets')
+            other_worker = HostRateLimiter(rate=1, burst=2, max_wait=2, redis_url='redis://buckets')
+
+        self.assertEqual([round(wait) for wait in limiter.reserve('acme.example', 3)], [0, 0, 1])
+        # The bucket is shared: the next turn is 2s out, the one after past max_wait
+        self.assertEqual([round(wait) for wait in other_worker.reserve('acme.example', 2)], [2])
+        self.assertEqual(limiter.reserve('acme.example'), [])
+        self.assertEqual([round(wait) for wait in limiter.reserve('other.example', 1)], [0])
+        self.assertGreater(server.ttl('monitor:ratelimit:bucket:acme.example'), 0)
+
+        # Without Redis each worker falls back to its own buckets
+        with mock.patch.object(limiter, 'script', side_effect=rate_limit.redis.ConnectionError):
+            self.assertEqual([round(wait) for wait in limiter.reserve('acme.example', 3)], [0, 0, 1])
+
+    def test_backoff_factor(self):
+        with self.settings(MONITOR_BACKOFF_AFTER_FAILURES=3):
+            self.assertEqual([backoff_factor(failures) for failures in range(6)], [1, 1, 1, 2, 4, 8])
+
+
+class PhaseTimingTests(SimpleTestCase):
+    def test_durations(self):
+        marks = {'start': 0, 'connect_start': 0.001, 'dns_start': 0.001, 'dns_end': 0.021,
+                 'tls_start': 0.051, 'tls_end': 0.111, 'connect_end': 0.112,
+                 'request_sent': 0.113, 'response_start': 0.313, 'body_done': 0.413}
+
+        self.assertEqual(phases.durations(marks), {
+            'dns_time': 0.02, 'connect_time': 0.03, 'tls_time': 0.06,
+            'first_byte_time': 0.2, 'transfer_time': 0.1,
+        })
+
+    def test_reused_connection(self):
+        marks = {'start': 0, 'request_sent': 0.001, 'response_start': 0.201, 'body_done': 0.301}
+
+        durations = phases.durations(marks)
+        self.assertIsNone(durations['connect_time'])
+        self.assertIsNone(durations['tls_time'])
+        self.assertEqual(durations['first_byte_time'], 0.2)
+
+
+class ShardingTests(TestCase):
+    def test_joining_node_only_takes_websites(self):
+        website_ids = range(1, 10001)
+        before = HashRing(['eu', 'us']).assign(website_ids)
+        after = HashRing(['eu', 'us', 'ap']).assign(website_ids)
+
+        self.assertTrue(set(after['eu']) <= set(before['eu']))
+        self.assertTrue(set(after['us']) <= set(before['us']))
+        self.assertAlmostEqual(len(after['ap']) / 10000, 1 / 3, delta=0.05)
+
+    def test_batches_go_to_node_queues(self):
+        user = User.objects.create_user('owner', password='secret')
+        for n in range(20):
+            Website.objects.create(name=f'Site {n}', url=f'https://site{n}.example/', owner=user)
+
+        with self.settings(MONITOR_PROBE_NODES=['eu', 'us']), \
+                mock.patch.object(monitor_website_batch, 'apply_async') as apply_async:
+            monitor_all_websites()
+
+        ring = HashRing(['eu', 'us'])
+        dispatched = [website_id for call in apply_async.call_args_list for website_id in call.kwargs['args'][0]]
+        self.assertEqual(sorted(dispatched), sorted(Website.objects.values_list('id', flat=True)))
+        for call in apply_async.call_args_list:
+            for website_id in call.kwargs['args'][0]:
+                self.assertEqual(call.kwargs['queue'], f'probe.{ring.node_for(website_id)}')
+
+
+class MetricsTests(TestCase):
+    def test_histogram_buckets(self):
+        registry = metrics.Registry()
+        registry.observe('seo_parse_seconds', 0.02)
+        registry.observe('seo_parse_seconds', 0.3)
+
+        totals = registry.totals()
+        self.assertEqual(totals['monitor_seo_parse_seconds_bucket{le="0.01"}'], 0)
+        self.assertEqual(totals['monitor_seo_parse_seconds_bucket{le="0.025"}'], 1)
+        self.assertEqual(totals['monitor_seo_parse_seconds_bucket{le="+Inf"}'], 2)
+        self.assertEqual(totals['monitor_seo_parse_seconds_count'], 2)
+
+    def test_endpoint(self):
+        metrics.incr('probes', outcome='up')
+        with self.settings(MONITOR_METRICS_TOKEN='s3cret'), \
+                mock.patch.object(metrics, 'queue_depths', return_value={'celery': 3}):
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, 401)
+            response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer s3cret')
+
+        body = response.content.decode()
+        self.assertIn('# TYPE monitor_probes_total counter', body)
+        self.assertIn('monitor_probes_total{outcome="up"}', body)
+        self.assertIn('monitor_celery_queue_depth{queue="celery"} 3', body)
+
+    def test_endpoint_closed_without_token(self):
+        with self.settings(MONITOR_METRICS_TOKEN=''), \
+                mock.patch.object(metrics, 'queue_depths', return_value={}):
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+            with self.settings(DEBUG=True):
+                self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='203.0.113.7').status_code, 403)
+                self.assertEqual(self.client.get(reverse('metrics')).status_code, 200)
+
+
+class ProfilingTests(SimpleTestCase):
+    def test_off_by_default(self):
+        self.assertIs(profiling.profile_task('monitor_website'), profiling.stage('parse'))
+        analyze_html(load_page('landing.html'), 'https://example.com/')
+
+    def test_saves_slow_run(self):
+        with tempfile.TemporaryDirectory() as output_dir, \
+                self.settings(MONITOR_PROFILE_TASKS={'monitor_website'}, MONITOR_PROFILE_CAPTURE='cprofile',
+                              MONITOR_PROFILE_SLOW_SECONDS=0, MONITOR_PROFILE_DIR=output_dir):
+            with profiling.profile_task('monitor_website') as profiler:
+                analyze_html(load_page('landing.html'), 'https://example.com/')
+                analyze_html(load_page('landing.html'), 'https://example.com/')
+            saved = sorted(os.path.splitext(name)[1] for name in os.listdir(output_dir))
+
+        self.assertEqual(profiler.counts, {'parse': 2, 'score': 2})
+        self.assertEqual(saved, ['.json', '.prof'])
+
+
+class SiteFarmTests(SimpleTestCase):
+    def test_site_kinds(self):
+        sites = {'ok.farm.test': 'ok', 'moved.farm.test': 'redirect', 'big.farm.test': 'large'}
+        engine = ProbeEngine(max_body_bytes=256 * 1024, keep_body=True)
+        with SiteFarm(sites, latency=0, large_page_kb=1024) as farm, farm_dns():
+            results = engine.run((host, farm.url(host)) for host in [*sites, 'elsewhere.example'])
+
+        self.assertTrue(results['ok.farm.test']['is_up'])
+        self.assertEqual(results['moved.farm.test']['status_code'], 200)
+        self.assertTrue(results['big.farm.test']['body_truncated'])
+        self.assertEqual(results['elsewhere.example']['status_code'], 0)
+
+    def test_kept_bodies_are_capped(self):
+        sites = {'a.farm.test': 'large', 'b.farm.test': 'large'}
+        engine = ProbeEngine(max_body_bytes=256 * 1024, keep_body=True, max_kept_bytes=300 * 1024)
+        with SiteFarm(sites, latency=0, large_page_kb=1024) as farm, farm_dns():
+            results = engine.run((host, farm.url(host)) for host in sites)
+
+        self.assertTrue(all(result['is_up'] for result in results.values()))
+        self.assertEqual(sum('body' in result for result in results.values()), 1)
+
+    def test_deadline_cuts_slow_bodies(self):
+        sites = {'chunked.farm.test': 'slowloris', 'length.farm.test': 'trickle'}
+        engine = ProbeEngine(timeout=10, deadline=1.5, keep_body=True)
+        with SiteFarm(sites, latency=0, drip_interval=4) as farm, farm_dns():
+            started = time.monotonic()
+            results = engine.run((host, farm.url(host)) for host in sites)
+            self.assertLess(time.monotonic() - started, 3)
+
+        for result in results.values():
+            self.assertEqual(result['status_code'], 200)
+            self.assertTrue(result['body_truncated'])
+            self.assertTrue(result['body'])
+
+
+class ProbeEngineTests(SimpleTestCase):
+    SITES = {f'{name}.farm.test': kind for name, kind in
+             [*((f'host{n}', 'ok') for n in range(6)), ('moved', 'redirect')]}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.farm = cls.enterClassContext(SiteFarm(cls.SITES, latency=0.1))
+        cls.enterClassContext(farm_dns())
+
+    def test_concurrency_limits(self):
+        engine = ProbeEngine(max_in_flight=8, per_host_limit=2)
+        in_flight, peaks = Counter(), Counter()
+        probe = engine._probe
+
+        async def counting_probe(session, url, headers=None):
+            host = urlparse(url).hostname
+            for key in (host, None):
+                in_flight[key] += 1
+                peaks[key] = max(peaks[key], in_flight[key])
+            try:
+                return await probe(session, url, headers)
+            finally:
+                in_flight[host] -= 1
+                in_flight[None] -= 1
+
+        engine._probe = counting_probe
+        targets = [(f'{host}-{n}', self.farm.url(host)) for host in self.SITES for n in range(5)]
+        results = engine.run(targets)
+
+        self.assertTrue(all(result['is_up'] for result in results.values()))
+        # 7 hosts could have 14 probes out; the global cap holds them to 8
+        overall = peaks.pop(None)
+        self.assertLessEqual(overall, 8)
+        self.assertGreater(overall, 2)
+        self.assertEqual(max(peaks.values()), 2)
+
+    def test_results_match_check_uptime(self):
+        engine = ProbeEngine(timeout=10, max_body_bytes=settings.MONITOR_MAX_BODY_BYTES,
+                             deadline=settings.MONITOR_FETCH_DEADLINE, keep_body=True)
+        hosts = ['host0.farm.test', 'moved.farm.test', 'elsewhere.example']
+        results = engine.run((host, self.farm.url(host)) for host in hosts)
+
+        for host in hosts:
+            with self.subTest(host=host):
+                expected = check_uptime(self.farm.url(host), keep_body=True)
+                self.assertEqual(results[host].keys(), expected.keys())
+                for key in expected.keys() - {'response_time', 'error_message'}:
+                    self.assertEqual(results[host][key], expected[key], key)
+                self.assertEqual(bool(results[host]['error_message']), bool(expected['error_message']))
+
+
+class FetchPageTests(SimpleTestCase):
+    SITES = {'ok.farm.test': 'ok', 'pooled.farm.test': 'ok', 'chunked.farm.test': 'slowloris',
+             'length.farm.test': 'trickle'}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.farm = cls.enterClassContext(SiteFarm(cls.SITES, latency=0))
+        cls.enterClassContext(farm_dns())
+
+    def test_whole_page(self):
+        response, body, truncated = fetch_page(self.farm.url('ok.farm.test'), deadline=5)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(body.rstrip().endswith(b'</html>'))
+        self.assertFalse(truncated)
+
+    def pool(self, host):
+        pools = get_session().get_adapter(self.farm.url(host)).poolmanager.pools
+        return next(pools[key] for key in pools.keys() if key.key_host == host)
+
+    def test_connections_are_reused(self):
+        session = get_session()
+        self.assertIs(get_session(), session)
+        for _ in range(5):
+            fetch_page(self.farm.url('pooled.farm.test'), deadline=5)
+        pool = self.pool('pooled.farm.test')
+        self.assertEqual((pool.num_connections, pool.num_requests), (1, 5))
+
+        # A forked child builds its own session instead of sharing sockets
+        with mock.patch('apps.monitor.services.http.os.getpid', return_value=os.getpid() + 1):
+            self.assertIsNot(get_session(), session)
+
+    def test_pooled_socket_keeps_its_timeout(self):
+        fetch_page(self.farm.url('ok.farm.test'), timeout=7, deadline=5)
+        socks = [connection.sock for connection in self.pool('ok.farm.test').pool.queue
+                 if connection is not None and connection.sock is not None]
+        self.assertTrue(socks)
+        self.assertTrue(all(sock.gettimeout() == 7 for sock in socks))
+
+    def test_deadline_cuts_slow_bodies(self):
+        for host in ('chunked.farm.test', 'length.farm.test'):
+            with self.subTest(host=host):
+                started = time.monotonic()
+                _, body, truncated = fetch_page(self.farm.url(host), deadline=1.5)
+                self.assertLess(time.monotonic() - started, 3)
+                self.assertTrue(truncated)
+                self.assertTrue(body)
+
+
+class PageChangeTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.farm = cls.enterClassContext(SiteFarm({'ok.farm.test': 'ok'}, latency=0))
+        cls.enterClassContext(farm_dns())
+
+    def setUp(self):
+        user = User.objects.create_user('pages')
+        self.website = Website.objects.create(name='Pages', url=self.farm.url('ok.farm.test'), owner=user)
+        self.sink = ResultSink(max_age=None)
+        for patch in (mock.patch('apps.monitor.tasks.get_result_sink', return_value=self.sink),
+                      mock.patch.object(check_page_links, 'delay')):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_fingerprint_waits_for_its_seo_log(self):
+        monitor_website(self.website.id)
+        self.assertFalse(WebsiteStatus.objects.filter(website=self.website).exclude(seo_content_hash='').exists())
+
+        self.sink.flush()
+        status = WebsiteStatus.objects.get(website=self.website)
+        self.assertEqual(SEOLog.objects.filter(website=self.website).count(), 1)
+        self.assertTrue(status.seo_content_hash)
+        self.assertTrue(status.seo_etag)
+
+    def test_unchanged_page_is_not_reanalysed(self):
+        monitor_website(self.website.id)
+        self.sink.flush()
+        analysed_at = WebsiteStatus.objects.get(website=self.website).seo_verified_at
+
+        # Revalidated with the ETag
+        monitor_website(self.website.id)
+        self.sink.flush()
+        # Without one, matched by the body's hash
+        WebsiteStatus.objects.filter(website=self.website).update(seo_etag='')
+        monitor_website(self.website.id)
+        self.sink.flush()
+
+        status_codes = UptimeLog.objects.filter(website=self.website).order_by('id').values_list(
+            'status_code', flat=True)
+        self.assertEqual(list(status_codes), [200, 304, 200])
+        self.assertEqual(SEOLog.objects.filter(website=self.website).count(), 1)
+        self.assertGreater(WebsiteStatus.objects.get(website=self.website).seo_verified_at, analysed_at)
+
+
+class ReportJobTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('owner', password='secret')
+        cls.website = Website.objects.create(name='Acme', url='https://acme.example/', owner=cls.user)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_repeated_claims_share_the_job(self):
+        job_id, created = report_jobs.claim(self.website.id)
+        self.assertTrue(created)
+        self.assertEqual(report_jobs.claim(self.website.id), (job_id, False))
+
+        report_jobs.release(self.website.id, job_id, seo_log_id=1)
+        self.assertEqual(report_jobs.status(self.website.id)['state'], report_jobs.DONE)
+        self.assertTrue(report_jobs.claim(self.website.id)[1])
+
+    def test_expired_claim_is_taken_over(self):
+        stale_id, _ = report_jobs.claim(self.website.id)
+        WebsiteStatus.objects.filter(website=self.website).update(
+            report_job_claimed_at=timezone.now() - timedelta(hours=1))
+        job_id, created = report_jobs.claim(self.website.id)
+        self.assertTrue(created)
+
+        # The stale job finishing late leaves its successor's claim alone
+        report_jobs.release(self.website.id, stale_id, error='late')
+        self.assertEqual(report_jobs.claim(self.website.id), (job_id, False))
+
+    def test_claim_gives_up_when_jobs_keep_finishing(self):
+        report_jobs.claim(self.website.id)
+        # Every read finds the job gone, as if it ended right after our update
+        with mock.patch.object(WebsiteStatus.objects, 'filter') as filter_:
+            rows = filter_.return_value
+            rows.update.return_value = 0
+            rows.values_list.return_value.first.return_value = ''
+            with self.assertRaises(report_jobs.ClaimFailed):
+                report_jobs.claim(self.website.id)
+        self.assertEqual(rows.update.call_count, report_jobs.CLAIM_ATTEMPTS)
+
+    def test_failed_enqueue_releases_claim(self):
+        self.client.force_login(self.user)
+        with mock.patch.object(generate_seo_report, 'delay', side_effect=OperationalError('broker down')):
+            self.client.get(reverse('generate_report', args=[self.website.id]))
+
+        self.assertEqual(report_jobs.status(self.website.id)['state'], report_jobs.FAILED)
+        self.assertTrue(report_jobs.claim(self.website.id)[1])
+
+
+class KeywordIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('owner', password='secret')
+        cls.website = Website.objects.create(name='Acme', url='https://acme.example/', owner=cls.user)
+
+    def write_report(self, days_ago, top_keywords, hour=12):
+        checked_at = timezone.now().replace(hour=hour) - timedelta(days=days_ago)
+        sink = ResultSink(max_age=None)
+        sink.add(SEOLog(website=self.website, checked_at=checked_at, top_keywords=top_keywords,
+                        keyword_density={term: count / 10 for term, count in top_keywords.items()}))
+        sink.flush()
+
+    def test_series_keeps_latest_report_of_each_day(self):
+        self.write_report(3, {'analytics': 12})
+        self.write_report(1, {'analytics': 9}, hour=18)
+        self.write_report(1, {'analytics': 5}, hour=6)
+        self.write_report(200, {'analytics': 30})
+
+        series = keywords.keyword_series(self.website, 'analytics')
+        self.assertEqual([(sample['count'], sample['density']) for sample in series], [(12, 1.2), (9, 0.9)])
+
+    def test_later_report_drops_terms(self):
+        self.write_report(1, {'analytics': 12, 'legacy': 6}, hour=6)
+        self.write_report(1, {'analytics': 9}, hour=18)
+        # An older report arriving late changes nothing
+        self.write_report(1, {'analytics': 3, 'legacy': 2}, hour=12)
+
+        self.assertEqual(keywords.keyword_series(self.website, 'legacy'), [])
+        self.assertEqual([sample['count'] for sample in keywords.keyword_series(self.website, 'analytics')], [9])
+
+    def test_biggest_movers(self):
+        self.write_report(10, {'analytics': 4, 'teams': 8, 'legacy': 6})
+        self.write_report(2, {'analytics': 15, 'teams': 7, 'pricing': 3})
+
+        movers = keywords.biggest_movers(self.website)
+        self.assertEqual([(mover['term'], mover['change']) for mover in movers],
+                         [('analytics', 11), ('legacy', -6), ('pricing', 3), ('teams', -1)])
+
+
+class WebsiteStatusTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('owner', password='secret')
+        cls.website = Website.objects.create(name='Acme', url='https://acme.example/', owner=cls.user)
+
+    def setUp(self):
+        self.clock = timezone.now()
+
+    def write(self, *results):
+        sink = ResultSink(max_age=None)
+        for is_up in results:
+            self.clock += timedelta(minutes=1)
+            sink.add(UptimeLog(website=self.website, status_code=200 if is_up else 503, response_time=0.3,
+                               is_up=is_up, checked_at=self.clock))
+        sink.flush()
+        return WebsiteStatus.objects.get(website=self.website)
+
+    def test_tracks_failures_and_changes(self):
+        changes = []
+        receiver = lambda sender, status, previous, **kwargs: changes.append((previous, status.is_up))
+        status_changed.connect(receiver)
+        self.addCleanup(status_changed.disconnect, receiver)
+
+        status = self.write(True)
+        self.assertTrue(status.is_up)
+        self.assertEqual(changes, [])
+
+        status = self.write(False, False)
+        self.assertFalse(status.is_up)
+        self.assertEqual(status.status_code, 503)
+        self.assertEqual(status.consecutive_failures, 2)
+        self.assertLess(status.last_changed_at, status.last_checked_at)
+        self.assertEqual(changes, [(True, False)])
+
+        status = self.write(True)
+        self.assertEqual(status.consecutive_failures, 0)
+        self.assertEqual(status.last_changed_at, status.last_checked_at)
+        self.assertEqual(changes, [(True, False), (False, True)])
+
+
+class RetentionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('owner')
+        cls.website = Website.objects.create(name='Acme', url='https://acme.example/', owner=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.now = timezone.now().replace(hour=12, minute=0, second=0, microsecond=0)
+
+    def seo_logs(self, *ages):
+        SEOLog.objects.bulk_create(SEOLog(website=self.website, checked_at=self.now - age) for age in ages)
+
+    def test_keeps_last_seo_log_of_each_day(self):
+        days = timedelta(days=1)
+        # Three checks on one old day, one on the next, two recent ones
+        self.seo_logs(40 * days, 40 * days - timedelta(hours=2), 40 * days - timedelta(hours=11),
+                      39 * days, 2 * days, 2 * days - timedelta(hours=1))
+
+        apply_retention(self.now)
+        kept = sorted(self.now - checked_at for checked_at in
+                      SEOLog.objects.filter(website=self.website).values_list('checked_at', flat=True))
+        self.assertEqual(kept, [2 * days - timedelta(hours=1), 2 * days, 39 * days,
+                                40 * days - timedelta(hours=11)])
+
+        # A later run starts from the day of the previous cutoff...
+        self.seo_logs(30 * days + timedelta(hours=1), 30 * days + timedelta(hours=2))
+        apply_retention(self.now + timedelta(hours=2))
+        self.assertEqual(SEOLog.objects.filter(checked_at__date=(self.now - 30 * days).date()).count(), 1)
+        # ...and doesn't look at days thinned before it
+        self.seo_logs(50 * days, 50 * days + timedelta(hours=1))
+        apply_retention(self.now + timedelta(hours=4))
+        self.assertEqual(SEOLog.objects.filter(checked_at__date=(self.now - 50 * days).date()).count(), 2)
+
+    def test_keeps_uptime_logs_not_yet_compacted(self):
+        compacted = self.now - timedelta(days=20)
+        UptimeRollup.objects.create(website=self.website, resolution=UptimeRollup.MINUTE,
+                                    bucket_start=compacted - timedelta(minutes=1))
+        UptimeLog.objects.bulk_create(
+            UptimeLog(website=self.website, status_code=200, response_time=0.2, checked_at=checked_at)
+            for checked_at in (self.now - timedelta(days=30), compacted - timedelta(seconds=1),
+                               compacted, self.now - timedelta(days=15), self.now - timedelta(days=1)))
+
+        deleted = apply_retention(self.now)
+        self.assertEqual(deleted['uptime_logs'], 2)
+        self.assertEqual(UptimeLog.objects.filter(checked_at__lt=compacted).count(), 0)
+        self.assertEqual(UptimeLog.objects.filter(checked_at__gte=compacted).count(), 3)
+
+
+class ResultSinkTests(TransactionTestCase):
+    def setUp(self):
+        user = User.objects.create_user('owner')
+        self.website = Website.objects.create(name='Acme', url='https://acme.example/', owner=user)
+        self.flushes = []
+        receiver = lambda sender, uptime_logs, seo_logs, **kwargs: self.flushes.append((uptime_logs, seo_logs))
+        logs_written.connect(receiver)
+        self.addCleanup(logs_written.disconnect, receiver)
+
+    def uptime_log(self):
+        return UptimeLog(website=self.website, status_code=200, response_time=0.2, is_up=True)
+
+    def test_flushes_at_max_size(self):
+        sink = ResultSink(max_size=3, max_age=None)
+        sink.add(self.uptime_log())
+        sink.add(SEOLog(website=self.website))
+        self.assertEqual(UptimeLog.objects.count() + SEOLog.objects.count(), 0)
+
+        sink.add(self.uptime_log())
+        self.assertEqual(len(sink), 0)
+        self.assertEqual(UptimeLog.objects.count(), 2)
+        self.assertEqual(SEOLog.objects.count(), 1)
+        # One signal for the flush, with the written rows
+        self.assertEqual(len(self.flushes), 1)
+        uptime_logs, seo_logs = self.flushes[0]
+        self.assertEqual(sorted(log.id for log in uptime_logs),
+                         sorted(UptimeLog.objects.values_list('id', flat=True)))
+        self.assertEqual([log.id for log in seo_logs], list(SEOLog.objects.values_list('id', flat=True)))
+
+        self.assertEqual(sink.flush(), 0)
+        self.assertEqual(len(self.flushes), 1)
+
+    def test_flushes_after_max_age(self):
+        sink = ResultSink(max_size=100, max_age=0.2)
+        sink.add(self.uptime_log())
+        deadline = time.monotonic() + 5
+        # The sink's timer flushes it from its own thread
+        while not self.flushes and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(len(self.flushes), 1)
+        self.assertEqual(len(sink), 0)
+        self.assertEqual(UptimeLog.objects.count(), 1)
+
+    def test_flushes_on_worker_shutdown(self):
+        sink = ResultSink(max_age=None)
+        sink.add(self.uptime_log())
+        with mock.patch.object(sink_module, '_default_sink', sink):
+            worker_shutdown.send(sender=None)
+        self.assertEqual(UptimeLog.objects.count(), 1)
+
+
+class SchedulerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('owner')
+
+    def setUp(self):
+        self.now = timezone.now()
+
+    def website(self, name, due_in, **fields):
+        return Website.objects.create(name=name, url=f'https://{name}.example/', owner=self.user,
+                                      next_check_at=self.now + due_in, **fields)
+
+    def test_due_site_is_claimed_once(self):
+        website = self.website('due', timedelta(minutes=-1), check_interval=5)
+
+        self.assertEqual(claim_due_websites(self.now), [website.id])
+        website.refresh_from_db()
+        # A full interval ahead, give or take the jitter
+        self.assertGreater(website.next_check_at, self.now + timedelta(minutes=4))
+        self.assertLess(website.next_check_at, self.now + timedelta(minutes=6))
+        self.assertEqual(claim_due_websites(self.now), [])
+
+    def test_inactive_and_future_sites_are_skipped(self):
+        inactive = self.website('inactive', timedelta(minutes=-1), is_active=False)
+        future = self.website('future', timedelta(minutes=1))
+
+        self.assertEqual(claim_due_websites(self.now), [])
+        self.assertEqual(Website.objects.get(id=inactive.id).next_check_at, inactive.next_check_at)
+        self.assertEqual(Website.objects.get(id=future.id).next_check_at, future.next_check_at)
+
+    def test_rate_limited_check_is_requeued_for_its_turn(self):
+        website = self.website('due', timedelta(0))
+        limiter = HostRateLimiter()
+        with mock.patch.object(rate_limit, 'get_rate_limiter', return_value=limiter), \
+                mock.patch.object(limiter, 'acquire', return_value=(5.0, True)), \
+                mock.patch.object(monitor_website, 'apply_async') as apply_async:
+            monitor_website(website.id)
+
+        apply_async.assert_called_once_with((website.id,), {'reserved': True}, countdown=5.0)
+        self.assertFalse(UptimeLog.objects.exists())
+
+    def test_most_overdue_first(self):
+        late = self.website('late', timedelta(minutes=-10))
+        self.website('recent', timedelta(minutes=-1))
+
+        self.assertEqual(claim_due_websites(self.now, limit=1), [late.id])
+
+
+class RollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('owner')
+        cls.website = Website.objects.create(name='Acme', url='https://acme.example/', owner=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        # Mid-morning UTC, so the next hour falls on the same day
+        self.hour = (timezone.now() - timedelta(days=2)).replace(hour=10, minute=0, second=0, microsecond=0)
+
+    def checks(self, *checks):
+        UptimeLog.objects.bulk_create(
+            UptimeLog(website=self.website, status_code=200 if response_time else 503,
+                      response_time=response_time or 0, is_up=bool(response_time),
+                      checked_at=self.hour + timedelta(minutes=minute, seconds=5))
+            for minute, response_time in checks)
+
+    def rollup(self, resolution, start):
+        return UptimeRollup.objects.get(website=self.website, resolution=resolution, bucket_start=start)
+
+    def test_minutes_add_up_to_hours_and_days(self):
+        # 19 fast checks and a slow one in the first hour, one down, one in the next hour
+        self.checks(*[(minute * 3, 0.08) for minute in range(19)], (58, 0.3), (59, None), (61, 0.5))
+
+        self.assertEqual(rollups.compact(self.hour + timedelta(hours=2)), 22)
+        minute = self.rollup(UptimeRollup.MINUTE, self.hour + timedelta(minutes=58))
+        self.assertEqual((minute.checks, minute.up_count, minute.response_time_p95), (1, 1, 0.3))
+
+        hour = self.rollup(UptimeRollup.HOUR, self.hour)
+        self.assertEqual((hour.checks, hour.up_count), (21, 20))
+        self.assertAlmostEqual(hour.response_time_sum, 19 * 0.08 + 0.3)
+        self.assertEqual((hour.response_time_min, hour.response_time_max), (0.08, 0.3))
+        # The upper bound of the histogram bucket holding the 19th fastest check
+        self.assertEqual(hour.response_time_p95, 0.1)
+        self.assertEqual(self.rollup(UptimeRollup.HOUR, self.hour + timedelta(hours=1)).checks, 1)
+
+        day = self.rollup(UptimeRollup.DAY, self.hour.replace(hour=0))
+        self.assertEqual((day.checks, day.up_count), (22, 21))
+        self.assertAlmostEqual(day.response_time_sum, 19 * 0.08 + 0.3 + 0.5)
+        self.assertEqual(day.response_time_max, 0.5)
+
+    def test_rerun_does_not_double_count(self):
+        self.checks((0, 0.2), (1, 0.4))
+        rollups.compact(self.hour + timedelta(hours=2))
+
+        self.assertEqual(rollups.compact(self.hour + timedelta(hours=2)), 0)
+        # Checks in a later minute are added to the same hour once
+        self.checks((30, 0.6))
+        self.assertEqual(rollups.compact(self.hour + timedelta(hours=2)), 1)
+        self.assertEqual(rollups.compact(self.hour + timedelta(hours=2)), 0)
+
+        hour = self.rollup(UptimeRollup.HOUR, self.hour)
+        self.assertEqual((hour.checks, hour.up_count), (3, 3))
+        self.assertAlmostEqual(hour.response_time_sum, 1.2)
+        self.assertEqual(UptimeRollup.objects.filter(resolution=UptimeRollup.MINUTE).count(), 3)
+
+
+@skipUnless(connection.vendor == 'postgresql', "Native partitioning needs PostgreSQL")
+class PartitionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('owner')
+        cls.website = Website.objects.create(name='Acme', url='https://acme.example/', owner=cls.user)
+
+    def setUp(self):
+        self.now = timezone.now()
+
+    def check(self, checked_at):
+        return UptimeLog.objects.create(website=self.website, status_code=200, response_time=0.2,
+                                        checked_at=checked_at)
+
+    def convert(self, *ages):
+        for age in ages:
+            self.check(self.now - age)
+        # Fire the deferred foreign key checks; PostgreSQL won't alter a table
+        # with pending trigger events
+        connection.check_constraints()
+        return partitions.convert_table('daily')
+
+    def rows_in(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT COUNT(*) FROM {connection.ops.quote_name(name)}")
+            return cursor.fetchone()[0]
+
+    def test_convert_table(self):
+        self.assertEqual(self.convert(timedelta(days=2), timedelta(days=1), timedelta(0)), 3)
+
+        self.assertTrue(partitions.is_partitioned())
+        starts = [partition.start for partition in partitions.list_partitions()]
+        self.assertEqual(starts[0], partitions.period_start(self.now - timedelta(days=2), 'daily'))
+        self.assertEqual(len(starts), 2 + 1 + settings.MONITOR_UPTIME_PARTITION_PREMAKE)
+        self.assertEqual(self.rows_in(f'{partitions.table_name()}_default'), 0)
+        # Ids keep counting from the copied rows
+        newest = self.check(self.now)
+        self.assertGreater(newest.id, max(UptimeLog.objects.exclude(id=newest.id).values_list('id', flat=True)))
+
+    def test_drop_partitions_before(self):
+        self.convert(timedelta(days=3), timedelta(days=1))
+
+        dropped = partitions.drop_partitions_before(partitions.period_start(self.now - timedelta(days=1), 'daily'))
+        self.assertEqual(len(dropped), 2)
+        self.assertEqual(UptimeLog.objects.count(), 1)
+
+    def test_new_partition_takes_rows_from_default(self):
+        self.convert(timedelta(0))
+        future = self.now + timedelta(days=30)
+        self.check(future)
+        connection.check_constraints()
+        self.assertEqual(self.rows_in(f'{partitions.table_name()}_default'), 1)
+
+        created = partitions.ensure_partitions(now=future, interval='daily')
+        self.assertEqual(self.rows_in(created[0]), 1)
+        self.assertEqual(self.rows_in(f'{partitions.table_name()}_default'), 0)
+        self.assertEqual(UptimeLog.objects.filter(checked_at=future).count(), 1)
@@ -8,6 +8,8 @@ urlpatterns = [
     path('websites/toggle/<int:website_id>/', views.toggle_website, name='toggle_website'),
     path('reports/generate/<int:website_id>/', views.generate_report, name='generate_report'),
     path('reports/view/<int:website_id>/', views.view_report, name='view_report'),
+    path('reports/status/<int:website_id>/', views.report_status, name='report_status'),
+    path('metrics', views.prometheus_metrics, name='metrics'),
     # Optional delete route:
     # path('websites/delete/<int:website_id>/', views.delete_website, name='delete_website'),
 ]
\ No newline at end of file
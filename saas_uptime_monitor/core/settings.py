@@ -19,6 +19,8 @@ DEBUG = True
 
 ALLOWED_HOSTS = []
 
+INTERNAL_IPS = ['127.0.0.1', '::1']
+
 # Application definition
 INSTALLED_APPS = [
     'django.contrib.admin',
@@ -70,6 +72,17 @@ DATABASES = {
     }
 }
 
+# docker-compose runs PostgreSQL; local development falls back to SQLite
+if os.environ.get('POSTGRES_DB'):
+    DATABASES['default'] = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.environ['POSTGRES_DB'],
+        'USER': os.environ.get('POSTGRES_USER', ''),
+        'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+        'HOST': os.environ.get('POSTGRES_HOST', 'localhost'),
+        'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+    }
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -96,4 +109,172 @@ USE_TZ = True
 STATIC_URL = 'static/'
 
 # Default primary key field type
-DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
\ No newline at end of file
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Monitoring
+# Active websites are probed in batches; each batch runs on one event loop.
+MONITOR_PROBE_BATCH_SIZE = 500
+MONITOR_PROBE_MAX_IN_FLIGHT = 200
+MONITOR_PROBE_PER_HOST_LIMIT = 4
+MONITOR_PROBE_TIMEOUT = 10  # seconds
+# Page bodies a batch keeps for its SEO checks; pages past this are fetched again
+MONITOR_PROBE_MAX_KEPT_BYTES = 64 * 1024 * 1024
+# Set MONITOR_PROBE_PHASE_TIMING=1 to record DNS/connect/TLS/first byte/transfer
+# times on each UptimeLog; it traces every probe, so it's off by default. DNS
+# lookups are kept per worker for this many seconds (None to resolve every batch).
+MONITOR_PROBE_PHASE_TIMING = os.environ.get('MONITOR_PROBE_PHASE_TIMING', '').lower() in ('1', 'true', 'yes')
+MONITOR_DNS_CACHE_TTL = 300
+
+# Probe results are buffered per worker and written with bulk_create once
+# this many rows are queued or the oldest queued row is this many seconds old.
+MONITOR_SINK_MAX_SIZE = 500
+MONITOR_SINK_MAX_AGE = 5
+
+# The beat tick only dispatches websites whose check_interval has elapsed.
+# Next check times are spread by +/- this fraction of the interval.
+MONITOR_SCHEDULER_JITTER = 0.1
+MONITOR_SCHEDULER_MAX_PER_TICK = 20000
+
+# Probes to one host share a token bucket of RATE requests per second with
+# bursts of BURST, kept in Redis when REDIS_URL is set (else per worker).
+# Probes that would wait more than MAX_WAIT seconds for a token, or whose host
+# is inside a Retry-After sent with a 429/503, are put back in the schedule.
+MONITOR_HOST_RATE = 2.0
+MONITOR_HOST_BURST = 10
+MONITOR_HOST_MAX_WAIT = 30
+MONITOR_RETRY_AFTER_MAX = 60 * 60
+
+# Redis for worker coordination beyond the cache: rate limit buckets, probe
+# node membership and metric totals.
+MONITOR_REDIS_URL = os.environ.get('REDIS_URL')
+
+# Metrics are buffered per process and pushed to Redis at least this often
+# (and after every task). /metrics serves the totals in Prometheus format to
+# requests with `Authorization: Bearer <token>`; without a token it is only
+# served with DEBUG on, to INTERNAL_IPS.
+MONITOR_METRICS_FLUSH_INTERVAL = 10
+MONITOR_METRICS_TOKEN = os.environ.get('MONITOR_METRICS_TOKEN', '')
+
+# Opt-in profiling of the fetch/parse/score/persist stages of the monitor
+# tasks, for the tasks named in MONITOR_PROFILE_TASKS and a SAMPLE_RATE
+# fraction of all other runs. With CAPTURE 'cprofile' or 'tracemalloc',
+# profiled runs slower than SLOW_SECONDS save their profile to PROFILE_DIR.
+MONITOR_PROFILE_TASKS = {task for task in os.environ.get('MONITOR_PROFILE_TASKS', '').split(',') if task}
+MONITOR_PROFILE_SAMPLE_RATE = float(os.environ.get('MONITOR_PROFILE_SAMPLE_RATE', 0))
+MONITOR_PROFILE_CAPTURE = os.environ.get('MONITOR_PROFILE_CAPTURE', '')
+MONITOR_PROFILE_SLOW_SECONDS = 10
+MONITOR_PROFILE_DIR = os.environ.get('MONITOR_PROFILE_DIR', str(BASE_DIR / 'profiles'))
+
+# Due websites are sharded over probe nodes by consistent hashing of their id.
+# A worker started with MONITOR_PROBE_NODE=<name> and `-Q probe.<name>` joins
+# by heartbeating to Redis and drops out TTL seconds after it stops. Set
+# MONITOR_PROBE_NODES to a fixed list instead to skip the heartbeats; with no
+# nodes at all, batches go to the default queue. Batches not picked up within
+# BATCH_EXPIRES seconds are discarded.
+MONITOR_PROBE_NODE = os.environ.get('MONITOR_PROBE_NODE', '')
+MONITOR_PROBE_NODES = [node for node in os.environ.get('MONITOR_PROBE_NODES', '').split(',') if node]
+MONITOR_PROBE_QUEUE_PREFIX = 'probe.'
+MONITOR_PROBE_NODE_TTL = 30
+MONITOR_PROBE_RING_REPLICAS = 400
+MONITOR_PROBE_BATCH_EXPIRES = 120
+
+# After this many failed checks in a row a site's interval doubles with each
+# further failure, up to BACKOFF_MAX_INTERVAL minutes.
+MONITOR_BACKOFF_AFTER_FAILURES = 3
+MONITOR_BACKOFF_MAX_INTERVAL = 60
+
+CELERY_BEAT_SCHEDULE = {
+    'monitor-due-websites': {
+        'task': 'apps.monitor.tasks.monitor_all_websites',
+        'schedule': 60.0,
+    },
+    'monitor-compact-rollups': {
+        'task': 'apps.monitor.tasks.compact_uptime_rollups',
+        'schedule': 60.0,
+    },
+    'monitor-prune-history': {
+        'task': 'apps.monitor.tasks.prune_history',
+        'schedule': 600.0,
+    },
+    'monitor-uptime-partitions': {
+        'task': 'apps.monitor.tasks.maintain_uptime_partitions',
+        'schedule': 3600.0,
+    },
+}
+
+# Every probe code path shares one keep-alive requests.Session per worker.
+# POOL_CONNECTIONS is how many hosts keep a pool, POOL_MAXSIZE the sockets per host.
+MONITOR_HTTP_POOL_CONNECTIONS = 100
+MONITOR_HTTP_POOL_MAXSIZE = 10
+
+# Page bodies are capped at this size. The uptime probe keeps the body and
+# reuses it for the SEO check instead of downloading the page twice.
+MONITOR_MAX_BODY_BYTES = 2 * 1024 * 1024
+
+# SEO reports are generated by a Celery job; duplicate requests for a website
+# collapse into the job in flight until it finishes or this many seconds pass.
+MONITOR_REPORT_JOB_TIMEOUT = 120
+MONITOR_REPORT_STATUS_TTL = 60 * 60
+
+# HTML parser used for SEO extraction: 'lxml' (needs the lxml package),
+# 'stream' (pure-Python tokenizer, no tree) or 'html.parser' (BeautifulSoup).
+# An unavailable backend falls back to 'stream'.
+MONITOR_HTML_PARSER = 'stream'
+
+# Page downloads stop after MONITOR_MAX_BODY_BYTES or this many seconds in
+# total, whichever comes first; the SEOLog row records the truncation.
+MONITOR_FETCH_DEADLINE = 20
+
+# Uptime history is read from 1 minute / 1 hour / 1 day rollups. Compaction
+# waits this many seconds for buffered checks to land before closing a
+# minute, and handles at most MAX_BATCHES x BATCH_MINUTES of backlog per run.
+MONITOR_ROLLUP_GRACE = 120
+MONITOR_ROLLUP_BATCH_MINUTES = 60
+MONITOR_ROLLUP_MAX_BATCHES = 24
+
+# Days of history to keep; None keeps it forever. Raw uptime checks are only
+# deleted once rolled up, and old SEO checks are thinned to one per day.
+# Each run deletes at most MAX_CHUNKS x CHUNK_SIZE rows per table.
+MONITOR_RETENTION_RAW_UPTIME_DAYS = 14
+MONITOR_RETENTION_RAW_SEO_DAYS = 30
+MONITOR_RETENTION_MINUTE_ROLLUP_DAYS = 7
+MONITOR_RETENTION_HOUR_ROLLUP_DAYS = 90
+MONITOR_RETENTION_DAY_ROLLUP_DAYS = None
+MONITOR_RETENTION_KEYWORD_DAYS = 365
+MONITOR_RETENTION_CHUNK_SIZE = 5000
+MONITOR_RETENTION_MAX_CHUNKS = 100
+
+# On PostgreSQL, `manage.py partition_uptime_logs` turns UptimeLog into a table
+# range-partitioned by checked_at ('daily' or 'weekly'). Partitions for the
+# next PREMAKE periods are created hourly and retention drops expired ones.
+MONITOR_UPTIME_PARTITION_INTERVAL = 'daily'
+MONITOR_UPTIME_PARTITION_PREMAKE = 7
+
+# Shared cache for metrics, report job status and per-website view data.
+# Uses Redis when REDIS_URL is set; the local-memory fallback is per process,
+# so workers can't invalidate what the web process cached and entries only
+# expire after MONITOR_VIEW_CACHE_TTL seconds.
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+MONITOR_VIEW_CACHE_TTL = 300
+
+# Links on each new SEO check are checked concurrently by a follow-up task.
+# Statuses are cached so a link shared by many pages is fetched once per TTL;
+# broken links expire sooner so fixes show up.
+MONITOR_LINK_CHECK_MAX_IN_FLIGHT = 100
+MONITOR_LINK_CHECK_PER_HOST_LIMIT = 4
+MONITOR_LINK_CHECK_TIMEOUT = 5
+MONITOR_LINK_CHECK_MAX_PER_PAGE = 200
+MONITOR_LINK_CACHE_TTL = 24 * 60 * 60
+MONITOR_LINK_BROKEN_CACHE_TTL = 60 * 60